@@ -0,0 +1,48 @@
+"""
+Graph construction benchmark.
+
+  python bench/bench_graph.py [num_lines]
+
+Times make_graph and Context over a synthetic log, and exporting the graph
+to networkx (roughly what building it as a networkx graph cost), with peak
+memory after each step.
+"""
+
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from synthetic import synthetic_log_lines
+from vinge.context import Context
+from vinge.graph import make_graph
+from vinge.parser import parse_log
+from vinge.weighting import exponential_decay
+
+time_weighting = exponential_decay(0.0001)
+
+def _millis(fn):
+    start = time.time()
+    ret = fn()
+    return (ret, 1000 * (time.time() - start))
+
+def _peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def main():
+    num_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    parse = parse_log(synthetic_log_lines(num_lines))
+    print 'lines: %d, peak %.0f MB after parsing' % (num_lines, _peak_mb())
+    (graph, build) = _millis(lambda: make_graph(*parse,
+                                                time_weighting=time_weighting))
+    print 'make_graph  %8.0f ms  peak %6.0f MB  %d nodes, %d edges' % \
+        (build, _peak_mb(), graph.number_of_nodes(), graph.number_of_edges())
+    (_, context) = _millis(lambda: Context(graph))
+    print 'Context     %8.0f ms  peak %6.0f MB' % (context, _peak_mb())
+    (_, export) = _millis(graph.to_networkx)
+    print 'to_networkx %8.0f ms  peak %6.0f MB' % (export, _peak_mb())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Parse throughput benchmark.
+
+  python bench/bench_parser.py [num_lines]
+
+Compares the header decoding of the parser against the original
+implementation (regex compiled per call, seven int conversions and a
+datetime per line), then times the full parse_log.
+"""
+
+import os
+import re
+import sys
+import time
+
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from synthetic import synthetic_log_lines
+from vinge.log_format import get_format
+from vinge.parser import parse_log
+
+def _original_parse_log_line(line):
+    regex = re.compile('^(\d\d\d\d)-(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d),(\d\d\d)\s+(\w+)\s+\[(\w+)\](.+)$')
+    m = regex.match(line)
+    if not m:
+        return None
+    microseconds = int(m.group(7))*1000
+    dt = datetime(year=int(m.group(1)),
+                  month=int(m.group(2)),
+                  day=int(m.group(3)),
+                  hour=int(m.group(4)),
+                  minute=int(m.group(5)),
+                  second=int(m.group(6)),
+                  microsecond=microseconds)
+    return (dt, m.group(9), m.group(10))
+
+def _lines_per_sec(fn, lines):
+    start = time.time()
+    fn(lines)
+    return len(lines) / (time.time() - start)
+
+def main():
+    num_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    lines = [line.rstrip() for line in synthetic_log_lines(num_lines)]
+
+    original = _lines_per_sec(lambda ls: map(_original_parse_log_line, ls),
+                              lines)
+    fast = _lines_per_sec(lambda ls: map(get_format('java').parse, ls),
+                          lines)
+    print 'header decoding, original: %12.0f lines/sec' % original
+    print 'header decoding, fast:     %12.0f lines/sec (%.2fx)' % \
+        (fast, fast / original)
+    print 'parse_log:                 %12.0f lines/sec' % \
+        _lines_per_sec(parse_log, lines)
+
+if __name__ == '__main__':
+    main()
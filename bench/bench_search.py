@@ -0,0 +1,58 @@
+"""
+find query benchmark.
+
+  python bench/bench_search.py [num_lines]
+
+Times search.SearchIndex queries over a synthetic log, against scanning
+the tokens of every line for the same query.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from synthetic import synthetic_log_lines
+from vinge.node_table import NodeTable
+from vinge.parser import parse_log
+from vinge.search import parse_query, SearchIndex
+
+_QUERIES = [('timeout', lambda tokens: 'timeout' in tokens),
+            ('timeout pool exhausted',
+             lambda tokens: set(['timeout', 'pool', 'exhausted']) <= tokens),
+            ('retry or timeout',
+             lambda tokens: 'retry' in tokens or 'timeout' in tokens),
+            ('session not opened',
+             lambda tokens: 'session' in tokens and 'opened' not in tokens)]
+
+def _millis(fn):
+    start = time.time()
+    ret = fn()
+    return (ret, 1000 * (time.time() - start))
+
+def main():
+    num_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    (log_lines, tag_map, _) = parse_log(synthetic_log_lines(num_lines))
+    postings = tag_map.postings
+    for (i, v) in enumerate(log_lines):
+        v._set_idx(i)
+    (index, build) = _millis(lambda: SearchIndex(
+        NodeTable.from_vertices(log_lines)))
+    print 'lines: %d, node table and index built in %.0f ms' % (len(log_lines), build)
+
+    tokens = postings.dictionary.tokens
+    line_tokens = [set(tokens[t] for t in
+                       postings.line_token_ids(i).tolist())
+                   for i in xrange(postings.num_lines())]
+    for (query, predicate) in _QUERIES:
+        (hits, fast) = _millis(lambda: index.find(parse_query(query)))
+        (expected, scan) = _millis(lambda: [i for (i, line) in
+                                            enumerate(line_tokens)
+                                            if predicate(line)])
+        assert hits.tolist() == expected
+        print '%-24s %8d hits  find %8.1f ms  scan %8.1f ms' % \
+            (query, len(hits), fast, scan)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Tokenizer throughput benchmark.
+
+  python bench/bench_tokens.py [num_lines]
+
+Compares vinge.tokens.tokenize against the original tokenizer (re.split,
+then every id regex, the stop word set and an uncompiled splitter regex
+tried on every token), and checks that both give the same tokens. Then
+counts how many tag vertices the log would get with only the original id
+patterns (uuid and urn) and with all of them.
+"""
+
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from synthetic import synthetic_log_lines
+from vinge.log_format import get_format
+from vinge.tokens import is_stop_word, is_token_id, set_id_patterns
+from vinge.tokens import tokenize, TokenType
+
+def _original_tokenize(string):
+    ret = []
+    tokens = re.split('([\s=,]+)', string)
+    for token in tokens:
+        if token == '':
+            continue
+        if is_token_id(token):
+            token_type = TokenType.ID
+        elif is_stop_word(token):
+            token_type = TokenType.STOP_WORD
+        elif re.match('[\s=,]+', token) is not None:
+            token_type = TokenType.SPLITTER
+        else:
+            token_type = TokenType.TAG
+        ret.append((token, token_type))
+    return ret
+
+def _messages_per_sec(fn, messages):
+    start = time.time()
+    map(fn, messages)
+    return len(messages) / (time.time() - start)
+
+def _count_tags(messages):
+    # make_graph makes a chain of TagVertex per distinct tag, with a vertex
+    # per line the tag is in
+    tags = set()
+    count = 0
+    for message in messages:
+        line_tags = set(token for (token, token_type) in tokenize(message)
+                        if token_type == TokenType.TAG)
+        tags.update(line_tags)
+        count += len(line_tags)
+    return (len(tags), count)
+
+def main():
+    num_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    parse = get_format('java').parse
+    messages = [ret[2] for ret in
+                (parse(line.rstrip()) for line in
+                 synthetic_log_lines(num_lines))
+                if ret is not None]
+
+    assert map(tokenize, messages) == map(_original_tokenize, messages)
+    original = _messages_per_sec(_original_tokenize, messages)
+    fast = _messages_per_sec(tokenize, messages)
+    print 'tokenize, original: %12.0f messages/sec' % original
+    print 'tokenize, scanner:  %12.0f messages/sec (%.2fx)' % \
+        (fast, fast / original)
+
+    set_id_patterns(['uuid', 'urn'])
+    before = _count_tags(messages)
+    set_id_patterns()
+    after = _count_tags(messages)
+    for (i, what) in enumerate(['tag chains', 'tag vertices']):
+        print '%-12s uuid and urn ids: %10d' % (what, before[i])
+        print '%-12s all id patterns:  %10d (%.1f%% fewer)' % \
+            (what, after[i], 100.0 * (before[i] - after[i]) / before[i])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Vertex memory benchmark.
+
+  python bench/bench_vertex_memory.py [num_lines]
+
+Builds the log line and tag vertices of a synthetic log twice: with the
+original vertex classes (a __dict__ per instance, a kind per instance, a
+thread id and tag word string per vertex) and with vinge.vertex. Reports
+the growth in resident memory per vertex, not counting the line and
+message text, which both share. Log lines are also made as
+StoredLogLineVertex, which keep where the text is instead of the text.
+"""
+
+import gc
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from synthetic import synthetic_log_lines
+from vinge.log_format import get_format
+from vinge.tokens import tokenize, TokenType
+from vinge.vertex import LogLineVertex, StoredLogLineVertex, TagVertex
+
+class _OriginalLogLineVertex(object):
+    def __init__(self, line, message, line_number, thread_id, millis):
+        self.line = line
+        self.message = message
+        self.line_number = line_number
+        self.thread_id = thread_id
+        self.millis = millis
+        self.kind = 0
+
+class _OriginalTagVertex(object):
+    def __init__(self, word, millis):
+        self.word = word
+        self.millis = millis
+        self.kind = 2
+
+def _resident_bytes():
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+def _bytes_per_vertex(make, items):
+    """
+    Measures in a forked child, so memory freed by an earlier measurement
+    can't be reused by a later one.
+
+    Args:
+        make (fun item -> list of vertex)
+        items (list)
+
+    Returns:
+        (float, int) bytes per vertex, number of vertices
+    """
+    (read_fd, write_fd) = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        # Touching the items copies their pages into the child (refcounts are
+        # writes), which mustn't count as vertex memory
+        touched = [repr(item) for item in items]
+        del touched
+        gc.collect()
+        before = _resident_bytes()
+        vertices = []
+        for item in items:
+            vertices.extend(make(item))
+        gc.collect()
+        after = _resident_bytes()
+        os.write(write_fd, '%r %d' % (float(after - before) / len(vertices),
+                                      len(vertices)))
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as file:
+        (per_vertex, count) = file.read().split()
+    os.waitpid(pid, 0)
+    return (float(per_vertex), int(count))
+
+def main():
+    num_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    parse = get_format('java').parse
+    lines = [line.rstrip() for line in synthetic_log_lines(num_lines)]
+    lines = [line for line in lines if parse(line) is not None]
+    messages = [parse(line)[2] for line in lines]
+
+    def log_line_vertices(cls):
+        def make((i, line, message)):
+            # Parse again, so every vertex gets its own thread id string
+            (millis, thread_id, _) = parse(line)
+            return [cls(line, message, i, thread_id, millis)]
+        return make
+
+    def stored_log_line_vertices(store):
+        def make((i, line, message)):
+            (millis, thread_id, _) = parse(line)
+            return [StoredLogLineVertex(store, offsets[i], len(line),
+                                        len(line) - len(message), i,
+                                        thread_id, millis)]
+        return make
+
+    def tag_vertices(cls):
+        def make((i, line, message)):
+            # Tokenize again, so every vertex gets its own word string
+            return [cls(token, i) for (token, token_type) in
+                    tokenize(parse(line)[2]) if token_type == TokenType.TAG]
+        return make
+
+    items = [(i, line, message)
+             for (i, (line, message)) in enumerate(zip(lines, messages))]
+    # Where every line would be in a line store. The store itself isn't
+    # read, as the text isn't looked at.
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line) + 1)
+    for (what, original, compact) in [
+            ('log line', log_line_vertices(_OriginalLogLineVertex),
+             log_line_vertices(LogLineVertex)),
+            ('stored', log_line_vertices(_OriginalLogLineVertex),
+             stored_log_line_vertices(object())),
+            ('tag', tag_vertices(_OriginalTagVertex),
+             tag_vertices(TagVertex))]:
+        (before, count) = _bytes_per_vertex(original, items)
+        (after, _) = _bytes_per_vertex(compact, items)
+        print '%-8s vertices: %9d' % (what, count)
+        print '  original: %7.1f bytes/vertex' % before
+        print '  compact:  %7.1f bytes/vertex (%.0f%% less)' % \
+            (after, 100.0 * (before - after) / before)
+
+if __name__ == '__main__':
+    main()
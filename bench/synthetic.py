@@ -0,0 +1,47 @@
+"""
+Synthetic java style logs for the benchmarks.
+"""
+
+import random
+import uuid
+
+from datetime import datetime, timedelta
+
+_WORDS = ['request', 'handled', 'user', 'cache', 'miss', 'hit', 'database',
+          'query', 'took', 'ms', 'session', 'opened', 'closed', 'retry',
+          'timeout', 'connection', 'pool', 'exhausted', 'payload', 'sent']
+
+def _k8s_suffix(rand, length):
+    return ''.join(rand.choice('bcdfghjklmnpqrstvwxz2456789')
+                   for _ in xrange(length))
+
+def synthetic_log_lines(num_lines, seed=0):
+    """
+    Returns:
+        list of str log lines, with trailing newlines
+    """
+    rand = random.Random(seed)
+    time = datetime(2012, 9, 1)
+    lines = []
+    for i in xrange(num_lines):
+        time += timedelta(milliseconds=rand.randint(0, 50))
+        words = [rand.choice(_WORDS) for _ in xrange(rand.randint(3, 12))]
+        if rand.random() < 0.2:
+            words.append(str(uuid.UUID(int=rand.getrandbits(128))))
+        if rand.random() < 0.1:
+            words.append('user=%d' % rand.randint(0, 1000))
+        if rand.random() < 0.1:
+            words.append('client=10.0.%d.%d' % (rand.randint(0, 255),
+                                                rand.randint(0, 255)))
+        if rand.random() < 0.1:
+            words.append('trace=%016x' % rand.getrandbits(64))
+        if rand.random() < 0.05:
+            words.append('pod=frontend-%s-%s' %
+                         (_k8s_suffix(rand, 10), _k8s_suffix(rand, 5)))
+        lines.append('%s,%03d INFO  [Thread%d] c.g.o.a.Foo : %s\n' %
+                     (time.strftime('%Y-%m-%d %H:%M:%S'),
+                      time.microsecond // 1000, rand.randint(0, 15),
+                      ' '.join(words)))
+        if rand.random() < 0.02:
+            lines.append('    at c.g.o.a.Foo.bar(Foo.java:%d)\n' % i)
+    return lines
@@ -10,7 +10,6 @@ Each public method should correspond to a user method on the repl
 
 from format import format_vertex
 from vinge.format import shorten_color_str
-from graph import EdgeType
 
 from kct.argparse import Namespace
 from kct.output import pp, error, indent, info, deindent
@@ -19,8 +18,11 @@ import sys
 
 import heapq
 from vinge.filter import *
+from vinge.graph import parse_edge_types
 from vinge.node_ref import parse_node_ref, NodeRef, NodeRefType
+from vinge.search import parse_query, QueryError
 from vinge.semex.semex import MatrixSensorSemex, ConcatSemex
+from vinge.timestamps import parse_time
 from semex.porcelain import make_semex_starting_here, most_likely_endpoints
 
 def _print_semexes_header(ctx):
@@ -29,7 +31,7 @@ def _print_semexes_header(ctx):
     """
     pp("Path Sets: ")
     for name, semex in ctx.semexes().iteritems():
-        pp("  %s %s" % (name, semex.semex))
+        pp("  %s %s" % (name, semex))
     # TODO(trevor) wordwrap
 
 def _print_location(ctx, cur_node=None):
@@ -38,24 +40,14 @@ def _print_location(ctx, cur_node=None):
     The current log line has the tags and ids highlighted. Previous
     and next log lines are just printed.
     """
-    graph = ctx.graph
     if not cur_node:
         node = ctx.posn
     else:
         node = cur_node
-    nbrs = graph[node]
-    # Grab the previous guy
-    previous_neighbor = None
-    next_neighbor = None
-    for nbr in nbrs:
-        edge_type = graph[node][nbr].get('edge_type', None)
-        if edge_type == EdgeType.ADJACENT_PREV:
-            previous_neighbor = nbr
-        elif edge_type == EdgeType.ADJACENT_NEXT:
-            next_neighbor = nbr
+    (previous_neighbor, next_neighbor) = ctx.adjacent_lines(node)
     if previous_neighbor:
         print previous_neighbor
-    print format_vertex(node)
+    print format_vertex(node, ctx.nodes)
     if next_neighbor:
         print next_neighbor
 
@@ -68,7 +60,7 @@ def _print_neighbors(ctx, cur_node=None):
     print '_' * 10
     for i, nbr in enumerate(nbrs):
         print "%d %s" % (i,
-                         shorten_color_str(format_vertex(nbr), 80))
+                         shorten_color_str(format_vertex(nbr, ctx.nodes), 80))
         _print_most_likely_paths(ctx, nbr)
 
 def _print_most_likely_paths(ctx, node):
@@ -77,25 +69,24 @@ def _print_most_likely_paths(ctx, node):
     in the context provided.
     """
     indent()
-    graph = ctx.graph
     num_nodes = ctx.graph_number_of_nodes()
     for name, val in ctx.semexes().iteritems():
         if not val.active:
             continue
         # Calculate semex starting at this neighbor node
         semex = val.semex
-        this_semex = make_semex_starting_here(ctx.transition,
-                                              ctx.transition_op,
-                                              graph,
+        (transition, transition_op) = ctx.walk(val.edge_types)
+        this_semex = make_semex_starting_here(transition,
+                                              transition_op,
+                                              ctx.nodes,
                                               num_nodes,
                                               semex,
                                               node)
         most_likely = most_likely_endpoints(this_semex, num_nodes)
-        nodes = graph.nodes() # cache this lookup
         pp("%s"%name)
         indent()
         for (idx, val) in most_likely:
-            endpoint = nodes[idx]
+            endpoint = ctx.node(idx)
             # Skip current
             if endpoint == ctx.posn or endpoint == node:
                 continue
@@ -103,6 +94,38 @@ def _print_most_likely_paths(ctx, node):
         deindent()
     deindent()
 
+FIND_PAGE_SIZE = 20
+"""
+Number of hits find prints at a time.
+"""
+
+def go(ctx, args):
+    """
+    Goes to a neighbor by its index, or to any node-ref (e.g. hits[3]).
+    See go_by_vertex
+
+    Args:
+        ctx (context.Context)
+        args (kct.argparse.Namepsace)
+        args.target (str) - neighbor index or node-ref
+
+    Returns: None
+    """
+    target = args.target
+    if target.isdigit():
+        go_by_neighbor_index(ctx, Namespace(idx=int(target)))
+        return
+    node_ref = parse_node_ref(target)
+    if node_ref is None:
+        error("Error %s is not a valid node-ref" % target)
+        return
+    try:
+        node = ctx.node_by_node_ref(node_ref)
+    except ValueError, ve: # Catch invalid node-ref
+        error(ve)
+        return
+    go_by_vertex(ctx, Namespace(vertex=node))
+
 def go_by_neighbor_index(ctx, args):
     """
     See go_by_vertex
@@ -135,6 +158,125 @@ def go_by_vertex(ctx, args):
     _print_semexes_header(ctx)
     _print_neighbors(ctx)
 
+def _go_to_idx(ctx, idx, what):
+    # Goes to the vertex idx found by a goto command, what says what wasn't
+    # found if idx is None
+    if idx is None:
+        error("No %s" % what)
+        return
+    go_by_vertex(ctx, Namespace(vertex=ctx.node(idx)))
+
+def goto_line(ctx, args):
+    """
+    Goes to a log line by its line number.
+
+    Args:
+        ctx (context.Context)
+        args (kct.argparse.Namepsace)
+        args.line-number (int) - 0 based line number
+        args.file (str) - log file the line is in, if there are several
+
+    Returns: None
+    """
+    line_number = getattr(args, 'line-number')
+    idx = ctx.index().line(line_number, args.file)
+    _go_to_idx(ctx, idx, "line %d" % line_number)
+
+def _reference_millis(ctx):
+    # Time whose day is used for times typed without a date: the current
+    # position's, or the start of the log's
+    ret = getattr(ctx.posn, 'millis', None)
+    if ret is None:
+        ret = ctx.index().first_millis() or 0
+    return ret
+
+def goto_time(ctx, args):
+    """
+    Goes to the first log line at or after a time. A time without a date is
+    on the day of the current position.
+
+    Args:
+        ctx (context.Context)
+        args (kct.argparse.Namepsace)
+        args.time (list of str) - see timestamps.parse_time
+
+    Returns: None
+    """
+    time_str = ' '.join(args.time)
+    try:
+        millis = parse_time(time_str, _reference_millis(ctx))
+    except ValueError, ve:
+        error(ve)
+        return
+    _go_to_idx(ctx, ctx.index().time(millis), "log lines")
+
+def goto_tag(ctx, args):
+    """
+    Goes to the first occurrence of a tag at or after the current position,
+    or its first occurrence if there is none after.
+
+    Args:
+        ctx (context.Context)
+        args (kct.argparse.Namepsace)
+        args.word (str) - the tag
+
+    Returns: None
+    """
+    index = ctx.index()
+    idx = index.tag(args.word, getattr(ctx.posn, 'millis', None))
+    if idx is not None:
+        info("%d occurrences of %s" % (index.count_tag(args.word),
+                                       args.word))
+    _go_to_idx(ctx, idx, "tag '%s'" % args.word)
+
+def goto_id(ctx, args):
+    """
+    Goes to the vertex of an id.
+
+    Args:
+        ctx (context.Context)
+        args (kct.argparse.Namepsace)
+        args.id (str)
+
+    Returns: None
+    """
+    _go_to_idx(ctx, ctx.index().id(args.id), "id '%s'" % args.id)
+
+def find(ctx, args):
+    """
+    Searches the log lines (see search.parse_query for queries), and prints
+    the first page of hits. Without a query, prints the next page of the
+    last search. Hits are node-refs: hits[0], hits[1]...
+
+    Args:
+        ctx (context.Context)
+        args (kct.argparse.Namepsace)
+        args.query (list of str) - the query, split on spaces
+
+    Returns: None
+    """
+    if args.query:
+        try:
+            query = parse_query(' '.join(args.query), _reference_millis(ctx))
+        except QueryError, qe:
+            error("Error parsing query: %s" % qe)
+            return
+        ctx.hits = ctx.search_index().find(query)
+        ctx.hits_shown = 0
+        info("%d hits" % len(ctx.hits))
+    elif ctx.hits_shown >= len(ctx.hits):
+        info("No more hits")
+        return
+    start = ctx.hits_shown
+    end = min(start + FIND_PAGE_SIZE, len(ctx.hits))
+    for i in xrange(start, end):
+        node = ctx.node(ctx.hits[i])
+        pp("hits[%d] %s" %
+           (i, shorten_color_str(format_vertex(node, ctx.nodes), 80)))
+    ctx.hits_shown = end
+    if end < len(ctx.hits):
+        pp("%d more, 'find' for the next page" % (len(ctx.hits) - end))
+
 def node_info(ctx, args):
     """
     Args:
@@ -176,7 +318,7 @@ def semex_list(ctx, args):
     Prints the current semexes.
     """
     for name, semex in ctx.semexes().iteritems():
-        pp("  %s: %s" % (name, str(semex.semex)))
+        pp("  %s: %s" % (name, str(semex)))
 
 def semex_add(ctx, args):
     """
@@ -188,19 +330,26 @@ def semex_add(ctx, args):
         args.name (str) - used to refer to the semex
         args.semex-str (str) - the semex in string form. A valid argument to
             semex.parser.compile_regex
+        args.edges (str) - if not None, the semex only walks these edge
+            types. A valid argument to graph.parse_edge_types
 
     Returns: None
     """
-    from vinge.semex.parser import compile_regex, RegexParseException
-    from vinge.semex.ast_to_semex import ast_to_semex
+    from vinge.semex.parser import RegexParseException
     name = args.name
     # argparse gives us an array of strings as the semex-str. We want a string
     semex_str = ' '.join(getattr(args, 'semex-str'))
+    edge_types = None
+    if args.edges is not None:
+        try:
+            edge_types = parse_edge_types(args.edges)
+        except ValueError, ve:
+            error(ve)
+            return
     try:
-        semex_ast = compile_regex(semex_str)
-        semex = ast_to_semex(ctx.graph, ctx.transition, ctx.transition_op, semex_ast)
+        semex = ctx.compile_semex(semex_str, edge_types)
         # Add to the context
-        ctx.add_semex(name, semex)
+        ctx.add_semex(name, semex, edge_types=edge_types)
         pp('Successfully added path set')
     except RegexParseException, rpe:
         error("Error parsing path set (semex) '%s': %s"%(semex_str, rpe.message))
@@ -241,10 +390,11 @@ def semex_peek(ctx, args):
         error("Error unknown path set '%s'" % name)
     semex = active_semex.semex
 
-    new_semex = make_semex_starting_here(ctx.transition, ctx.transition_op,
-                                         ctx.graph, ctx.graph_number_of_nodes(),
+    (transition, transition_op) = ctx.walk(active_semex.edge_types)
+    new_semex = make_semex_starting_here(transition, transition_op,
+                                         ctx.nodes, ctx.graph_number_of_nodes(),
                                          semex, node)
     most_likely = most_likely_endpoints(new_semex, ctx.graph_number_of_nodes())
     for (idx, val) in most_likely:
-        endpoint = ctx.graph.nodes()[idx]
+        endpoint = ctx.node(idx)
         pp("%s [%e]" % (str(endpoint)[:80], val))
@@ -1,28 +1,70 @@
-from networkx import to_scipy_sparse_matrix
-from scipy.sparse.linalg import aslinearoperator
+import numpy as np
 
+from graph import EdgeType, TransitionLayers
+from node_index import NodeIndex
 from node_ref import NodeRefType
+from search import SearchIndex
+from vertex import NodeKind
 
 class ActiveSemex(object):
     """
     Simple wrapper around a semex that includes an active boolean.
-    This is just a named tuple.
+
+    A semex is tied to the size and transition matrix of the graph it was
+    compiled against. When the graph grows the context marks its semexes
+    stale, and each is compiled again the first time it is used.
 
     Attributes:
         semex (semex.semex.Semex)
         active (bool)
+        edge_types (tuple of int) graph.EdgeTypes the semex walks, or None
+            for all of them
     """
-    def __init__(self, semex, active=True):
-        self.semex = semex
+    def __init__(self, semex, active=True, edge_types=None):
+        self._semex = semex
         self.active = active
+        self.edge_types = edge_types
+        # Context to compile the semex against again, None if it is current
+        self._stale_in = None
+
+    @property
+    def semex(self):
+        if self._stale_in is not None:
+            # The string form of a semex is a valid semex
+            self._semex = self._stale_in.compile_semex(str(self._semex),
+                                                       self.edge_types)
+            self._stale_in = None
+        return self._semex
+
+    def mark_stale(self, ctx):
+        """
+        Args:
+            ctx (Context) the semex is compiled against when next used
+        """
+        self._stale_in = ctx
+
+    def __str__(self):
+        # Doesn't need the semex to be current
+        return str(self._semex)
 
 class Context(object):
     """
     Simple wrapper to define the state the program is working with.
 
+    The context keeps the transition matrix and the node_table.NodeTable
+    of the graph it is made from. Vertices handed out by the context are
+    views made by the table.
+
     Attributes:
-        graph (networkx.DiGraph)
+        nodes (node_table.NodeTable)
+        transition (scipy.sparse.csr_matrix) transition matrix of the graph
+        transition_op (scipy.sparse.linalg.LinearOperator) of transition
+        layers (graph.TransitionLayers) transition split by edge type. The
+            context doesn't merge a growing graph's edge block (see
+            graph.Graph) until a matrix is asked for.
         posn (vertext.Vertex) the current focus of the graph
+        hits (numpy.array of int) idx of the results of the last find
+        hits_shown (int) how many of hits have been printed
         _semexes (dict str -> ActiveSemex):
             maps name of semex to the ActiveSemex. The ActiveSemex's
             active attribute is used by the context to keep track of semex
@@ -32,24 +74,134 @@ class Context(object):
     def __init__(self, graph, posn=None):
         """
         Args:
-            graph (networkx.DiGraph)
+            graph (graph.Graph)
             posn (vertex.Vertex) node currently 'focused' on
         """
-        self.graph = graph
         self._graph_number_of_nodes = graph.number_of_nodes()
         self.posn = posn
         self._semexes = {}
 
-        # Compute adjacency matrix and linear operator of adjacency matrix
-        # For graph. We need this for our semexes.
-        # TODO(trevor) this should be somewhere else. Here be some leaky abstracitions.
-        self.transition = to_scipy_sparse_matrix(self.graph)
-        self.transition_op = aslinearoperator(self.transition)
+        self.layers = TransitionLayers(graph.matrix, graph.matrix_types,
+                                       graph.block)
+        self.nodes = graph.nodes
+        self._index = None
+        self._search_index = None
+        self.hits = np.zeros(0, dtype=int)
+        self.hits_shown = 0
+
+    @property
+    def transition(self):
+        return self.layers.transition()
+
+    @property
+    def transition_op(self):
+        # Linear operator of the adjacency matrix. We need this for our
+        # semexes.
+        return self.layers.transition_op()
 
     def graph_number_of_nodes(self):
         # This is just here to cache this lookup. Probably should go elsewhere?
         return self._graph_number_of_nodes
 
+    def node(self, idx):
+        """
+        Args:
+            idx (int) see vertex.Vertex.idx
+
+        Returns:
+            vertex.Vertex
+        """
+        return self.nodes.vertex(idx)
+
+    def index(self):
+        """
+        Made the first time it is asked for, and extended as the graph
+        grows.
+
+        Returns:
+            node_index.NodeIndex of nodes
+        """
+        if self._index is None:
+            self._index = NodeIndex(self.nodes)
+        return self._index
+
+    def search_index(self):
+        """
+        Made the first time it is asked for, and extended as the graph
+        grows.
+
+        Returns:
+            search.SearchIndex of nodes
+        """
+        if self._search_index is None:
+            self._search_index = SearchIndex(self.nodes)
+        return self._search_index
+
+    def update_graph(self, graph):
+        """
+        Used when the graph has grown (see vinge.follow). Catches the
+        layers and the indexes up with the new vertices and edges, which
+        costs in proportion to how many there are. The semexes are tied to
+        the size and transition matrix of the graph, so they are marked
+        stale, to be compiled again when next used. That costs a sensor
+        vector over all the vertices, but no merge of the edge block (see
+        walk).
+
+        Args:
+            graph (graph.Graph) the grown graph
+        """
+        if graph.nodes is not self.nodes:
+            self.nodes = graph.nodes
+            self._index = None
+            self._search_index = None
+        if self._index is not None:
+            self._index.extend()
+        if self._search_index is not None:
+            self._search_index.extend()
+        self._graph_number_of_nodes = graph.number_of_nodes()
+        self.layers.grow(graph.matrix, graph.matrix_types, graph.block)
+        for active_semex in self._semexes.itervalues():
+            active_semex.mark_stale(self)
+
+    def compile_semex(self, semex_str, edge_types=None):
+        """
+        Args:
+            semex_str (str) see semex.parser.compile_regex
+            edge_types see walk
+
+        Returns:
+            semex.semex.Semex of the graph that only walks edges of
+            edge_types
+
+        Raises:
+            semex.parser.RegexParseException if semex_str doesn't parse
+        """
+        from vinge.semex.parser import compile_regex
+        from vinge.semex.ast_to_semex import ast_to_semex
+        ast = compile_regex(semex_str)
+        (transition, transition_op) = self.walk(edge_types)
+        return ast_to_semex(self.nodes, transition, transition_op, ast)
+
+    def walk(self, edge_types=None):
+        """
+        Args:
+            edge_types (iterable of int) graph.EdgeTypes, or None for all
+
+        Returns:
+            (fun () -> scipy.sparse.csr_matrix,
+             scipy.sparse.linalg.LinearOperator) the transition matrix and
+            its linear operator for semexes that only walk edges of
+            edge_types. See graph.TransitionLayers. Making the matrix merges
+            the edge block of a growing graph, which costs as much as the
+            whole graph, so it is only made if the function is called.
+        """
+        return (lambda: self.layers.transition(edge_types),
+                self.layers.transition_op(edge_types))
+
+    def _neighbor_indexes(self, node):
+        # numpy.array of the idx of the nodes node has an edge to
+        return self.layers.neighbors(None, node.idx())
+
     def sorted_neighbors(self, node):
         """
         Returns the neighbors of node. Sorted in a way that will remain stable
@@ -62,7 +214,26 @@ class Context(object):
         Returns:
             list of vertex.Vertex
         """
-        return sorted(self.graph[node])
+        return sorted(self.node(idx)
+                      for idx in self._neighbor_indexes(node).tolist())
+
+    def adjacent_lines(self, node):
+        """
+        Args:
+            node (vertex.Vertex)
+
+        Returns:
+            (vertex.Vertex, vertex.Vertex) the log lines before and after
+            node, either of which is None if there isn't one or node isn't a
+            log line
+        """
+        if node.kind != NodeKind.NodeKindLogLineVertex:
+            return (None, None)
+        # A log line has at most one edge of each adjacent type
+        before = self.layers.neighbors(EdgeType.ADJACENT_PREV, node.idx())
+        after = self.layers.neighbors(EdgeType.ADJACENT_NEXT, node.idx())
+        return (self.node(before[0]) if len(before) else None,
+                self.node(after[0]) if len(after) else None)
 
     def semexes(self):
         """
@@ -71,8 +242,15 @@ class Context(object):
         """
         return self._semexes
 
-    def add_semex(self, name, semex, active=True):
-        self._semexes[name] = ActiveSemex(semex, active)
+    def add_semex(self, name, semex, active=True, edge_types=None):
+        """
+        Args:
+            name (str)
+            semex (semex.semex.Semex) made with walk(edge_types)
+            active (bool)
+            edge_types see walk
+        """
+        self._semexes[name] = ActiveSemex(semex, active, edge_types)
 
     def remove_semex(self, name):
         del self._semexes[name]
@@ -101,12 +279,18 @@ class Context(object):
         if node_ref.type == NodeRefType.CURRENT:
             node = self.posn
         elif node_ref.type == NodeRefType.NEIGHBOR:
-            num_neighbors = len(self.graph[self.posn])
+            nbrs = self.sorted_neighbors(self.posn)
             idx = node_ref.neighbor_index
-            if idx >= num_neighbors:
+            if idx >= len(nbrs):
                 msg = "Neighbor index out of bounds: "\
                     "got %d, but only %d neighbors"
-                msg = msg % (idx, num_neighbors)
+                msg = msg % (idx, len(nbrs))
                 raise ValueError(msg)
-            node = self.sorted_neighbors(self.posn)[idx]
+            node = nbrs[idx]
+        elif node_ref.type == NodeRefType.HIT:
+            idx = node_ref.hit_index
+            if idx >= len(self.hits):
+                msg = "Hit index out of bounds: got %d, but only %d hits"
+                raise ValueError(msg % (idx, len(self.hits)))
+            node = self.node(self.hits[idx])
         return node
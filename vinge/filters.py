@@ -34,6 +34,13 @@ def id(v):
     else:
         return 0.0
 
+def template(v):
+    # IMPORTANT See module comments before editing this
+    if v.kind == NodeKind.NodeKindTemplateVertex:
+        return 1.0
+    else:
+        return 0.0
+
 def number_of_es(v):
     if v.kind == NodeKind.NodeKindLogLineVertex:
         return v.message.lower().count('e')
@@ -41,3 +48,12 @@ def number_of_es(v):
         return 0.0
     elif v.kind == NodeKind.NodeKindTagVertex:
         return v.word.lower().count('e')
+    elif v.kind == NodeKind.NodeKindTemplateVertex:
+        return v.text.lower().count('e')
+
+# These only look at the kind of the vertex, which lets
+# node_table.NodeTable.sensor_vector evaluate them without making vertices
+tag.node_kind = NodeKind.NodeKindTagVertex
+logline.node_kind = NodeKind.NodeKindLogLineVertex
+id.node_kind = NodeKind.NodeKindUniqueIDVertex
+template.node_kind = NodeKind.NodeKindTemplateVertex
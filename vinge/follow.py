@@ -0,0 +1,149 @@
+"""
+Follow mode: keeps a vinge session up to date as lines are appended to the
+log, like tail -f.
+
+Only the appended lines are parsed and tokenized. They are linked into the
+existing graph by graph.GraphBuilder, which keeps their edges in the graph's
+edge block rather than copying the transition matrix (see graph.Graph), and
+the context's layers and indexes are extended with them. A poll costs in
+proportion to the number of new lines.
+"""
+
+from graph import GraphBuilder
+from log_format import DEFAULT_FORMAT_NAME, detect_format, get_format
+from parser import DEFAULT_BATCH_SIZE, parse_log_batches
+
+class LogFollower(object):
+    """
+    Usage:
+        follower = LogFollower(filename, time_weighting)
+        ctx = Context(follower.start())
+        follower.attach(ctx)
+        ...
+        follower.poll() # whenever the session should catch up with the log
+
+    Attributes:
+        filename (str)
+        log_format (log_format.LogFormat)
+        builder (graph.GraphBuilder)
+    """
+    def __init__(self, filename, time_weighting, log_format=None,
+                 batch_size=DEFAULT_BATCH_SIZE, **edge_weights):
+        """
+        Args:
+            filename (str)
+            time_weighting see graph.make_graph
+            log_format (log_format.LogFormat or str) see parser.parse_log
+            batch_size (int) see parser.parse_log_batches
+            edge_weights keyword arguments of graph.make_graph
+        """
+        self.filename = filename
+        if log_format is None:
+            with open(filename, 'r') as file:
+                log_format = detect_format(file)
+            if log_format is None:
+                log_format = get_format(DEFAULT_FORMAT_NAME)
+        elif isinstance(log_format, basestring):
+            log_format = get_format(log_format)
+        self.log_format = log_format
+        self.builder = GraphBuilder(time_weighting, **edge_weights)
+        self._batch_size = batch_size
+        self._ctx = None
+        # Byte offset and line number of the first line not yet ingested
+        self._offset = 0
+        self._line_number = 0
+
+    def start(self):
+        """
+        Ingests the log as it is now.
+
+        Returns:
+            graph.Graph the graph that later polls will extend
+        """
+        self._ingest()
+        return self.builder.finish(freeze=False)
+
+    def attach(self, ctx):
+        """
+        Args:
+            ctx (context.Context) will be updated by every poll that finds
+                new lines. Its graph must be the graph returned by start.
+        """
+        self._ctx = ctx
+
+    def poll(self):
+        """
+        Ingests the complete lines appended to the log since the last poll.
+        A partially written last line is left for the next poll.
+
+        Returns:
+            int number of new lines (conforming or not)
+
+        Raises:
+            IOError if the log has been truncated or can't be read
+        """
+        old_line_number = self._line_number
+        self._ingest()
+        num_lines = self._line_number - old_line_number
+        if num_lines == 0:
+            return 0
+        self.builder.normalize_pending()
+        if self._ctx is not None:
+            self._ctx.update_graph(self.builder.graph)
+        return num_lines
+
+    def _ingest(self):
+        first_line_number = self._line_number
+        with open(self.filename, 'rb') as file:
+            file.seek(0, 2)
+            if file.tell() < self._offset:
+                raise IOError("%s has been truncated" % self.filename)
+            file.seek(self._offset)
+            lines = self._complete_lines(file)
+            for batch in parse_log_batches(lines, self._batch_size,
+                                           self.log_format):
+                for vertex in batch.vertices:
+                    vertex.line_number += first_line_number
+                self.builder.add_batch(batch)
+
+    def _complete_lines(self, file):
+        # Yields the lines of file that end in a newline, keeping track of
+        # how far into the log we have got
+        while True:
+            line = file.readline()
+            if not line.endswith('\n'):
+                return
+            self._offset += len(line)
+            self._line_number += 1
+            yield line
+
+def poll_command(follower, info, error):
+    """
+    Makes the function the repl calls before every command in follow mode
+    (see repl.repl's before_command).
+
+    It polls follower and reports the new lines. If the log can't be read
+    any more (it was truncated, rotated or deleted) the error is reported
+    and following stops, rather than ending the session.
+
+    Args:
+        follower (LogFollower)
+        info (fun str -> None) prints a message, like kct.output.info
+        error (fun str -> None) prints an error, like kct.output.error
+
+    Returns:
+        fun () -> None
+    """
+    state = {'following' : True}
+    def before_command():
+        if not state['following']:
+            return
+        try:
+            num_lines = follower.poll()
+        except IOError, e:
+            error("%s, no longer following it" % e)
+            state['following'] = False
+            return
+        if num_lines > 0:
+            info("%d new log lines" % num_lines)
+    return before_command
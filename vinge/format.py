@@ -1,10 +1,12 @@
+import os
+
 from kct.color import *
 
-from tokens import TokenType
-from tokens import tokenize
+from postings import ID, message_spans, TAG
 
-from vertex import LogLineVertex
+from vertex import BaseLogLineVertex
 from vertex import TagVertex
+from vertex import TemplateVertex
 from vertex import UniqueIDVertex
 
 def shorten_color_str(string, len):
@@ -28,22 +30,36 @@ def format_id(string):
 def format_tag(string):
     return cyan(string)
 
-def format_vertex(vertex):
+def format_vertex(vertex, table=None):
     """
     Helper method that switches on the type of vertex and selects the format
-    function.
+    function. Given the table the vertex is from, the rendering is cached in
+    the table (see node_table.NodeTable.renders), as the same lines get
+    printed over and over while navigating.
 
     Args:
         vertex(subclass of vertex.Vertex)
+        table (node_table.NodeTable) the table vertex is a view of, or None
 
     Returns: str
     """
-    if isinstance(vertex, LogLineVertex):
+    if table is None:
+        return _format_vertex(vertex)
+    ret = table.renders.get(vertex.idx())
+    if ret is None:
+        ret = _format_vertex(vertex)
+        table.renders.put(vertex.idx(), ret)
+    return ret
+
+def _format_vertex(vertex):
+    if isinstance(vertex, BaseLogLineVertex):
         return format_log_line_vertex(vertex)
     elif isinstance(vertex, UniqueIDVertex):
         return format_unique_id_vertex(vertex)
     elif isinstance(vertex, TagVertex):
         return format_tag_vertex(vertex)
+    elif isinstance(vertex, TemplateVertex):
+        return format_template_vertex(vertex)
     # else ... broken type system.
     return ''
 
@@ -52,22 +68,32 @@ def format_log_line_vertex(vertex):
     Formats the log line as a string with ids and tags highlighted.
 
     Args:
-        vertex (vertex.LogLineVertex)
+        vertex (vertex.BaseLogLineVertex)
 
     Returns: str
     """
-    msg = ""
-    # Tokenize the message
-    for (token, token_type) in tokenize(vertex.message):
-        fmt = token
-        if token_type is TokenType.TAG:
-            fmt = format_tag(fmt)
-        elif token_type is TokenType.ID:
-            fmt = format_id(fmt)
-        msg += '%s' % fmt
+    message = vertex.message
+    # Where the tags and ids are, kept from parsing if possible
+    spans = vertex.token_spans()
+    if spans is None:
+        spans = message_spans(message)
+    parts = []
+    # Copy the text between the tags and ids as is
+    done = 0
+    for (start, end, kind) in spans:
+        parts.append(message[done:start])
+        if kind == TAG:
+            parts.append(format_tag(message[start:end]))
+        elif kind == ID:
+            parts.append(format_id(message[start:end]))
+        done = end
+    parts.append(message[done:])
+    msg = ''.join(parts)
 
     # Rebuild the log message now
     ret = "%s [%s] %s" % (vertex.time, format_tag(vertex.thread_id), msg)
+    if vertex.source is not None:
+        ret = "%s %s" % (os.path.basename(vertex.source), ret)
 
     return ret
 
@@ -82,6 +108,17 @@ def format_tag_vertex(vertex):
     """
     return "%s %s" % (format_tag(vertex.word), vertex.time)
 
+def format_template_vertex(vertex):
+    """
+    Formats template vertex as the template highlighted with the date
+
+    Args:
+        vertex (vertex.TemplateVertex)
+
+    Returns: str
+    """
+    return "%s %s" % (green(vertex.text), vertex.time)
+
 def format_unique_id_vertex(vertex):
     """
     Formats unique id vertex as the id highlighted
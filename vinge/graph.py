@@ -1,7 +1,12 @@
-
 import networkx as nx
 import numpy as np
-from vertex import UniqueIDVertex, TagVertex
+from scipy import sparse
+from scipy.sparse.linalg import aslinearoperator, LinearOperator
+
+from node_table import NodeTable
+from postings import ID, PostingsMap, TAG
+from vertex import NodeKind
+from weighting import time_weights
 
 def normalize_graph(g):
     '''For each vertex, normalize the weights of its out-edges so they
@@ -22,38 +27,559 @@ def normalize_graph(g):
             for v in nbrs:
                 nbrs[v]['weight'] *= itotwt
 
+def normalize_rows(matrix, rows=None):
+    """
+    Scales rows of a sparse matrix in place so they sum to 1.0, like
+    normalize_graph does for the out edges of a networkx graph. Rows that sum
+    to 0.0 are left alone. Weights are assumed non-negative.
+
+    Only the entries of the given rows are looked at, so renormalizing a few
+    rows of a big matrix is cheap.
+
+    Args:
+        matrix (scipy.sparse.csr_matrix)
+        rows (numpy.array of int) rows to normalize, or None for all of them
+
+    Returns:
+        numpy.array of float sum of every row before it was scaled, lined up
+        with rows (or by row if rows is None)
+    """
+    if rows is None:
+        rows = np.arange(matrix.shape[0])
+    rows = np.asarray(rows, dtype=np.int64)
+    (positions, segments) = _row_positions(matrix.indptr, rows)
+    data = matrix.data
+    totals = np.bincount(segments, weights=data[positions],
+                         minlength=len(rows))
+    scale = np.ones(len(rows))
+    nonzero = totals > 0.0
+    scale[nonzero] = 1.0 / totals[nonzero]
+    data[positions] *= scale[segments]
+    return totals
+
+def _row_positions(indptr, rows):
+    """
+    Args:
+        indptr (numpy.array of int) of a CSR matrix
+        rows (numpy.array of int)
+
+    Returns:
+        (numpy.array of int, numpy.array of int) the positions in a CSR
+        matrix's data of the entries of rows, and for each which of rows it
+        is in
+    """
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    segments = np.repeat(np.arange(len(rows)), lengths)
+    # Position of every entry of rows, counting from the first of its row
+    within = np.arange(len(segments)) - \
+        np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return (starts[segments] + within, segments)
+
 class EdgeType:
     """
     This is a bit janky -- the enum types here make restrictions on what nodes
     can use the different edges. Just be aware of this.
     """
 
-    ADJACENT_PREV = 0,
+    ADJACENT_PREV = 0
     """
     LogLine to LogLine. Directional used to show the child node appeared
     previous to the parent in the original file.
     """
 
-    ADJACENT_NEXT = 1,
+    ADJACENT_NEXT = 1
     """
     LogLine to LogLine. Directional used to show the child node appeared post
     to the parent in the original file.
     """
 
-    DATA_TO_META = 2,
+    DATA_TO_META = 2
     """
     LogLine to tag or id node.
     """
 
-    META_TO_DATA = 3,
+    META_TO_DATA = 3
     """
     Tag or id node to LogLine.
     """
 
     META_TO_META = 4
     """
-    Currently used for tag to tag.
+    Tag to tag, and template to template.
+    """
+
+class Graph(object):
+    """
+    The graph of a log, as a sparse matrix. make_graph and GraphBuilder make
+    these.
+
+    Edge (u, v) is entry [u, v] of transition, where u and v are vertex idx
+    (see vertex.Vertex.idx). The vertices are kept in a node_table.NodeTable
+    rather than as Python objects.
+
+    A graph that keeps growing (see GraphBuilder.normalize_pending) keeps
+    the edges added since its matrix was last put together apart, in an
+    EdgeBlock, so adding a few edges doesn't copy the whole matrix. The
+    block is merged into the matrix once it is big enough, or when
+    transition or edge_types is asked for. TransitionLayers walk the matrix
+    and the block without merging them.
+
+    Attributes:
+        nodes (node_table.NodeTable)
+        transition (scipy.sparse.csr_matrix) edge weights, normalized so
+            every row with any weight sums to 1.0
+        edge_types (numpy.array of int8) EdgeType of every edge, lined up
+            with transition.data
+        matrix (scipy.sparse.csr_matrix) transition as of the last merge,
+            which can have fewer nodes than the graph
+        matrix_types (numpy.array of int8) edge_types as of the last merge
+        totals (numpy.array of float) total out weight of every node of
+            matrix, that its row was normalized by
+        block (EdgeBlock) the edges added since the last merge, or None
     """
+    def __init__(self, nodes, transition, edge_types, totals=None):
+        self.nodes = nodes
+        self.matrix = transition
+        self.matrix_types = edge_types
+        self.totals = totals
+        self.block = None
+
+    @property
+    def transition(self):
+        self.merge_block()
+        return self.matrix
+
+    @property
+    def edge_types(self):
+        self.merge_block()
+        return self.matrix_types
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def number_of_nodes(self):
+        return len(self.nodes)
+
+    def number_of_edges(self):
+        ret = self.matrix.nnz
+        if self.block is not None:
+            ret += len(self.block)
+        return ret
+
+    def merge_block(self):
+        """
+        Puts the edges of the block into the matrix. This copies the whole
+        matrix.
+        """
+        if self.block is None:
+            return
+        (self.matrix, self.matrix_types, self.totals) = \
+            self.block.merge(self.matrix, self.matrix_types)
+        self.block = None
+
+    def to_networkx(self):
+        """
+        Exports the graph, for anything that wants networkx (or for
+        tests). Vinge itself doesn't need it.
+
+        Returns:
+            networkx.DiGraph whose nodes are views of the vertices, and whose
+            edges have 'weight' and 'edge_type' data
+        """
+        vertices = self.nodes.vertices()
+        g = nx.DiGraph()
+        g.add_nodes_from(vertices)
+        transition = self.transition
+        rows = np.repeat(np.arange(len(vertices)), np.diff(transition.indptr))
+        for (u, v, weight, edge_type) in zip(rows.tolist(),
+                                             transition.indices.tolist(),
+                                             transition.data.tolist(),
+                                             self.edge_types.tolist()):
+            g.add_edge(vertices[u], vertices[v], weight=weight,
+                       edge_type=edge_type)
+        return g
+
+BLOCK_MERGE_FRACTION = 0.25
+"""
+A growing Graph merges its EdgeBlock into its matrix once the block has
+this many edges per edge of the matrix. Merging copies the matrix, so the
+cost of merging is amortized over the edges that made the block.
+"""
+
+class EdgeBlock(object):
+    """
+    The edges added to a growing Graph since its matrix was last put
+    together. Adding edges to the block costs in proportion to their number.
+
+    The weights are kept as they were added, not normalized. Instead every
+    node has a scale for its row of the matrix and one for its edges in the
+    block: row u of the transition matrix is row u of the matrix times
+    matrix_scales[u], plus the block edges out of u times scales[u]. When u
+    gets new out edges only these two numbers change, however many edges u
+    already has.
+
+    Attributes:
+        size (int) number of nodes of the graph
+        sources, targets (numpy.array of int64) of every edge in the block
+        weights (numpy.array of float64) of every edge, not normalized
+        types (numpy.array of int8) EdgeType of every edge
+        matrix_scales (numpy.array of float64) by idx, for the nodes of the
+            matrix
+        scales (numpy.array of float64) by idx
+    """
+    def __init__(self, matrix_totals):
+        """
+        Args:
+            matrix_totals (numpy.array of float) see Graph.totals
+        """
+        self._matrix_totals = matrix_totals
+        self.matrix_scales = np.ones(len(matrix_totals))
+        self._edges = _Columns([('sources', np.int64, 0),
+                                ('targets', np.int64, 0),
+                                ('weights', np.float64, 0.0),
+                                ('types', np.int8, 0)])
+        self._nodes = _Columns([('totals', np.float64, 0.0),
+                                ('scales', np.float64, 1.0)])
+        self._nodes.resize(len(matrix_totals))
+        self._nodes.totals[:] = matrix_totals
+        self._trim()
+
+    def __len__(self):
+        return len(self._edges)
+
+    def add(self, size, sources, targets, weights, types):
+        """
+        Adds edges to the block, and grows the graph to size nodes.
+
+        Args:
+            size (int)
+            sources, targets, weights, types (numpy.array) the edges, see
+                the attributes. Each must not be in the graph yet.
+
+        Returns:
+            numpy.array of int idx of the nodes whose out edges changed
+        """
+        edges = self._edges
+        start = len(edges)
+        edges.resize(start + len(sources))
+        edges.sources[start:] = sources
+        edges.targets[start:] = targets
+        edges.weights[start:] = weights
+        edges.types[start:] = types
+        self._nodes.resize(size)
+        self._trim()
+
+        (changed, inverse) = np.unique(sources, return_inverse=True)
+        totals = self._nodes.totals
+        totals[changed] += np.bincount(inverse, weights=weights)
+        # Rows that sum to 0.0 are left alone, as normalize_rows does
+        changed_totals = totals[changed]
+        positive = changed_totals > 0.0
+        self.scales[changed[positive]] = 1.0 / changed_totals[positive]
+        in_matrix = positive & (changed < len(self.matrix_scales))
+        self.matrix_scales[changed[in_matrix]] = \
+            self._matrix_totals[changed[in_matrix]] / changed_totals[in_matrix]
+        return changed
+
+    def merge(self, matrix, matrix_types):
+        """
+        Args:
+            matrix (scipy.sparse.csr_matrix) see Graph.matrix
+            matrix_types (numpy.array of int8) see Graph.matrix_types
+
+        Returns:
+            (scipy.sparse.csr_matrix, numpy.array of int8,
+             numpy.array of float) matrix with the edges of the block in
+            it, normalized, and its types and totals (see Graph). matrix
+            isn't changed.
+        """
+        weights = self.weights * self.scales[self.sources]
+        (block, block_types) = _to_csr(self.size, self.sources, self.targets,
+                                       weights, self.types)
+        (matrix, types) = _merge_csr(_scale_rows(matrix, self.matrix_scales),
+                                     matrix_types, block, block_types)
+        return (matrix, types, self._nodes.totals.copy())
+
+    def _trim(self):
+        self.size = len(self._nodes)
+        for name in ['sources', 'targets', 'weights', 'types']:
+            setattr(self, name, getattr(self._edges, name))
+        self.scales = self._nodes.scales
+
+class _Columns(object):
+    """
+    numpy arrays of the same length that grow by doubling, so growing them a
+    bit at a time is amortized linear. Each column is an attribute, a view
+    of its first len() values, so get them again after a resize.
+    """
+    def __init__(self, columns):
+        """
+        Args:
+            columns (list of (str, numpy.dtype, value)) name and type of
+                every column, and the value new rows get
+        """
+        self._spec = columns
+        self._size = 0
+        self._columns = dict((name, np.zeros(0, dtype=dtype))
+                             for (name, dtype, value) in columns)
+        self._trim()
+
+    def __len__(self):
+        return self._size
+
+    def resize(self, size):
+        """
+        Grows the columns to size rows.
+        """
+        capacity = len(self._columns[self._spec[0][0]])
+        if size > capacity:
+            capacity = max(size, 2 * capacity)
+            for (name, dtype, value) in self._spec:
+                column = np.empty(capacity, dtype=dtype)
+                column[:self._size] = self._columns[name][:self._size]
+                self._columns[name] = column
+        for (name, dtype, value) in self._spec:
+            self._columns[name][self._size:size] = value
+        self._size = size
+        self._trim()
+
+    def _trim(self):
+        for (name, dtype, value) in self._spec:
+            setattr(self, name, self._columns[name][:self._size])
+
+EDGE_TYPE_NAMES = {'adjacent_prev' : (EdgeType.ADJACENT_PREV,),
+                   'adjacent_next' : (EdgeType.ADJACENT_NEXT,),
+                   'adjacent' : (EdgeType.ADJACENT_PREV,
+                                 EdgeType.ADJACENT_NEXT),
+                   'data_to_meta' : (EdgeType.DATA_TO_META,),
+                   'meta_to_data' : (EdgeType.META_TO_DATA,),
+                   'meta_to_meta' : (EdgeType.META_TO_META,)}
+"""
+Edge types by the name users give them, see parse_edge_types.
+"""
+
+def parse_edge_types(string):
+    """
+    Args:
+        string (str) comma separated names from EDGE_TYPE_NAMES, like
+            'data_to_meta,meta_to_data'
+
+    Returns:
+        tuple of int sorted EdgeTypes
+
+    Raises:
+        ValueError if a name is unknown
+    """
+    ret = set()
+    for name in string.split(','):
+        name = name.strip().lower().replace('-', '_')
+        if name not in EDGE_TYPE_NAMES:
+            raise ValueError("Unknown edge type '%s', expected one of %s" %
+                             (name, ', '.join(sorted(EDGE_TYPE_NAMES))))
+        ret.update(EDGE_TYPE_NAMES[name])
+    return tuple(sorted(ret))
+
+class TransitionLayers(object):
+    """
+    The transition matrix of a Graph split by EdgeType, one sparse matrix
+    (layer) per edge type holding only the edges of that type.
+
+    The layers keep the normalization of the full matrix, so they sum to it.
+    A walk over only some edge types just loses the probability of the
+    other edges, and no row has to be renormalized.
+
+    Layers, and the sums of them that walks ask for, are made the first time
+    they are needed.
+
+    The layers of a growing graph are those of its matrix plus the edges of
+    its EdgeBlock (see Graph). When the graph grows, grow() keeps what was
+    made from the matrix unless the block was merged into it. The linear
+    operators of walks, and neighbors, take in the block's edges as they
+    are; only the matrices layer() and transition() return have them merged
+    in.
+
+    Usage:
+        layers = TransitionLayers(graph.transition, graph.edge_types)
+        layers.neighbors(EdgeType.ADJACENT_NEXT, idx) # next log line
+        layers.transition([EdgeType.DATA_TO_META, EdgeType.META_TO_DATA])
+    """
+    def __init__(self, transition, edge_types, block=None):
+        """
+        Args:
+            transition (scipy.sparse.csr_matrix) see Graph.matrix
+            edge_types (numpy.array of int8) see Graph.matrix_types
+            block (EdgeBlock) see Graph.block
+        """
+        self._transition = transition
+        self._edge_types = edge_types
+        # Made from the matrix alone, by edge type and by walk
+        self._matrix_layers = {}
+        self._matrix_walks = {}
+        self.grow(transition, edge_types, block)
+
+    def grow(self, transition, edge_types, block):
+        """
+        Catches up with the graph after it has grown. What was handed out
+        before is for the graph as it was.
+
+        Args: see __init__
+        """
+        if transition is not self._transition:
+            self._transition = transition
+            self._edge_types = edge_types
+            self._matrix_layers = {}
+            self._matrix_walks = {}
+        self._block = block
+        self._size = transition.shape[0] if block is None else block.size
+        # With the block's edges, by edge type and by walk
+        self._layers = {}
+        self._walks = {}
+        self._ops = {}
+        self._block_walks = {}
+
+    def layer(self, edge_type):
+        """
+        Returns:
+            scipy.sparse.csr_matrix the edges of edge_type
+        """
+        ret = self._layers.get(edge_type)
+        if ret is None:
+            ret = self._merged(self._matrix_layer(edge_type), (edge_type,))
+            self._layers[edge_type] = ret
+        return ret
+
+    def neighbors(self, edge_type, idx):
+        """
+        Args:
+            edge_type (int) or None for edges of every type
+            idx (int)
+
+        Returns:
+            numpy.array of int idx of the nodes idx has an edge_type edge to
+        """
+        if edge_type is None:
+            (matrix, key) = (self._transition, None)
+        else:
+            (matrix, key) = (self._matrix_layer(edge_type), (edge_type,))
+        ret = matrix.indices[:0]
+        if idx < matrix.shape[0]:
+            ret = matrix.indices[matrix.indptr[idx]:matrix.indptr[idx + 1]]
+        if self._block is not None:
+            (sources, targets, _, _) = self._block_walk(key)
+            ret = np.concatenate([ret, targets[sources == idx]])
+        return ret
+
+    def transition(self, edge_types=None):
+        """
+        Args:
+            edge_types (iterable of int) or None for all of them
+
+        Returns:
+            scipy.sparse.csr_matrix the sum of the layers of edge_types
+        """
+        key = _walk_key(edge_types)
+        ret = self._walks.get(key)
+        if ret is None:
+            ret = self._merged(self._matrix_walk(key), key)
+            self._walks[key] = ret
+        return ret
+
+    def transition_op(self, edge_types=None):
+        """
+        Returns:
+            scipy.sparse.linalg.LinearOperator of transition(edge_types),
+            made without merging the block into the matrix
+        """
+        key = _walk_key(edge_types)
+        ret = self._ops.get(key)
+        if ret is None:
+            if self._block is None:
+                ret = aslinearoperator(self._matrix_walk(key))
+            else:
+                ret = self._block_op(key)
+            self._ops[key] = ret
+        return ret
+
+    def _matrix_layer(self, edge_type):
+        ret = self._matrix_layers.get(edge_type)
+        if ret is None:
+            transition = self._transition
+            n = transition.shape[0]
+            mask = self._edge_types == edge_type
+            rows = np.repeat(np.arange(n), np.diff(transition.indptr))
+            indptr = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(rows[mask], minlength=n), out=indptr[1:])
+            ret = sparse.csr_matrix((transition.data[mask],
+                                     transition.indices[mask], indptr),
+                                    shape=(n, n))
+            self._matrix_layers[edge_type] = ret
+        return ret
+
+    def _matrix_walk(self, key):
+        ret = self._matrix_walks.get(key)
+        if ret is None:
+            if key is None:
+                ret = self._transition
+            else:
+                n = self._transition.shape[0]
+                ret = sparse.csr_matrix((n, n))
+                for edge_type in key:
+                    ret = ret + self._matrix_layer(edge_type)
+            self._matrix_walks[key] = ret
+        return ret
+
+    def _block_walk(self, key):
+        # (sources, targets, weights, types) of the block edges of the walk,
+        # with the weights they have in the transition matrix
+        ret = self._block_walks.get(key)
+        if ret is None:
+            block = self._block
+            edges = (block.sources, block.targets, block.weights, block.types)
+            if key is not None:
+                mask = np.in1d(block.types, key)
+                edges = tuple(column[mask] for column in edges)
+            (sources, targets, weights, types) = edges
+            ret = (sources, targets, weights * block.scales[sources], types)
+            self._block_walks[key] = ret
+        return ret
+
+    def _merged(self, matrix, key):
+        # matrix, made from the matrix for the walk key, with the walk's
+        # block edges merged in
+        if self._block is None:
+            return matrix
+        (block, _) = _to_csr(self._size, *self._block_walk(key))
+        return _merge_csr(_scale_rows(matrix, self._block.matrix_scales),
+                          None, block, None)[0]
+
+    def _block_op(self, key):
+        # Rows of the matrix scaled by the block's matrix_scales, plus the
+        # block edges
+        matrix = self._matrix_walk(key)
+        matrix_scales = self._block.matrix_scales
+        (sources, targets, weights, _) = self._block_walk(key)
+        n = self._size
+        m = matrix.shape[0]
+        def matvec(x):
+            x = np.ravel(x)
+            ret = np.bincount(sources, weights=weights * x[targets],
+                              minlength=n)
+            ret[:m] += matrix_scales * matrix.dot(x[:m])
+            return ret
+        def rmatvec(y):
+            y = np.ravel(y)
+            ret = np.bincount(targets, weights=weights * y[sources],
+                              minlength=n)
+            ret[:m] += matrix.T.dot(matrix_scales * y[:m])
+            return ret
+        return LinearOperator((n, n), matvec=matvec, rmatvec=rmatvec,
+                              dtype=np.float64)
+
+def _walk_key(edge_types):
+    if edge_types is None:
+        return None
+    return tuple(sorted(set(edge_types)))
 
 def make_graph(loglines,
                tag_map,
@@ -61,7 +587,11 @@ def make_graph(loglines,
                time_weighting,
                adjacent_logline_edge_weight=1.0,
                logline_id_edge_weight=1.0,
-               logline_tag_edge_weight=1.0):
+               logline_tag_edge_weight=1.0,
+               template_miner=None,
+               replace_tags=False,
+               logline_template_edge_weight=1.0,
+               tag_bucket_millis=None):
     """
     Creates a digraph from the argument data.
 
@@ -74,11 +604,18 @@ def make_graph(loglines,
       o LogLine nodes have one DATA_TO_META edge to each tag node.
 
       o Id nodes have one META_TO_DATA edge to each of their LogLine nodes.
+        Its weight is scaled by the LogLine's sample_weight, which is 1.0
+        unless the log was sampled (see vinge.sampling).
 
       o Tag nodes have one META_TO_DATA edge to each of their LogLine nodes.
       o Tag nodes each have two META_TO_META edges -- one to the 'previous'
         tag node and one to the 'next' tag node. 'next' and 'previous' are
-        defined by the TagVertex.time field.
+        defined by the TagVertex.millis field.
+
+      o If templates are mined, TemplateVertex nodes are linked to their log
+        lines and to each other just like tag nodes, one chain per template
+        (see vinge.templates). With replace_tags there are no tag nodes,
+        which makes for a much smaller graph.
 
       o The graph is directed, but every directed edge has a corresponding
         directed edge -- if an edge (u,v) exists then (v,u) (of some type)
@@ -87,69 +624,509 @@ def make_graph(loglines,
     TODO(trevor) once we're further along and we like this graph take a few
     minutes and make a asciigraph example.
 
+    Tag and id maps from the parser are postings.PostingsMap objects, whose
+    integer postings arrays are used directly. Plain dicts of lists of
+    vertices work too.
+
+    Vertex indexes are handed out in the order vertices are added: the log
+    lines first, in log order, then ids, tags and templates.
+
     Args:
         loglines see vinge.parser.parse_log return value
         tag_map see vinge.parser.parse_log return value
         id_map see vinge.parser.parse_log return value
         time_weighting (fun (datetime.datetime, datetime.datetime) -> float)
-            function defining the weight between tag nodes
+            function defining the weight between tag nodes, or a vectorized
+            one (see vinge.weighting)
+        adjacent_logline_edge_weight (float)
+        logline_id_edge_weight (float)
+        logline_tag_edge_weight (float)
+        template_miner (templates.TemplateMiner) if not None, adds template
+            chains. Log lines without a template_id are mined with it.
+        replace_tags (bool) if True, template chains replace the tag chains
+        logline_template_edge_weight (float)
+        tag_bucket_millis (int) if not None, the occurrences of a tag within
+            the same bucket of this many milliseconds share one TagVertex,
+            so there is a tag vertex per distinct (tag, bucket) rather than
+            per occurrence
+
+    Returns:
+        Graph
+    """
+    g = GraphBuilder(time_weighting,
+                     adjacent_logline_edge_weight,
+                     logline_id_edge_weight,
+                     logline_tag_edge_weight,
+                     template_miner,
+                     replace_tags,
+                     logline_template_edge_weight,
+                     tag_bucket_millis)
+    g.add_lines(loglines, tag_map, id_map, by_time=True)
+    return g.finish()
+
+def make_graph_from_batches(batches,
+                            time_weighting,
+                            adjacent_logline_edge_weight=1.0,
+                            logline_id_edge_weight=1.0,
+                            logline_tag_edge_weight=1.0,
+                            template_miner=None,
+                            replace_tags=False,
+                            logline_template_edge_weight=1.0,
+                            tag_bucket_millis=None):
+    """
+    Streaming version of make_graph. Builds the same graph structure from
+    the batches yielded by vinge.parser.parse_log_batches, one batch at a
+    time, without holding the full list of log lines or full tag/id maps.
+
+    The only state carried between batches is the last log line, the id
+    vertices and the last tag (and template) vertex of every tag (and
+    template), so the extra memory is bounded by the number of distinct
+    tokens rather than by the log size.
+
+    N.b. tag and template chains are linked in file order. make_graph links
+    them in time order, which is the same unless the log has lines that are
+    out of time order.
+
+    Args:
+        batches (iterable of vinge.parser.LogBatch)
+        time_weighting see make_graph
         adjacent_logline_edge_weight (float)
         logline_id_edge_weight (float)
         logline_tag_edge_weight (float)
+        template_miner see make_graph. Templates are mined a batch at a time.
+        replace_tags (bool)
+        logline_template_edge_weight (float)
+        tag_bucket_millis (int) see make_graph
 
     Returns:
-        networkx.DiGraph
-    """
-
-    g = nx.DiGraph()
-    g.add_nodes_from(loglines)
-
-    oldll = None
-    for ll in loglines:
-        if oldll is not None:
-            g.add_edge(oldll, ll, weight=adjacent_logline_edge_weight,
-                       edge_type=EdgeType.ADJACENT_NEXT)
-            g.add_edge(ll, oldll, weight=adjacent_logline_edge_weight,
-                       edge_type=EdgeType.ADJACENT_PREV)
-        oldll = ll
-
-    for id in id_map:
-        v = UniqueIDVertex(id)
-        g.add_node(v)
-        for ll in id_map[id]:
-            g.add_edge(ll, v, weight=logline_id_edge_weight,
-                       edge_type=EdgeType.DATA_TO_META)
-            g.add_edge(v, ll, weight=logline_id_edge_weight,
-                       edge_type=EdgeType.META_TO_DATA)
-
-
-    for tag in tag_map:
-        v, oldv = None, None
-
-        the_tag_occurrences = sorted(list(tag_map[tag]))
-        for ll in the_tag_occurrences:
-            oldv = v
-            v = TagVertex(tag, ll.time)
-            g.add_node(v)
-
-            # add edges between adjacent tag vertices, with
-            # weight based on how far apart the times are
-            if oldv is not None:
-                wt = time_weighting(v.time, oldv.time)
-                g.add_edge(v, oldv, weight=wt, edge_type=EdgeType.META_TO_META)
-                g.add_edge(oldv, v, weight=wt, edge_type=EdgeType.META_TO_META)
-
-            g.add_edge(ll, v, weight=logline_tag_edge_weight,
-                       edge_type=EdgeType.DATA_TO_META)
-            g.add_edge(v, ll, weight=logline_tag_edge_weight,
-                       edge_type=EdgeType.META_TO_DATA)
-                
-    # Normalize edge weights
-    normalize_graph(g)
-
-    # Add the vertex index to all nodes
-    for i, node in enumerate(g.nodes_iter()):
-        node._set_idx(i)
-        
-    g = nx.freeze(g)
-    return g
+        Graph
+    """
+    builder = GraphBuilder(time_weighting,
+                           adjacent_logline_edge_weight,
+                           logline_id_edge_weight,
+                           logline_tag_edge_weight,
+                           template_miner,
+                           replace_tags,
+                           logline_template_edge_weight,
+                           tag_bucket_millis)
+    for batch in batches:
+        builder.add_batch(batch)
+    return builder.finish()
+
+class GraphBuilder(object):
+    """
+    Builds the make_graph graph incrementally, one vinge.parser.LogBatch at a
+    time. See make_graph_from_batches.
+
+    No Python object is made per edge or per tag vertex. Every batch is
+    turned into arrays of edges (source, target, weight and type) with numpy,
+    and the vertices go straight into the columns of a NodeTable. finish()
+    sorts the edges into the sparse matrix of a Graph.
+
+    Vertex indexes are handed out in insertion order, so the graph can keep
+    growing after it is finished: batches added after finish(freeze=False)
+    are linked into the graph, and normalize_pending() adds their edges to
+    it. This is what follow mode (vinge.follow) uses.
+
+    Attributes:
+        graph (Graph) None until finished
+        nodes (node_table.NodeTable)
+        template_miner (templates.TemplateMiner) or None
+    """
+    def __init__(self,
+                 time_weighting,
+                 adjacent_logline_edge_weight=1.0,
+                 logline_id_edge_weight=1.0,
+                 logline_tag_edge_weight=1.0,
+                 template_miner=None,
+                 replace_tags=False,
+                 logline_template_edge_weight=1.0,
+                 tag_bucket_millis=None):
+        """
+        Args: see make_graph
+        """
+        self.graph = None
+        self.nodes = NodeTable()
+        self.template_miner = template_miner
+        self._time_weighting = time_weighting
+        self._adjacent_logline_edge_weight = adjacent_logline_edge_weight
+        self._logline_id_edge_weight = logline_id_edge_weight
+        self._logline_tag_edge_weight = logline_tag_edge_weight
+        self._replace_tags = replace_tags
+        self._logline_template_edge_weight = logline_template_edge_weight
+        self._tag_bucket_millis = tag_bucket_millis
+        self._frozen = False
+        # idx of the last log line, or -1
+        self._last_line = -1
+        # idx of the vertex of every id, and of the last vertex of every
+        # tag's chain, by token id in nodes.dictionary. -1 if none.
+        self._id_rows = _Rows()
+        self._last_tag_rows = _Rows()
+        # Same by template id
+        self._last_template_rows = _Rows()
+        # Edges not in the graph yet, list of (sources, targets, weights,
+        # types) arrays
+        self._pending = []
+
+    def add_batch(self, batch):
+        """
+        Args:
+            batch (vinge.parser.LogBatch)
+        """
+        self.add_lines(batch.vertices, batch.tag_map, batch.id_map)
+
+    def add_lines(self, loglines, tag_map, id_map, by_time=False):
+        """
+        Adds log lines that come after the ones already added.
+
+        Args:
+            loglines, tag_map, id_map see make_graph
+            by_time (bool) if True, the new tag and template vertices are
+                chained in time order rather than log order
+
+        Raises:
+            ValueError if the graph is frozen
+        """
+        if self._frozen:
+            raise ValueError("Can't add to a frozen graph")
+        if self.template_miner is not None:
+            for ll in loglines:
+                if ll.template_id is None:
+                    self.template_miner.add_vertex(ll)
+        nodes = self.nodes
+        start = len(nodes)
+        for (i, ll) in enumerate(loglines):
+            ll._set_idx(start + i)
+        nodes.extend(loglines)
+        lines = np.arange(start, len(nodes))
+
+        weight = self._adjacent_logline_edge_weight
+        if len(lines) > 0:
+            if self._last_line >= 0:
+                lines = np.concatenate([[self._last_line], lines])
+            self._add_edges(lines[:-1], lines[1:], weight,
+                            EdgeType.ADJACENT_NEXT)
+            self._add_edges(lines[1:], lines[:-1], weight,
+                            EdgeType.ADJACENT_PREV)
+            self._last_line = lines[-1]
+
+        (keys, rows) = self._token_occurrences(id_map, loglines, start, ID)
+        id_rows = self._id_rows.get(keys)
+        new = np.unique(keys[id_rows < 0])
+        self._id_rows.set(new, nodes.append(NodeKind.NodeKindUniqueIDVertex,
+                                            len(new), token_ids=new))
+        self._add_meta_edges(rows, self._id_rows.get(keys),
+                             self._logline_id_edge_weight)
+
+        if not self._replace_tags:
+            (keys, rows) = self._token_occurrences(tag_map, loglines, start,
+                                                   TAG)
+            self._add_chains(NodeKind.NodeKindTagVertex, 'token_ids', keys,
+                             rows, self._last_tag_rows, by_time,
+                             self._logline_tag_edge_weight,
+                             self._tag_bucket_millis)
+
+        if self.template_miner is not None:
+            (keys, rows) = self._template_occurrences(loglines, start)
+            self._add_chains(NodeKind.NodeKindTemplateVertex, 'template_ids',
+                             keys, rows, self._last_template_rows, by_time,
+                             self._logline_template_edge_weight)
+
+    def _token_occurrences(self, token_map, loglines, start, kind):
+        """
+        Returns:
+            (numpy.array of int, numpy.array of int) the token id (in
+            nodes.dictionary) and log line idx of every occurrence of every
+            token of the map. A token's occurrences are in the map's order.
+        """
+        intern = self.nodes.dictionary.intern
+        if not isinstance(token_map, PostingsMap):
+            token_ids = []
+            rows = []
+            for (token, lls) in token_map.iteritems():
+                token_ids.extend([intern(token, kind)] * len(lls))
+                rows.extend(ll.idx() for ll in lls)
+            return (np.array(token_ids, dtype=np.int64),
+                    np.array(rows, dtype=np.int64))
+
+        postings = token_map.postings
+        dictionary = postings.dictionary
+        # The postings of all the tokens are one array, sorted by token
+        tokens = np.repeat(np.arange(len(dictionary)),
+                           np.diff(postings.offsets))
+        remap = np.empty(len(dictionary), dtype=np.int64)
+        remap.fill(-1)
+        token_ids = token_map.token_ids()
+        remap[token_ids] = [intern(dictionary.tokens[token_id], kind)
+                            for token_id in token_ids.tolist()]
+        keys = remap[tokens]
+        keep = keys >= 0
+        lines = postings.indexes[keep]
+        if token_map.vertices is loglines:
+            rows = start + lines.astype(np.int64)
+        else:
+            rows = np.array([v.idx() for v in token_map.vertices],
+                            dtype=np.int64)[lines]
+        return (keys[keep], rows)
+
+    def _template_occurrences(self, loglines, start):
+        """
+        Returns:
+            (numpy.array of int, numpy.array of int) the template id and
+            idx of every log line
+        """
+        miner = self.template_miner
+        keys = np.array([ll.template_id for ll in loglines], dtype=np.int64)
+        # Templates get more general as lines are added
+        for template_id in np.unique(keys).tolist():
+            self.nodes.set_template_text(template_id,
+                                         miner.templates[template_id].text())
+        return (keys, start + np.arange(len(loglines)))
+
+    def _add_chains(self, kind, key_column, keys, rows, last_rows, by_time,
+                    weight, bucket=None):
+        """
+        Adds a vertex per occurrence, each linked to its log line and to the
+        previous vertex of the same key, one chain per key.
+
+        With a bucket, consecutive occurrences of a key in the same bucket of
+        time share one vertex instead, whose time is the start of the
+        bucket. It is linked to all of their log lines. An occurrence in the
+        bucket of the end of its chain so far joins that vertex.
+
+        Args:
+            kind (int) vertex.NodeKind of the new vertices
+            key_column (str) column of nodes the keys go in
+            keys (numpy.array of int) key of every occurrence
+            rows (numpy.array of int) log line idx of every occurrence
+            last_rows (_Rows) end of every chain so far, updated
+            by_time (bool) if True, chains are in time order rather than in
+                the order of the occurrences
+            weight (float) of the log line edges
+            bucket (int) milliseconds, or None for a vertex per occurrence
+        """
+        if len(keys) == 0:
+            return
+        nodes = self.nodes
+        millis = nodes.millis[rows]
+        # Sort by key, then time. Both sorts are stable, so ties keep their
+        # order.
+        if by_time:
+            order = np.lexsort((millis, keys))
+        else:
+            order = np.argsort(keys, kind='mergesort')
+        (keys, rows, millis) = (keys[order], rows[order], millis[order])
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+
+        # Group the occurrences that share a vertex. Without a bucket every
+        # occurrence is its own group.
+        if bucket is None:
+            starts = np.arange(len(keys))
+        else:
+            millis = millis // bucket * bucket
+            new_group = first.copy()
+            new_group[1:] |= millis[1:] != millis[:-1]
+            starts = np.flatnonzero(new_group)
+        groups = np.repeat(np.arange(len(starts)),
+                           np.diff(np.append(starts, len(keys))))
+        (group_keys, group_millis) = (keys[starts], millis[starts])
+        group_first = first[starts]
+
+        # Every group follows the one before it with the same key, and the
+        # first of every key follows the end of its chain so far
+        prev = np.empty(len(starts), dtype=np.int64)
+        prev[group_first] = last_rows.get(group_keys[group_first])
+        joins = np.zeros(len(starts), dtype=bool)
+        if bucket is not None:
+            joins[group_first] = (prev[group_first] >= 0) & \
+                (nodes.millis[prev[group_first]] == group_millis[group_first])
+        chain = np.empty(len(starts), dtype=np.int64)
+        chain[joins] = prev[joins]
+        made = ~joins
+        chain[made] = nodes.append(kind, int(made.sum()),
+                                   millis=group_millis[made],
+                                   **{key_column : group_keys[made]})
+        self._add_meta_edges(rows, chain[groups], weight)
+
+        prev[~group_first] = chain[:-1][~group_first[1:]]
+        has_prev = (prev >= 0) & made
+        (olds, news) = (prev[has_prev], chain[has_prev])
+        # Weight based on how far apart the times are
+        times = nodes.millis
+        wts = time_weights(self._time_weighting, times[news], times[olds])
+        self._add_edges(news, olds, wts, EdgeType.META_TO_META)
+        self._add_edges(olds, news, wts, EdgeType.META_TO_META)
+
+        last = np.ones(len(starts), dtype=bool)
+        last[:-1] = group_first[1:]
+        last_rows.set(group_keys[last], chain[last])
+
+    def _add_meta_edges(self, rows, metas, weight):
+        # Links log lines to their tag or id vertices, both directions.
+        # A sampled log line stands for sample_weight lines, so it is that
+        # much likelier to be reached from the meta vertex.
+        self._add_edges(rows, metas, weight, EdgeType.DATA_TO_META)
+        self._add_edges(metas, rows,
+                        weight * self.nodes.sample_weights[rows],
+                        EdgeType.META_TO_DATA)
+
+    def _add_edges(self, sources, targets, weights, edge_type):
+        sources = np.asarray(sources, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.ndim == 0:
+            weights = np.repeat(weights, len(sources))
+        self._pending.append((sources, np.asarray(targets, dtype=np.int64),
+                              weights,
+                              np.repeat(np.int8(edge_type), len(sources))))
+
+    def finish(self, freeze=True):
+        """
+        Puts the edges into a sparse matrix and normalizes it.
+
+        Args:
+            freeze (bool) if False, batches can still be added afterwards
+
+        Returns:
+            Graph
+        """
+        self.graph = Graph(self.nodes, None, None)
+        self.normalize_pending()
+        self._frozen = freeze
+        return self.graph
+
+    def normalize_pending(self):
+        """
+        Adds the edges added since finish() or the last call to the graph.
+
+        Once the graph is finished they go into its EdgeBlock (see Graph),
+        so this costs in proportion to the number of new edges, apart from
+        when the block gets big enough to be merged into the matrix.
+
+        Every edge added after finish() must have a vertex that was added
+        after it too (which is how follow mode adds lines), so it can't
+        replace an edge already in the graph.
+
+        Returns:
+            numpy.array of int idx of the nodes whose out edges changed
+        """
+        n = len(self.nodes)
+        graph = self.graph
+        edges = _concatenate_edges(self._pending)
+        self._pending = []
+        if graph.matrix is None:
+            (graph.matrix, graph.matrix_types) = _to_csr(n, *edges)
+            graph.totals = normalize_rows(graph.matrix)
+            return np.flatnonzero(np.diff(graph.matrix.indptr))
+        if graph.block is None:
+            graph.block = EdgeBlock(graph.totals)
+        changed = graph.block.add(n, *_unique_edges(*edges))
+        if len(graph.block) > BLOCK_MERGE_FRACTION * graph.matrix.nnz:
+            graph.merge_block()
+        return changed
+
+class _Rows(object):
+    """
+    Growable numpy map from int keys to vertex idx, -1 for none.
+    """
+    def __init__(self):
+        self._rows = np.zeros(0, dtype=np.int64)
+
+    def get(self, keys):
+        ret = np.empty(len(keys), dtype=np.int64)
+        ret.fill(-1)
+        known = keys < len(self._rows)
+        ret[known] = self._rows[keys[known]]
+        return ret
+
+    def set(self, keys, rows):
+        if len(keys) == 0:
+            return
+        size = int(keys.max()) + 1
+        if size > len(self._rows):
+            grown = np.empty(max(size, 2 * len(self._rows)), dtype=np.int64)
+            grown.fill(-1)
+            grown[:len(self._rows)] = self._rows
+            self._rows = grown
+        self._rows[keys] = rows
+
+def _concatenate_edges(edges_list):
+    # Joins a list of (sources, targets, weights, types) arrays
+    dtypes = [np.int64, np.int64, np.float64, np.int8]
+    return tuple(np.concatenate([np.zeros(0, dtype=dtype)] +
+                                [edges[i] for edges in edges_list])
+                 .astype(dtype, copy=False)
+                 for (i, dtype) in enumerate(dtypes))
+
+def _unique_edges(sources, targets, weights, types):
+    """
+    Returns:
+        (sources, targets, weights, types) the edges sorted by source, then
+        target. Of edges added more than once the last one is kept, as
+        networkx would.
+    """
+    # Stable, so the edges between two nodes stay in the order added
+    order = np.lexsort((targets, sources))
+    (sources, targets, weights, types) = (sources[order], targets[order],
+                                          weights[order], types[order])
+    last = np.ones(len(sources), dtype=bool)
+    last[:-1] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+    return (sources[last], targets[last], weights[last], types[last])
+
+def _to_csr(n, sources, targets, weights, types):
+    """
+    Returns:
+        (scipy.sparse.csr_matrix, numpy.array of int8) n x n matrix of the
+        weights, and the types lined up with its data. See _unique_edges.
+    """
+    (sources, targets, weights, types) = _unique_edges(sources, targets,
+                                                       weights, types)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+    matrix = sparse.csr_matrix((weights, targets, indptr), shape=(n, n))
+    return (matrix, types)
+
+def _scale_rows(matrix, scales):
+    """
+    Returns:
+        scipy.sparse.csr_matrix a copy of matrix with row i times scales[i]
+    """
+    data = matrix.data * np.repeat(scales, np.diff(matrix.indptr))
+    return sparse.csr_matrix((data, matrix.indices, matrix.indptr),
+                             shape=matrix.shape)
+
+def _merge_csr(old, old_types, new, new_types):
+    """
+    Returns:
+        (scipy.sparse.csr_matrix, numpy.array of int8) the entries of the
+        smaller matrix old and of new in one matrix the size of new, and
+        their types (None if the types given are None). Every row has the
+        entries of old first.
+    """
+    n = new.shape[0]
+    old_indptr = np.concatenate([old.indptr,
+                                 np.repeat(old.indptr[-1],
+                                           n - old.shape[0])])
+    # Entries of old move up by the number of new entries in the rows before
+    # theirs, those of new by the number of old entries up to the end of
+    # their row
+    old_positions = np.arange(old.nnz) + \
+        np.repeat(new.indptr[:-1], np.diff(old_indptr))
+    new_positions = np.arange(new.nnz) + \
+        np.repeat(old_indptr[1:], np.diff(new.indptr))
+    nnz = old.nnz + new.nnz
+    indices = np.empty(nnz, dtype=new.indices.dtype)
+    data = np.empty(nnz)
+    types = None
+    if old_types is not None:
+        types = np.empty(nnz, dtype=np.int8)
+    for (positions, matrix, matrix_types) in [(old_positions, old, old_types),
+                                              (new_positions, new,
+                                               new_types)]:
+        indices[positions] = matrix.indices
+        data[positions] = matrix.data
+        if types is not None:
+            types[positions] = matrix_types
+    matrix = sparse.csr_matrix((data, indices, old_indptr + new.indptr),
+                               shape=(n, n))
+    return (matrix, types)
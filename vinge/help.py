@@ -14,12 +14,15 @@ import kct.color as color
 # Subsequent lines should be indented two spaces
 _HELP=\
 {'node-ref' :
-     {'_msg' : "this is information about a node-ref"},
+     {'_msg' :
+          "this is information about a node-ref\n"\
+          "  cur, cur.nbrs[<index>] or hits[<index>] (see find)"},
  'path-set' :
      {'_msg' : 'Interact with path sets (semexes)',
       'add' :
-          '<name> <semex>\n'\
-          '  And some!',
+          '<name> [--edges <types>] <semex>\n'\
+          '  Adds a path set. With --edges it only walks those edge\n'\
+          '  types, e.g. --edges data_to_meta,meta_to_data',
       'list' :
           '\n'\
           '  Print the current path sets',
@@ -30,7 +33,30 @@ _HELP=\
           '<name>\n  Turns path set on or off'
       },
  'go' :
-     {'_msg' : '<index>\n  The neighbor index'},
+     {'_msg' : '<index> | <node-ref>\n  The neighbor index, or a node-ref'},
+ 'find' :
+     {'_msg' :
+          '[query]\n'\
+          '  Log lines matching the query. Terms are tags, ids,\n'\
+          '  thread:<name>, after:<time>, before:<time> and template:<id>,\n'\
+          '  combined with and (or nothing), or, not and parentheses. Hits\n'\
+          '  are node-refs hits[0], hits[1]... Without a query, the next\n'\
+          '  page of hits'},
+ 'goto' :
+     {'_msg' : 'Jump to a log line, tag or id',
+      'line' :
+          '<line-number> [file]\n'\
+          '  0 based line number, in the given log file if there are several',
+      'time' :
+          '<time>\n'\
+          '  First log line at or after the time, e.g. 12:03:05 or\n'\
+          '  2012-09-01 12:03:05.250. The date defaults to the current one',
+      'tag' :
+          '<word>\n'\
+          '  Next occurrence of the tag from the current time',
+      'id' :
+          '<id>\n  The id\'s vertex'
+      },
  'info' :
      {'_msg' :
           '[node-ref]\n'\
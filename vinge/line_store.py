@@ -0,0 +1,156 @@
+"""
+Line stores keep the raw text of a log outside of the vertices. A vertex
+backed by a line store (see vertex.StoredLogLineVertex) only holds the
+offset and length of its line, and the text is materialized on demand.
+
+A line store must implement:
+
+  text(offset, length) -> str
+"""
+
+import bisect
+import mmap
+import zlib
+
+from lru import LRUCache
+
+class MappedLineStore(object):
+    """
+    Line store backed by a read-only memory map of the log file. Offsets are
+    byte offsets into the file, so nothing but the page cache holds the text.
+    """
+    def __init__(self, filename):
+        """
+        Args:
+            filename (str)
+        """
+        self.filename = filename
+        with open(filename, 'rb') as file:
+            # mmap refuses to map an empty file
+            file.seek(0, 2)
+            if file.tell() == 0:
+                self._buf = ''
+            else:
+                self._buf = mmap.mmap(file.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self._buf)
+
+    def text(self, offset, length):
+        return self._buf[offset:offset + length]
+
+    def iter_lines(self):
+        """
+        Iterates over the lines of the file, splitting on '\n' like iterating
+        over a file object does.
+
+        Returns:
+            generator of (int, str) byte offset of the line and the line,
+            including its trailing newline
+        """
+        buf = self._buf
+        size = len(buf)
+        start = 0
+        while start < size:
+            end = buf.find('\n', start)
+            if end == -1:
+                end = size
+            else:
+                end += 1
+            yield (start, buf[start:end])
+            start = end
+
+DEFAULT_BLOCK_SIZE = 1 << 16
+"""
+Number of bytes of text BlockCompressedLineStore compresses together.
+"""
+
+DEFAULT_CACHED_BLOCKS = 16
+"""
+Number of decompressed blocks BlockCompressedLineStore keeps around.
+"""
+
+class BlockCompressedLineStore(object):
+    """
+    In memory line store that keeps its text zlib compressed, for logs that
+    can't be memory mapped (compressed logs, pipes...).
+
+    Lines are appended, and compressed in blocks of about block_size bytes.
+    A line never straddles two blocks. Reading a line decompresses its block,
+    and the most recently read blocks are kept decompressed in an LRU, so
+    reading nearby lines over and over (as displaying does) is cheap.
+
+    Offsets are positions in the uncompressed text.
+    """
+    def __init__(self, block_size=DEFAULT_BLOCK_SIZE,
+                 cached_blocks=DEFAULT_CACHED_BLOCKS):
+        """
+        Args:
+            block_size (int)
+            cached_blocks (int) size of the LRU of decompressed blocks
+        """
+        self.block_size = block_size
+        # Compressed blocks, and the offset each one starts at
+        self._blocks = []
+        self._block_starts = []
+        # Text not yet compressed, starting at _pending_start
+        self._pending = bytearray()
+        self._pending_start = 0
+        self._cache = LRUCache(cached_blocks)
+
+    def __len__(self):
+        return self._pending_start + len(self._pending)
+
+    def compressed_size(self):
+        """
+        Returns:
+            int bytes held by the store, not counting the LRU
+        """
+        return sum(len(block) for block in self._blocks) + len(self._pending)
+
+    def append(self, line):
+        """
+        Args:
+            line (str)
+
+        Returns:
+            int offset of the line
+        """
+        offset = len(self)
+        self._pending.extend(line)
+        if len(self._pending) >= self.block_size:
+            self.flush()
+        return offset
+
+    def flush(self):
+        """
+        Compresses the text appended since the last flush into a block.
+        """
+        if not self._pending:
+            return
+        self._blocks.append(zlib.compress(str(self._pending)))
+        self._block_starts.append(self._pending_start)
+        self._pending_start += len(self._pending)
+        self._pending = bytearray()
+
+    def text(self, offset, length):
+        if offset >= self._pending_start:
+            start = offset - self._pending_start
+            return str(self._pending[start:start + length])
+        i = bisect.bisect_right(self._block_starts, offset) - 1
+        start = offset - self._block_starts[i]
+        block = self._block(i)
+        ret = block[start:start + length]
+        if len(ret) < length:
+            # Only text not appended with a single append crosses blocks
+            ret += self.text(self._block_starts[i] + len(block),
+                             length - len(ret))
+        return ret
+
+    def _block(self, i):
+        block = self._cache.get(i)
+        if block is None:
+            block = zlib.decompress(self._blocks[i])
+            self._cache.put(i, block)
+        return block
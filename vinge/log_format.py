@@ -0,0 +1,348 @@
+"""
+Registry of the log formats vinge knows how to parse.
+
+A log format turns a raw log line into (epoch milliseconds, thread id,
+message). Every format has a cheap accepts() check that is run before the
+full match, so lines that cannot possibly match (stack trace continuations,
+blank lines, ...) are thrown away without running a regex.
+
+Formats are looked up by name (see get_format), or picked automatically by
+sampling the start of a log (see detect_format).
+"""
+
+import json
+import re
+
+from datetime import datetime
+from itertools import islice
+
+from timestamps import datetime_to_millis, TimestampDecoder
+
+DETECT_SAMPLE_SIZE = 100
+"""
+Number of lines detect_format looks at.
+"""
+
+DEFAULT_FORMAT_NAME = 'java'
+"""
+Format used when detection doesn't find anything.
+"""
+
+class LogFormat(object):
+    """
+    Abstract class for log formats.
+
+    Attributes:
+        name (str) name the format is registered under
+    """
+    name = None
+
+    def accepts(self, line):
+        """
+        Cheap test run before parse. Must return False only for lines that
+        parse would reject.
+
+        Args:
+            line (str) without trailing whitespace
+        """
+        raise NotImplementedError
+
+    def parse(self, line):
+        """
+        Args:
+            line (str) without trailing whitespace
+
+        Returns:
+            (int, str, str) (epoch milliseconds, thread id, log message)
+            or None if the line doesn't match
+        """
+        raise NotImplementedError
+
+    def peek(self, line):
+        """
+        Cheap look at the time and thread of a line, for deciding whether
+        to parse it at all (see parser.parse_log_file_sampled). May return
+        a value for a line parse would reject, but must agree with parse on
+        the lines it accepts and not reject any of them. The default just
+        parses the line.
+
+        Args:
+            line (str) without trailing whitespace
+
+        Returns:
+            (int, str) (epoch milliseconds, thread id) or None if the line
+            doesn't match
+        """
+        ret = self.parse(line)
+        if ret is None:
+            return None
+        return ret[:2]
+
+class JavaLogFormat(LogFormat):
+    """
+    Example log line:
+    2012-09-01 00:00:20,305 INFO  [MyThread9] c.g.o.a.FooBarBaz : This is my log message ok
+    """
+    name = 'java'
+
+    # group 1 - timestamp, see timestamps.TimestampDecoder
+    # group 2 - log level
+    # group 3 - thread id
+    # group 4 - rest of the log line
+    REGEX = re.compile(
+        r'^(\d\d\d\d-\d\d-\d\d \d\d:\d\d:\d\d,\d\d\d)\s+(\w+)\s+\[(\w+)\](.+)$')
+
+    def __init__(self):
+        self._decoder = TimestampDecoder()
+
+    def accepts(self, line):
+        return len(line) > 24 and line[4] == '-' and line[0].isdigit()
+
+    def parse(self, line):
+        if not self.accepts(line):
+            return None
+        m = self.REGEX.match(line)
+        if not m:
+            return None
+        try:
+            millis = self._decoder.decode(m.group(1))
+        except ValueError:
+            # An impossible date, e.g. February 30th
+            return None
+        return (millis, m.group(3), m.group(4))
+
+    def peek(self, line):
+        # The thread is in the first brackets after the timestamp, as the
+        # level can't contain any
+        if not self.accepts(line):
+            return None
+        start = line.find('[', 23)
+        end = line.find(']', start + 1)
+        if start < 0 or end < 0:
+            return None
+        try:
+            millis = self._decoder.decode(line[:23])
+        except ValueError:
+            return None
+        return (millis, line[start + 1:end])
+
+_MONTHS = dict((month, i + 1) for (i, month) in
+               enumerate(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                          'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']))
+
+class SyslogFormat(LogFormat):
+    """
+    BSD syslog (RFC 3164) lines. The 'thread id' is the program and pid.
+    Syslog timestamps have neither a year nor milliseconds, so the year has
+    to be supplied.
+
+    Example log line:
+    Sep  1 03:21:20 myhost myprogram[4242]: This is my log message ok
+    """
+    name = 'syslog'
+
+    # group 1 - timestamp
+    # group 2 - host
+    # group 3 - program and optional [pid]
+    # group 4 - rest of the log line
+    REGEX = re.compile(
+        r'^([A-Z][a-z][a-z] [ \d]\d \d\d:\d\d:\d\d) (\S+) ([^\s:\[]+(?:\[\d+\])?):(.*)$')
+
+    def __init__(self, year=None):
+        """
+        Args:
+            year (int) year of the log. Defaults to the current year.
+        """
+        if year is None:
+            year = datetime.now().year
+        self.year = year
+        self._prefix = None
+        self._prefix_millis = 0
+
+    def accepts(self, line):
+        return len(line) > 16 and line[3] == ' ' and line[:3] in _MONTHS
+
+    def parse(self, line):
+        if not self.accepts(line):
+            return None
+        m = self.REGEX.match(line)
+        if not m:
+            return None
+        stamp = m.group(1)
+        # Cache the month/day/hour/minute like TimestampDecoder does
+        prefix = stamp[:12]
+        if prefix != self._prefix:
+            try:
+                dt = datetime(year=self.year,
+                              month=_MONTHS[stamp[:3]],
+                              day=int(stamp[4:6]),
+                              hour=int(stamp[7:9]),
+                              minute=int(stamp[10:12]))
+            except ValueError:
+                # An impossible date, e.g. February 30th
+                return None
+            self._prefix_millis = datetime_to_millis(dt)
+            self._prefix = prefix
+        millis = self._prefix_millis + int(stamp[13:15]) * 1000
+        return (millis, m.group(3), m.group(4))
+
+# group 1-6 - year, month, day, hour, minute, second
+# group 7 - fraction of a second
+# group 8 - 'Z' or utc offset
+_ISO_8601_REGEX = re.compile(
+    r'^(\d\d\d\d)-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)(?:[.,](\d+))?\s*(Z|[+-]\d\d:?\d\d)?$')
+
+def _iso_8601_to_millis(string):
+    """
+    Returns:
+        int epoch milliseconds, or None if string is not a timestamp
+    """
+    m = _ISO_8601_REGEX.match(string)
+    if not m:
+        return None
+    try:
+        dt = datetime(*[int(m.group(i)) for i in xrange(1, 7)])
+    except ValueError:
+        return None
+    millis = datetime_to_millis(dt)
+    if m.group(7):
+        millis += int(m.group(7)[:3].ljust(3, '0'))
+    offset = m.group(8)
+    if offset and offset != 'Z':
+        sign = -1 if offset[0] == '+' else 1
+        offset = offset[1:].replace(':', '')
+        millis += sign * (int(offset[:2]) * 60 + int(offset[2:])) * 60000
+    return millis
+
+def _utf8(value):
+    # json gives us unicode. The rest of vinge works on byte strings.
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+class JsonLinesFormat(LogFormat):
+    """
+    One JSON object per line. The first key found of each of TIME_KEYS,
+    THREAD_KEYS and MESSAGE_KEYS is used. Times can be ISO 8601 strings or
+    numbers of seconds (or milliseconds) since the epoch.
+
+    Example log line:
+    {"time": "2012-09-01T03:21:20.305Z", "thread": "MyThread9", "message": "ok"}
+    """
+    name = 'json'
+
+    TIME_KEYS = ('time', 'timestamp', '@timestamp', 'ts')
+    THREAD_KEYS = ('thread', 'thread_id', 'threadName', 'logger')
+    MESSAGE_KEYS = ('message', 'msg', 'log')
+
+    def accepts(self, line):
+        return line[:1] == '{' and line[-1:] == '}'
+
+    def parse(self, line):
+        if not self.accepts(line):
+            return None
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(obj, dict):
+            return None
+        time = _first_key(obj, self.TIME_KEYS)
+        message = _first_key(obj, self.MESSAGE_KEYS)
+        if time is None or message is None:
+            return None
+        if isinstance(time, (int, long, float)) and \
+                not isinstance(time, bool):
+            # Anything this big is already in milliseconds
+            if time < 1e11:
+                time *= 1000
+            try:
+                millis = int(time)
+            except (ValueError, OverflowError):
+                # NaN or infinity
+                return None
+        elif isinstance(time, basestring):
+            millis = _iso_8601_to_millis(time)
+            if millis is None:
+                return None
+        else:
+            # An object, array or boolean
+            return None
+        thread_id = _first_key(obj, self.THREAD_KEYS)
+        if thread_id is None:
+            thread_id = ''
+        return (millis, _utf8(thread_id), _utf8(message))
+
+def _first_key(obj, keys):
+    for key in keys:
+        value = obj.get(key)
+        if value is not None:
+            return value
+    return None
+
+_FORMATS = {}
+_FORMAT_ORDER = []
+
+def register_format(log_format):
+    """
+    Adds log_format to the registry, replacing any format with the same name.
+    Formats are tried by detect_format in registration order.
+
+    Args:
+        log_format (LogFormat)
+    """
+    if log_format.name not in _FORMATS:
+        _FORMAT_ORDER.append(log_format.name)
+    _FORMATS[log_format.name] = log_format
+
+def get_format(name):
+    """
+    Args:
+        name (str)
+
+    Returns:
+        LogFormat
+
+    Raises:
+        ValueError if there is no such format
+    """
+    log_format = _FORMATS.get(name)
+    if log_format is None:
+        raise ValueError("Unknown log format '%s', known formats are: %s" %
+                         (name, ', '.join(_FORMAT_ORDER)))
+    return log_format
+
+def format_names():
+    """
+    Returns:
+        list of str, in registration order
+    """
+    return list(_FORMAT_ORDER)
+
+def detect_format(lines, sample_size=DETECT_SAMPLE_SIZE):
+    """
+    Picks the registered format that parses the most of the first
+    sample_size lines.
+
+    Args:
+        lines (iterable of str)
+        sample_size (int)
+
+    Returns:
+        LogFormat or None if no format parses any of the lines
+    """
+    sample = [line.rstrip() for line in islice(lines, sample_size)]
+    best, best_count = None, 0
+    for name in _FORMAT_ORDER:
+        log_format = _FORMATS[name]
+        count = 0
+        for line in sample:
+            if log_format.parse(line) is not None:
+                count += 1
+        if count > best_count:
+            best, best_count = log_format, count
+    return best
+
+register_format(JavaLogFormat())
+register_format(SyslogFormat())
+register_format(JsonLinesFormat())
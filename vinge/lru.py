@@ -0,0 +1,59 @@
+"""
+Small least recently used cache, for keeping the most recently needed of
+some expensive to compute values (decompressed blocks, rendered strings...).
+"""
+
+from collections import OrderedDict
+
+class LRUCache(object):
+    """
+    Maps keys to values, holding at most capacity of them. Adding to a full
+    cache evicts the key that was least recently read or written.
+    """
+    def __init__(self, capacity):
+        """
+        Args:
+            capacity (int) must be positive
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be positive, got %d" % capacity)
+        self.capacity = capacity
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        """
+        Returns:
+            the value for key, marking it as the most recently used, or
+            default if key isn't cached
+        """
+        try:
+            value = self._items.pop(key)
+        except KeyError:
+            return default
+        self._items[key] = value
+        return value
+
+    def put(self, key, value):
+        self._items.pop(key, None)
+        self._items[key] = value
+        if len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+    def keys(self):
+        """
+        Returns:
+            list of the cached keys, least recently used first
+        """
+        return self._items.keys()
+
+    def discard(self, key):
+        self._items.pop(key, None)
+
+    def clear(self):
+        self._items.clear()
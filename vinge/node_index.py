@@ -0,0 +1,282 @@
+"""
+Lookups from what a user knows about a log line (its line number, its time,
+a tag or an id in it) to a vertex, for picking the starting line and for
+the goto commands of the repl.
+
+A NodeIndex is made from the columns of a node_table.NodeTable: the log
+lines sorted by line number and by time, and the tag vertices grouped by
+word and sorted by time, and the id vertices sorted by token id, all as
+numpy arrays that are binary searched. Every lookup is O(log n).
+"""
+
+import numpy as np
+
+from postings import TAG
+from vertex import NodeKind
+
+class NodeIndex(object):
+    """
+    Lookups return the idx of a vertex (see vertex.Vertex.idx), or None if
+    there is no such vertex.
+
+    The index can keep up with a table that grows (see extend). The
+    vertices added since it was made are indexed apart, and a part is
+    merged with the one before it once it is as big, so there are only
+    O(log n) parts and a vertex is indexed O(log n) times over.
+
+    Attributes:
+        table (node_table.NodeTable)
+    """
+    def __init__(self, table):
+        """
+        Args:
+            table (node_table.NodeTable)
+        """
+        self.table = table
+        self._parts = []
+        self.extend()
+
+    def extend(self):
+        """
+        Indexes the vertices added to the table since the index was made or
+        last extended.
+        """
+        extend_parts(self._parts, _NodeIndexPart, self.table)
+
+    def line(self, line_number, source=None):
+        """
+        Args:
+            line_number (int) 0 based line number in its log file
+            source (str) the log file, when vinge is looking at several (see
+                vertex.BaseLogLineVertex.source). If None, the first line with
+                that number in the log.
+
+        Returns:
+            int idx of the log line
+        """
+        for part in self._parts:
+            ret = part.line(line_number, source)
+            if ret is not None:
+                return ret
+        return None
+
+    def time(self, millis):
+        """
+        Args:
+            millis (int) epoch milliseconds
+
+        Returns:
+            int idx of the first log line at or after millis, or of the last
+            log line if they are all before it
+        """
+        found = _earliest(part.time(millis) for part in self._parts)
+        if found is None:
+            last = [part.last_time() for part in self._parts]
+            last = [time for time in last if time is not None]
+            if not last:
+                return None
+            found = max(last)
+        return found[1]
+
+    def first_millis(self):
+        """
+        Returns:
+            int time of the earliest log line
+        """
+        found = _earliest(part.first_time() for part in self._parts)
+        if found is None:
+            return None
+        return found[0]
+
+    def tag(self, word, millis=None):
+        """
+        Args:
+            word (str)
+            millis (int) if not None, the first occurrence of word at or
+                after this time, wrapping around to the first occurrence
+                if there is none
+
+        Returns:
+            int idx of the tag vertex
+        """
+        token_id = self._tag_token_id(word)
+        if token_id is None:
+            return None
+        found = None
+        if millis is not None:
+            found = _earliest(part.tag(token_id, millis)
+                              for part in self._parts)
+        if found is None:
+            found = _earliest(part.tag(token_id) for part in self._parts)
+        if found is None:
+            return None
+        return found[1]
+
+    def count_tag(self, word):
+        """
+        Returns:
+            int number of tag vertices of word
+        """
+        token_id = self._tag_token_id(word)
+        if token_id is None:
+            return 0
+        return sum(part.count_tag(token_id) for part in self._parts)
+
+    def id(self, token):
+        """
+        Args:
+            token (str) the id
+
+        Returns:
+            int idx of the id vertex
+        """
+        token_id = self.table.dictionary.lookup(token)
+        if token_id is None:
+            return None
+        for part in self._parts:
+            ret = part.id(token_id)
+            if ret is not None:
+                return ret
+        return None
+
+    def _tag_token_id(self, word):
+        token_id = self.table.dictionary.lookup(word)
+        if token_id is None or self.table.dictionary.kinds[token_id] != TAG:
+            return None
+        return token_id
+
+def extend_parts(parts, make_part, table):
+    """
+    Brings an index kept in parts up to date with a table that has grown,
+    see NodeIndex.
+
+    Args:
+        parts (list) of parts with start and stop attributes, indexing the
+            rows start to stop of the table, in order. Changed in place.
+        make_part (fun (node_table.NodeTable, int, int) -> part) indexes
+            the rows start to stop of a table
+        table (node_table.NodeTable)
+    """
+    start = parts[-1].stop if parts else 0
+    if parts and start == len(table):
+        return
+    parts.append(make_part(table, start, len(table)))
+    while len(parts) > 1 and \
+            parts[-2].stop - parts[-2].start <= \
+            parts[-1].stop - parts[-1].start:
+        last = parts.pop()
+        parts[-1] = make_part(table, parts[-1].start, last.stop)
+
+def _earliest(found):
+    # The (millis, idx) with the earliest time, the first one of those tied.
+    # Nones are skipped.
+    ret = None
+    for time in found:
+        if time is not None and (ret is None or time[0] < ret[0]):
+            ret = time
+    return ret
+
+class _NodeIndexPart(object):
+    """
+    NodeIndex of the rows start to stop of the table. Lookups by time
+    return (millis, idx).
+    """
+    def __init__(self, table, start, stop):
+        self.table = table
+        self.start = start
+        self.stop = stop
+        kinds = table.kinds[start:stop]
+        lines = start + np.flatnonzero(kinds == NodeKind.NodeKindLogLineVertex)
+
+        # Log lines by line number. Several log files have the same line
+        # numbers, those are kept in log order.
+        self._line_rows = lines[np.argsort(table.line_numbers[lines],
+                                           kind='mergesort')]
+        self._line_numbers = table.line_numbers[self._line_rows]
+
+        self._time_rows = lines
+        times = table.millis[lines]
+        if not np.all(times[1:] >= times[:-1]):
+            self._time_rows = lines[np.argsort(times, kind='mergesort')]
+        self._times = table.millis[self._time_rows]
+
+        # Tag vertices by word, then by time. Words are token ids, only the
+        # ones in these rows are kept (so a part is as big as its rows, not
+        # as the dictionary): the vertices of _tag_tokens[i] are
+        # _tag_rows[_tag_offsets[i]:_tag_offsets[i + 1]]
+        tags = start + np.flatnonzero(kinds == NodeKind.NodeKindTagVertex)
+        tag_tokens = table.token_ids[tags]
+        order = np.lexsort((table.millis[tags], tag_tokens))
+        self._tag_rows = tags[order]
+        self._tag_times = table.millis[self._tag_rows]
+        (self._tag_tokens, counts) = np.unique(tag_tokens,
+                                               return_counts=True)
+        self._tag_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self._tag_offsets[1:])
+
+        # Id vertices by token id, there is one per id
+        ids = start + np.flatnonzero(kinds ==
+                                     NodeKind.NodeKindUniqueIDVertex)
+        id_tokens = table.token_ids[ids]
+        order = np.argsort(id_tokens, kind='mergesort')
+        self._id_tokens = id_tokens[order]
+        self._id_rows = ids[order]
+
+    def line(self, line_number, source):
+        lo = np.searchsorted(self._line_numbers, line_number, side='left')
+        hi = np.searchsorted(self._line_numbers, line_number, side='right')
+        source_code = self.table.sources.lookup(source)
+        for row in self._line_rows[lo:hi].tolist():
+            if source is None or \
+                    self.table.source_codes[row] in (-1, source_code):
+                return row
+        return None
+
+    def time(self, millis):
+        # The first log line at or after millis
+        i = np.searchsorted(self._times, millis, side='left')
+        if i == len(self._times):
+            return None
+        return (int(self._times[i]), int(self._time_rows[i]))
+
+    def first_time(self):
+        if len(self._times) == 0:
+            return None
+        return (int(self._times[0]), int(self._time_rows[0]))
+
+    def last_time(self):
+        if len(self._times) == 0:
+            return None
+        return (int(self._times[-1]), int(self._time_rows[-1]))
+
+    def tag(self, token_id, millis=None):
+        # The first tag vertex of token_id, at or after millis if given
+        i = _find(self._tag_tokens, token_id)
+        if i is None:
+            return None
+        lo = self._tag_offsets[i]
+        hi = self._tag_offsets[i + 1]
+        if millis is not None:
+            lo += np.searchsorted(self._tag_times[lo:hi], millis, side='left')
+        if lo == hi:
+            return None
+        return (int(self._tag_times[lo]), int(self._tag_rows[lo]))
+
+    def count_tag(self, token_id):
+        i = _find(self._tag_tokens, token_id)
+        if i is None:
+            return 0
+        return int(self._tag_offsets[i + 1] - self._tag_offsets[i])
+
+    def id(self, token_id):
+        i = _find(self._id_tokens, token_id)
+        if i is None:
+            return None
+        return int(self._id_rows[i])
+
+def _find(values, value):
+    # The position of value in the sorted array values, or None
+    i = np.searchsorted(values, value)
+    if i == len(values) or values[i] != value:
+        return None
+    return int(i)
@@ -8,6 +8,7 @@ that syntax and produces a datatype to represent that parse.
 class NodeRefType:
     CURRENT = 0
     NEIGHBOR = 1
+    HIT = 2
 
 class NodeRef(object):
     """
@@ -17,10 +18,12 @@ class NodeRef(object):
     Can be:
       - current
       - neighbor(int)
+      - hit(int)
 
     Attributes:
       type (NodeRefType.constant)
       neighbor_index (int): If the type is NodeRefType.NEIGHBOR
+      hit_index (int): If the type is NodeRefType.HIT
     """
 
     def __init__(self, node_ref_type, **kwargs):
@@ -29,10 +32,13 @@ class NodeRef(object):
             node_ref_type(NodeRefType.constant)
             kwargs:
                 - if NEIGHBOR, then kwargs['neighbor_index]
+                - if HIT, then kwargs['hit_index]
         """
         self.type = node_ref_type
         if node_ref_type == NodeRefType.NEIGHBOR:
             self.neighbor_index = kwargs['neighbor_index']
+        elif node_ref_type == NodeRefType.HIT:
+            self.hit_index = kwargs['hit_index']
 
     def __cmp__(self, other):
         if not isinstance(other, NodeRef):
@@ -43,6 +49,8 @@ class NodeRef(object):
             return 0
         elif self.type == NodeRefType.NEIGHBOR:
             return cmp(self.neighbor_index, other.neighbor_index)
+        elif self.type == NodeRefType.HIT:
+            return cmp(self.hit_index, other.hit_index)
         else:
             raise ValueError("Programmer error: this should never happen")
 
@@ -53,6 +61,9 @@ def parse_node_ref(string):
       or
       - current|cur '.' neighbors|nbrs '[' idx ']'
         where idx is an integer
+      or
+      - hits '[' idx ']'
+        the idx-th result of the last find
 
     This only parses and ensure the syntax is valid.
 
@@ -62,6 +73,9 @@ def parse_node_ref(string):
     Returns: vertex.Vertex
     """
     # Janky for now. hand parser hell.
+    m = re.match('^hits\[(\d+)\]$', string)
+    if m:
+        return NodeRef(NodeRefType.HIT, hit_index=int(m.group(1)))
     m = re.match('^cur(rent)?(\.((nbrs|neighbors)\[(\d+)\]))?$', string)
     # No match return
     if not m:
@@ -0,0 +1,409 @@
+"""
+Columnar store of the vertices of the graph.
+
+Everything past graph construction (the transition matrix, semexes,
+most_likely_endpoints...) works on vertex indexes, so there is no need to
+keep a Python object per vertex around once the transition matrix is made.
+NodeTable keeps what the vertices hold in numpy arrays indexed by vertex
+idx, with their strings interned into a few shared tables, and makes
+vertex.Vertex objects only when asked, as views for display.
+
+The most recently made views are kept, so asking for the same vertex twice
+usually gives back the same object. The table also keeps the most recent
+renderings of its vertices for format.format_vertex, by idx.
+
+Log lines already in a line store (see vinge.line_store) stay there, and
+only their position is kept. The text of the other log lines is copied into
+a BlockCompressedLineStore owned by the table.
+"""
+
+import numpy as np
+
+from line_store import BlockCompressedLineStore
+from lru import LRUCache
+from postings import ID, TAG, TokenDictionary
+from vertex import LogLineVertex, NodeKind, StoredLogLineVertex
+from vertex import TagVertex, TemplateVertex, UniqueIDVertex
+
+VIEW_CACHE_SIZE = 4096
+"""
+Number of vertex views NodeTable keeps.
+"""
+
+# (name, dtype, value for vertices the column doesn't apply to)
+_COLUMNS = [('kinds', np.int8, -1),
+            ('millis', np.int64, 0),
+            ('line_numbers', np.int64, -1),
+            ('thread_codes', np.int32, -1),
+            ('source_codes', np.int32, -1),
+            ('store_codes', np.int32, -1),
+            ('offsets', np.int64, -1),
+            ('lengths', np.int32, 0),
+            ('message_offsets', np.int64, -1),
+            ('message_lengths', np.int32, 0),
+            ('sample_weights', np.float64, 1.0),
+            ('postings_codes', np.int32, -1),
+            ('line_indexes', np.int32, -1),
+            ('token_ids', np.int32, -1),
+            ('template_ids', np.int32, -1)]
+
+class _Codes(object):
+    """
+    Interns values to consecutive ints. None is always -1.
+
+    Attributes:
+        values (list) indexed by code
+    """
+    def __init__(self, by_identity=False):
+        """
+        Args:
+            by_identity (bool) if True, values are told apart by identity
+                rather than equality (for line stores, postings...)
+        """
+        self.values = []
+        self._codes = {}
+        self._by_identity = by_identity
+
+    def code(self, value):
+        if value is None:
+            return -1
+        key = id(value) if self._by_identity else value
+        ret = self._codes.get(key)
+        if ret is None:
+            ret = len(self.values)
+            self._codes[key] = ret
+            self.values.append(value)
+        return ret
+
+    def lookup(self, value):
+        """
+        Returns:
+            int code of value, or None if it was never interned
+        """
+        if value is None:
+            return -1
+        return self._codes.get(id(value) if self._by_identity else value)
+
+    def value(self, code):
+        if code < 0:
+            return None
+        return self.values[code]
+
+class NodeTable(object):
+    """
+    Usage:
+        table = NodeTable.from_vertices(nodes) # nodes by idx
+        table.kinds                            # numpy array of NodeKind
+        table.vertex(idx)                      # vertex.Vertex view
+
+    Columns, all numpy arrays indexed by vertex idx:
+        kinds (int8) vertex.NodeKind
+        millis (int64) time of log lines, tags and templates, 0 for ids
+        line_numbers (int64) -1 for tags and ids
+        thread_codes (int32) index into threads
+        source_codes (int32) index into sources
+        store_codes (int32) index into stores
+        offsets, lengths (int64, int32) position of the log line in its
+            store
+        message_offsets, message_lengths (int64, int32) position of the log
+            line's message in its store
+        sample_weights (float64) see vertex.LogLineVertex
+        postings_codes (int32) index into postings
+        line_indexes (int32) see vertex.LogLineVertex
+        token_ids (int32) tag word or id of tags and ids, see dictionary
+        template_ids (int32) template of log lines and templates, see
+            vinge.templates
+
+    Codes are -1 where the vertex has no such value, as are all the log line
+    columns of tags and ids.
+
+    Attributes, besides the columns:
+        dictionary (postings.TokenDictionary) tag words and ids
+        threads, sources (_Codes of str)
+        stores (_Codes of line stores)
+        postings (_Codes of postings.Postings)
+        template_texts (dict int -> str) text of every template id, as of
+            its latest vertex. Change with set_template_text.
+        renders (lru.LRUCache of int -> str) rendered vertices by idx, see
+            format.format_vertex
+    """
+    def __init__(self, view_cache_size=VIEW_CACHE_SIZE):
+        """
+        Args:
+            view_cache_size (int) number of vertex views to keep
+        """
+        self._size = 0
+        self._columns = {}
+        for (name, dtype, default) in _COLUMNS:
+            self._columns[name] = np.zeros(0, dtype=dtype)
+        self._trim()
+        self.dictionary = TokenDictionary()
+        self.threads = _Codes()
+        self.sources = _Codes()
+        self.stores = _Codes(by_identity=True)
+        self.postings = _Codes(by_identity=True)
+        self.template_texts = {}
+        # Where the text of log lines that aren't in a store goes
+        self._text_store = None
+        self._views = LRUCache(view_cache_size)
+        self.renders = LRUCache(view_cache_size)
+
+    @staticmethod
+    def from_vertices(vertices):
+        """
+        Args:
+            vertices (list of vertex.Vertex) indexed by idx
+
+        Returns:
+            NodeTable
+        """
+        ret = NodeTable()
+        ret.extend(vertices)
+        return ret
+
+    def __len__(self):
+        return self._size
+
+    def number_of_nodes(self):
+        # Same as networkx, so a table can stand in for the graph when
+        # making semexes
+        return self._size
+
+    def extend(self, vertices):
+        """
+        Appends vertices to the table.
+
+        Args:
+            vertices (list of vertex.Vertex) the vertices whose idx are
+                len(self), len(self) + 1, ... in order
+
+        Raises:
+            ValueError if a vertex has some other idx
+        """
+        start = self._size
+        n = len(vertices)
+        rows = dict((name, [default] * n)
+                    for (name, dtype, default) in _COLUMNS)
+        for (i, v) in enumerate(vertices):
+            if v.idx() != start + i:
+                raise ValueError("Vertex %r has idx %s, expected %d" %
+                                 (v, v.idx(), start + i))
+            kind = v.kind
+            rows['kinds'][i] = kind
+            if kind == NodeKind.NodeKindLogLineVertex:
+                self._log_line_row(rows, i, v)
+            elif kind == NodeKind.NodeKindTagVertex:
+                rows['millis'][i] = v.millis
+                rows['token_ids'][i] = self.dictionary.intern(v.word, TAG)
+            elif kind == NodeKind.NodeKindUniqueIDVertex:
+                rows['token_ids'][i] = self.dictionary.intern(v.id, ID)
+            elif kind == NodeKind.NodeKindTemplateVertex:
+                rows['millis'][i] = v.millis
+                rows['template_ids'][i] = v.template_id
+                self.set_template_text(v.template_id, v.text)
+
+        self._reserve(start + n)
+        for (name, values) in rows.iteritems():
+            self._columns[name][start:start + n] = values
+        self._size = start + n
+        self._trim()
+
+    def append(self, kind, count, **columns):
+        """
+        Appends vertices of one kind straight from their columns, without
+        making vertex objects. This is how graph.GraphBuilder adds tags, ids
+        and templates.
+
+        Args:
+            kind (int) vertex.NodeKind of the new vertices
+            count (int) number of new vertices
+            columns (numpy.array) by column name, the values of the new
+                vertices. The other columns get their default.
+
+        Returns:
+            numpy.array of int64 idx of the new vertices
+        """
+        start = self._size
+        self._reserve(start + count)
+        for (name, dtype, default) in _COLUMNS:
+            self._columns[name][start:start + count] = \
+                columns.pop(name, default)
+        if columns:
+            raise ValueError("Unknown columns %s" % ', '.join(columns))
+        self._columns['kinds'][start:start + count] = kind
+        self._size = start + count
+        self._trim()
+        return np.arange(start, start + count, dtype=np.int64)
+
+    def _log_line_row(self, rows, i, v):
+        if isinstance(v, StoredLogLineVertex):
+            store = v.store
+            offset = v.offset
+            length = v.length
+            message_offset = v.offset + v.message_start
+            message_length = v.length - v.message_start
+        else:
+            if self._text_store is None:
+                self._text_store = BlockCompressedLineStore()
+            store = self._text_store
+            (line, message) = (v.line, v.message)
+            offset = store.append(line)
+            length = len(line)
+            message_length = len(message)
+            if line.endswith(message):
+                message_offset = offset + length - message_length
+            else:
+                message_offset = store.append(message)
+        rows['store_codes'][i] = self.stores.code(store)
+        rows['offsets'][i] = offset
+        rows['lengths'][i] = length
+        rows['message_offsets'][i] = message_offset
+        rows['message_lengths'][i] = message_length
+        rows['millis'][i] = v.millis
+        rows['line_numbers'][i] = v.line_number
+        rows['thread_codes'][i] = self.threads.code(v.thread_id)
+        rows['source_codes'][i] = self.sources.code(v.source)
+        rows['sample_weights'][i] = v.sample_weight
+        rows['postings_codes'][i] = self.postings.code(v.postings)
+        if v.line_index is not None:
+            rows['line_indexes'][i] = v.line_index
+        if v.template_id is not None:
+            rows['template_ids'][i] = v.template_id
+
+    def _reserve(self, size):
+        # Grows the columns by doubling, so extending a bit at a time (as
+        # follow mode does) is amortized linear
+        capacity = len(self._columns['kinds'])
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity)
+        for (name, dtype, default) in _COLUMNS:
+            column = np.zeros(capacity, dtype=dtype)
+            column[:self._size] = self._columns[name][:self._size]
+            self._columns[name] = column
+
+    def _trim(self):
+        # The public columns are views of the first _size rows
+        for (name, dtype, default) in _COLUMNS:
+            setattr(self, name, self._columns[name][:self._size])
+
+    def vertex(self, idx):
+        """
+        Args:
+            idx (int) see vertex.Vertex.idx
+
+        Returns:
+            vertex.Vertex a view of the vertex. Changing it doesn't change
+            the table.
+
+        Raises:
+            IndexError if there is no such vertex
+        """
+        idx = int(idx)
+        if not 0 <= idx < self._size:
+            raise IndexError("No vertex %d in a table of %d" %
+                             (idx, self._size))
+        ret = self._views.get(idx)
+        if ret is None:
+            ret = self._make_vertex(idx)
+            self._views.put(idx, ret)
+        return ret
+
+    def set_template_text(self, template_id, text):
+        """
+        Sets the text of a template, which gets more general as lines are
+        added (see vinge.templates). The views and renderings of the
+        template's vertices that have the old text are dropped.
+
+        Args:
+            template_id (int)
+            text (str)
+        """
+        old = self.template_texts.get(template_id)
+        self.template_texts[template_id] = text
+        if old is None or old == text:
+            return
+        for cache in [self._views, self.renders]:
+            for idx in cache.keys():
+                if self.kinds[idx] == NodeKind.NodeKindTemplateVertex and \
+                        self.template_ids[idx] == template_id:
+                    cache.discard(idx)
+
+    def _make_vertex(self, idx):
+        kind = self.kinds[idx]
+        if kind == NodeKind.NodeKindTagVertex:
+            ret = TagVertex(self.dictionary.tokens[self.token_ids[idx]],
+                            int(self.millis[idx]))
+        elif kind == NodeKind.NodeKindUniqueIDVertex:
+            ret = UniqueIDVertex(self.dictionary.tokens[self.token_ids[idx]])
+        elif kind == NodeKind.NodeKindTemplateVertex:
+            template_id = int(self.template_ids[idx])
+            ret = TemplateVertex(template_id, self.template_texts[template_id],
+                                 int(self.millis[idx]))
+        else:
+            ret = self._make_log_line_vertex(idx)
+        ret._set_idx(idx)
+        return ret
+
+    def _make_log_line_vertex(self, idx):
+        store = self.stores.value(self.store_codes[idx])
+        offset = int(self.offsets[idx])
+        length = int(self.lengths[idx])
+        message_offset = int(self.message_offsets[idx])
+        message_length = int(self.message_lengths[idx])
+        line_number = int(self.line_numbers[idx])
+        thread_id = self.threads.value(self.thread_codes[idx])
+        millis = int(self.millis[idx])
+        if message_offset + message_length == offset + length:
+            ret = StoredLogLineVertex(store, offset, length,
+                                      message_offset - offset, line_number,
+                                      thread_id, millis)
+        else:
+            ret = LogLineVertex(store.text(offset, length),
+                                store.text(message_offset, message_length),
+                                line_number, thread_id, millis)
+        ret.source = self.sources.value(self.source_codes[idx])
+        ret.sample_weight = float(self.sample_weights[idx])
+        ret.postings = self.postings.value(self.postings_codes[idx])
+        if self.line_indexes[idx] >= 0:
+            ret.line_index = int(self.line_indexes[idx])
+        if self.template_ids[idx] >= 0:
+            ret.template_id = int(self.template_ids[idx])
+        return ret
+
+    def vertices(self):
+        """
+        Returns:
+            list of vertex.Vertex a new view of every vertex, by idx
+        """
+        return [self._make_vertex(idx) for idx in xrange(self._size)]
+
+    def kind_mask(self, kind):
+        """
+        Args:
+            kind (int) vertex.NodeKind
+
+        Returns:
+            numpy.array of bool, True for the vertices of that kind
+        """
+        return self.kinds == kind
+
+    def sensor_vector(self, sensor):
+        """
+        Evaluates a sensor (see filters) at every vertex. Sensors that only
+        look at the kind of a vertex say so with a node_kind attribute, and
+        are evaluated straight from the kinds column without making views.
+
+        Args:
+            sensor (fun vertex.Vertex -> float)
+
+        Returns:
+            numpy.array of float
+        """
+        kind = getattr(sensor, 'node_kind', None)
+        if kind is not None:
+            return self.kind_mask(kind).astype(float)
+        ret = np.zeros(self._size)
+        for idx in xrange(self._size):
+            ret[idx] = sensor(self._make_vertex(idx))
+        return ret
@@ -0,0 +1,272 @@
+"""
+On-disk cache of the parse of a log file, so reopening a log doesn't have to
+parse and tokenize it again.
+
+The cache is a numpy .npz file holding mostly numbers: the position of
+every log line in the file, its time, thread and line number, and the
+integer encoded tokens of every line (see postings.Postings). Line and
+message text are not cached (unless the message is not the tail of its
+line); loading the cache memory maps the log, just like
+parser.parse_log_file_mapped.
+
+The cache is keyed on the log's path, size, modification time and a hash of
+its first and last CACHE_HASH_BLOCK bytes, as well as the id patterns in use
+(see tokens.set_id_patterns), and is ignored when any of these no longer
+match.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import warnings
+import zipfile
+import zlib
+
+import numpy as np
+
+from line_store import MappedLineStore
+from parser import is_compressed, parse_log_file, parse_log_file_mapped
+from postings import Postings, postings_maps, TokenDictionary, TokenSpans
+from tokens import id_patterns_key
+from vertex import LogLineVertex, StoredLogLineVertex
+
+CACHE_VERSION = 3
+"""
+Bump whenever the cache layout or the parse output changes.
+"""
+
+CACHE_SUFFIX = '.vinge-cache.npz'
+
+CACHE_HASH_BLOCK = 1 << 20
+"""
+Number of bytes hashed from each end of the log.
+"""
+
+def cache_path(filename, cache_dir=None):
+    """
+    Args:
+        filename (str) the log file
+        cache_dir (str) if None, the cache lives next to the log
+
+    Returns:
+        str path of the cache file
+    """
+    if cache_dir is None:
+        return filename + CACHE_SUFFIX
+    name = hashlib.sha1(os.path.abspath(filename)).hexdigest()
+    return os.path.join(cache_dir, name + CACHE_SUFFIX)
+
+def parse_log_file_cached(filename, cache_dir=None, log_format=None):
+    """
+    Like parser.parse_log_file_mapped, but reuses the cached parse of the
+    file if there is a valid one, and writes the cache otherwise.
+
+    Compressed files are not cached, as the cache points into the mapped
+    file.
+
+    The cache is only an optimization, so failing to write it (say the log
+    is in a directory the user can't write to) only gives a warning.
+
+    Args:
+        filename (str)
+        cache_dir (str) see cache_path
+        log_format (log_format.LogFormat or str) see parser.parse_log
+
+    Returns:
+        see parser.parse_log
+    """
+    if is_compressed(filename):
+        return parse_log_file(filename, log_format)
+    path = cache_path(filename, cache_dir)
+    format_name = getattr(log_format, 'name', log_format)
+    key = _cache_key(filename)
+    ret = load_cache(path, filename, key, format_name)
+    if ret is None:
+        ret = parse_log_file_mapped(filename, log_format)
+        try:
+            if cache_dir is not None and not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            save_cache(path, key, format_name, ret)
+        except (IOError, OSError), e:
+            warnings.warn("Could not write the parse cache %s: %s" %
+                          (path, e))
+    return ret
+
+def _cache_key(filename):
+    """
+    Returns:
+        dict identifying the current contents of the file
+    """
+    stat = os.stat(filename)
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as file:
+        digest.update(file.read(CACHE_HASH_BLOCK))
+        if stat.st_size > CACHE_HASH_BLOCK:
+            file.seek(max(CACHE_HASH_BLOCK, stat.st_size - CACHE_HASH_BLOCK))
+            digest.update(file.read(CACHE_HASH_BLOCK))
+    return {'version' : CACHE_VERSION,
+            'path' : os.path.abspath(filename),
+            'size' : stat.st_size,
+            'mtime' : stat.st_mtime,
+            'hash' : digest.hexdigest(),
+            'id_patterns' : id_patterns_key()}
+
+def save_cache(path, key, format_name, parse):
+    """
+    Writes the cache atomically, so a crash never leaves a truncated cache.
+
+    Args:
+        path (str) see cache_path
+        key (dict) see _cache_key
+        format_name (str) or None if the format was detected
+        parse see parser.parse_log_file_mapped
+    """
+    (log_lines, tag_map, id_map) = parse
+    postings = tag_map.postings
+    n = len(log_lines)
+    offsets = np.zeros(n, dtype=np.int64)
+    lengths = np.zeros(n, dtype=np.int32)
+    message_starts = np.zeros(n, dtype=np.int32)
+    line_numbers = np.zeros(n, dtype=np.int64)
+    times = np.zeros(n, dtype=np.int64)
+    thread_codes = np.zeros(n, dtype=np.int32)
+    thread_table = {}
+    # Line and message text of the vertices that aren't in the store
+    texts = []
+    for (i, v) in enumerate(log_lines):
+        if isinstance(v, StoredLogLineVertex):
+            offsets[i] = v.offset
+            lengths[i] = v.length
+            message_starts[i] = v.message_start
+        else:
+            # Not in the store, so keep the text itself
+            message_starts[i] = -1
+            texts.append(v.line)
+            texts.append(v.message)
+        line_numbers[i] = v.line_number
+        times[i] = v.millis
+        thread_codes[i] = thread_table.setdefault(v.thread_id,
+                                                  len(thread_table))
+    threads = sorted(thread_table, key=thread_table.get)
+
+    (thread_blob, thread_offsets) = _pack_strings(threads)
+    (token_blob, token_offsets) = _pack_strings(postings.dictionary.tokens)
+    (text_blob, text_offsets) = _pack_strings(texts)
+    meta = dict(key, format=format_name)
+    arrays = {'meta' : np.frombuffer(json.dumps(meta), dtype=np.uint8),
+              'offsets' : offsets,
+              'lengths' : lengths,
+              'message_starts' : message_starts,
+              'line_numbers' : line_numbers,
+              'times' : times,
+              'thread_codes' : thread_codes,
+              'thread_blob' : thread_blob,
+              'thread_offsets' : thread_offsets,
+              'token_blob' : token_blob,
+              'token_offsets' : token_offsets,
+              'token_kinds' : np.array(postings.dictionary.kinds,
+                                       dtype=np.int8),
+              'line_token_offsets' : postings.line_offsets,
+              'line_tokens' : postings.line_tokens,
+              'span_offsets' : postings.spans.offsets,
+              'span_starts' : postings.spans.starts,
+              'span_lengths' : postings.spans.lengths,
+              'span_kinds' : postings.spans.kinds,
+              'text_blob' : text_blob,
+              'text_offsets' : text_offsets}
+
+    directory = os.path.dirname(os.path.abspath(path))
+    (fd, tmp_path) = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            np.savez(file, **arrays)
+        os.rename(tmp_path, path)
+    except:
+        os.remove(tmp_path)
+        raise
+
+# The arrays of the cache besides meta, see save_cache
+_ARRAYS = ('offsets', 'lengths', 'message_starts', 'line_numbers', 'times',
+           'thread_codes', 'thread_blob', 'thread_offsets', 'token_blob',
+           'token_offsets', 'token_kinds', 'line_token_offsets',
+           'line_tokens', 'span_offsets', 'span_starts', 'span_lengths',
+           'span_kinds', 'text_blob', 'text_offsets')
+
+def load_cache(path, filename, key, format_name=None):
+    """
+    Args:
+        path (str) see cache_path
+        filename (str) the log file
+        key (dict) see _cache_key
+        format_name (str) if not None, the cache must have been made with
+            this format
+
+    Returns:
+        see parser.parse_log, or None if there is no valid cache
+    """
+    if not os.path.exists(path):
+        return None
+    # A cache that is cut short or corrupt reads as no cache, whichever
+    # member is bad
+    try:
+        with np.load(path) as npz:
+            meta = json.loads(npz['meta'].tostring())
+            cached_format = meta.pop('format')
+            if meta != key:
+                return None
+            if format_name is not None and cached_format != format_name:
+                return None
+            data = dict((name, npz[name]) for name in _ARRAYS)
+    except (IOError, ValueError, KeyError, EOFError, zipfile.BadZipfile,
+            zlib.error):
+        return None
+
+    store = MappedLineStore(filename)
+    threads = _unpack_strings(data['thread_blob'], data['thread_offsets'])
+    texts = iter(_unpack_strings(data['text_blob'], data['text_offsets']))
+    log_lines = []
+    for (offset, length, message_start, line_number, millis, thread) in \
+            zip(data['offsets'].tolist(), data['lengths'].tolist(),
+                data['message_starts'].tolist(),
+                data['line_numbers'].tolist(), data['times'].tolist(),
+                data['thread_codes'].tolist()):
+        if message_start < 0:
+            (line, message) = (texts.next(), texts.next())
+            log_lines.append(LogLineVertex(line, message, line_number,
+                                           threads[thread], millis))
+        else:
+            log_lines.append(StoredLogLineVertex(store, offset, length,
+                                                 message_start, line_number,
+                                                 threads[thread], millis))
+
+    dictionary = TokenDictionary()
+    tokens = _unpack_strings(data['token_blob'], data['token_offsets'])
+    for (token, kind) in zip(tokens, data['token_kinds'].tolist()):
+        dictionary.intern(token, kind)
+    spans = TokenSpans(data['span_offsets'], data['span_starts'],
+                       data['span_lengths'], data['span_kinds'])
+    postings = Postings(dictionary, data['line_token_offsets'],
+                        data['line_tokens'], spans)
+    return (log_lines,) + postings_maps(postings, log_lines)
+
+def _pack_strings(strings):
+    """
+    Returns:
+        (numpy.array of uint8, numpy.array of int64) the concatenated
+        strings, and the offset of each string with a trailing end offset
+    """
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    np.cumsum([len(s) for s in strings], out=offsets[1:])
+    return (np.frombuffer(''.join(strings), dtype=np.uint8), offsets)
+
+def _unpack_strings(blob, offsets):
+    """
+    Inverse of _pack_strings.
+
+    Returns:
+        list of str
+    """
+    blob = blob.tostring()
+    offsets = offsets.tolist()
+    return [blob[offsets[i]:offsets[i + 1]] for i in xrange(len(offsets) - 1)]
@@ -1,103 +1,619 @@
-import re
+import bz2
+import gzip
+import heapq
+import multiprocessing
+import os
 
-from datetime import datetime
+from collections import deque
+from io import BytesIO
+from itertools import chain, islice
 
-from tokens import tokenize
-from tokens import TokenType
+from line_store import BlockCompressedLineStore, MappedLineStore
+from log_format import DEFAULT_FORMAT_NAME, DETECT_SAMPLE_SIZE
+from log_format import detect_format, get_format
+from postings import Postings, PostingsBuilder, postings_maps
+from sampling import DEFAULT_BUCKET_MINUTES, DEFAULT_SAMPLE_RATE
+from sampling import DEFAULT_WINDOW_LINES, LogSampler
+from timestamps import millis_array, millis_to_datetime
 from vertex import LogLineVertex
+from vertex import StoredLogLineVertex
 
-def parse_log_file(filename):
-    file = open(filename, 'r')
-    return parse_log(file)
+DEFAULT_BATCH_SIZE = 10000
+"""
+Number of log line vertices per LogBatch when streaming a log.
+"""
+
+COMPRESSED_SUFFIXES = ('.gz', '.bz2', '.xz')
+"""
+Log files with these extensions are decompressed as they are read.
+"""
+
+class LogBatch(object):
+    """
+    A chunk of consecutive parsed log lines. This is what the streaming
+    parser (parse_log_batches) yields.
+
+    The postings and tag and id maps only cover the vertices in this batch,
+    see parse_log.
+
+    Attributes:
+        vertices (list of LogLineVertex) in file order
+        postings (postings.Postings) line indexes are indexes into vertices
+        tag_map (postings.PostingsMap)
+        id_map (postings.PostingsMap)
+        times (numpy.array of int64) epoch milliseconds of the vertices.
+    All but vertices are only filled in once the batch is yielded.
+    """
+    def __init__(self):
+        self.vertices = []
+        self.postings = None
+        self.tag_map = None
+        self.id_map = None
+        self.times = None
+        self._builder = PostingsBuilder()
+
+    def _add(self, vertex):
+        self.vertices.append(vertex)
+        self._builder.add_line(vertex.message)
+
+    def _finish(self):
+        self.postings = self._builder.build()
+        self._builder = None
+        (self.tag_map, self.id_map) = postings_maps(self.postings,
+                                                    self.vertices)
+        self.times = millis_array(self.vertices)
+
+    def __len__(self):
+        return len(self.vertices)
+
+def parse_log_file(filename, log_format=None):
+    """
+    Compressed log files (see COMPRESSED_SUFFIXES) are decompressed as they
+    are read, and their text is kept compressed in memory (see
+    line_store.BlockCompressedLineStore).
+
+    Args:
+        filename (str)
+        log_format see parse_log
+
+    Returns:
+        see parse_log
+    """
+    return _index_vertices(_iter_file_log_line_vertices(filename, log_format))
+
+def parse_log_file_batches(filename, batch_size=DEFAULT_BATCH_SIZE,
+                           log_format=None):
+    """
+    Streaming version of parse_log_file. See parse_log_batches.
+    """
+    vertices = _iter_file_log_line_vertices(filename, log_format)
+    for batch in _batch_vertices(vertices, batch_size):
+        yield batch
+
+def parse_log_file_sampled(filename, center_line, rate=DEFAULT_SAMPLE_RATE,
+                           window_lines=DEFAULT_WINDOW_LINES,
+                           window_minutes=None,
+                           bucket_minutes=DEFAULT_BUCKET_MINUTES,
+                           log_format=None):
+    """
+    Like parse_log_file, but only keeps every line near center_line and a
+    stratified sample of the rest of the log (see sampling.LogSampler).
+    Whether to keep a line is decided from its line number, then from the
+    time and thread LogFormat.peek reads off it. Only the kept lines are
+    parsed, tokenized and become vertices, so past reading the file once
+    the cost goes with the size of the sample.
+
+    Line numbers are those of the whole file. The sample_weight of the kept
+    lines outside the window is the number of lines each stands for.
+
+    Args:
+        filename (str) can be compressed, see open_log_file
+        center_line (int) 0 based line number the window is centered on
+        rate, window_lines, window_minutes, bucket_minutes see
+            sampling.LogSampler
+        log_format see parse_log
+
+    Returns:
+        see parse_log
+    """
+    sampler = LogSampler(center_line, rate, window_lines, window_minutes,
+                         bucket_minutes)
+    with open_log_file(filename) as file:
+        ret = _index_vertices(_iter_sampled_log_line_vertices(file, sampler,
+                                                              log_format))
+    sampler.finish(ret[0])
+    return ret
+
+def _iter_sampled_log_line_vertices(lines, sampler, log_format):
+    """
+    Like _iter_log_line_vertices, but only yields the lines sampler keeps.
+
+    With a time window the center time is that of the first conforming line
+    at or after the sampler's center_line (or of the last line if there is
+    none). It is found in the same pass: until then the lines that could
+    still be within the window of it are held back. As elsewhere this
+    assumes the log is in time order.
+
+    Args:
+      lines (iterable of str)
+      sampler (sampling.LogSampler)
+      log_format see _resolve_format
+
+    Returns:
+      generator of LogLineVertex
+    """
+    (log_format, lines) = _resolve_format(log_format, lines)
+    parse = log_format.parse
+    peek = log_format.peek
+
+    def kept_vertex(line_number, line, peeked):
+        if not sampler.in_line_window(line_number):
+            if peeked is None:
+                peeked = peek(line)
+            if peeked is None or not sampler.offer(line_number, *peeked):
+                return None
+        ret = parse(line)
+        if ret is None:
+            return None
+        (millis, thread_id, msg) = ret
+        return LogLineVertex(line, msg, line_number, thread_id, millis)
+
+    # (line number, line, peek of the line) before the center time is known
+    held = None
+    if sampler.window_millis is not None and sampler.center_millis is None:
+        held = deque()
+    for line_number, line in enumerate(lines):
+        line = line.rstrip()
+        peeked = None
+        if held is not None:
+            peeked = peek(line)
+            if peeked is None:
+                continue
+            if line_number < sampler.center_line:
+                held.append((line_number, line, peeked))
+                # These are too early to be in the window
+                while peeked[0] - held[0][2][0] > sampler.window_millis:
+                    vertex = kept_vertex(*held.popleft())
+                    if vertex is not None:
+                        yield vertex
+                continue
+            sampler.center_millis = peeked[0]
+            for entry in held:
+                vertex = kept_vertex(*entry)
+                if vertex is not None:
+                    yield vertex
+            held = None
+        vertex = kept_vertex(line_number, line, peeked)
+        if vertex is not None:
+            yield vertex
+    if held:
+        sampler.center_millis = held[-1][2][0]
+        for entry in held:
+            vertex = kept_vertex(*entry)
+            if vertex is not None:
+                yield vertex
+
+def parse_log_files(filenames, log_format=None):
+    """
+    Parses several log files as if they were one log, with the lines of all
+    the files merged by time. See parse_log_files_batches.
+
+    Args:
+        filenames (list of str)
+        log_format see parse_log. If None, it is detected for each file.
+
+    Returns:
+        see parse_log. The vertices are in merged order.
+    """
+    return _index_vertices(_iter_merged_log_line_vertices(filenames,
+                                                          log_format))
+
+def parse_log_files_batches(filenames, batch_size=DEFAULT_BATCH_SIZE,
+                            log_format=None):
+    """
+    Streaming version of parse_log_files, see parse_log_batches.
+
+    The files are merged lazily with a heap, so only one line per file is
+    held at a time apart from the batch itself. Each file must be in time
+    order for the merge to be in time order. The source attribute of each
+    vertex is the file it came from, and line numbers are within that file.
+
+    Files can be compressed, see open_log_file.
+
+    Args:
+        filenames (list of str)
+        batch_size (int)
+        log_format see parse_log_files
+
+    Returns:
+        generator of LogBatch
+    """
+    vertices = _iter_merged_log_line_vertices(filenames, log_format)
+    for batch in _batch_vertices(vertices, batch_size):
+        yield batch
+
+def is_compressed(filename):
+    """
+    Returns:
+        bool whether open_log_file decompresses the file
+    """
+    return filename.endswith(COMPRESSED_SUFFIXES)
+
+def open_log_file(filename):
+    """
+    Opens a log file for reading, decompressing it on the fly if its name
+    ends in .gz, .bz2 or .xz. xz needs the lzma module (backports.lzma on
+    python 2).
+
+    Returns:
+        file like object
+    """
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rb')
+    elif filename.endswith('.bz2'):
+        return bz2.BZ2File(filename, 'rb')
+    elif filename.endswith('.xz'):
+        try:
+            import lzma
+        except ImportError:
+            try:
+                from backports import lzma
+            except ImportError:
+                raise ValueError("Reading %s needs the lzma module" % filename)
+        return lzma.open(filename, 'rb')
+    return open(filename, 'r')
+
+def _iter_merged_log_line_vertices(filenames, log_format):
+    """
+    Returns:
+        generator of LogLineVertex, from all the files in time order
+    """
+    def keyed(file_idx, filename):
+        vertices = _iter_file_log_line_vertices(filename, log_format)
+        for (seq, vertex) in enumerate(vertices):
+            vertex.source = filename
+            # file_idx and seq break ties, so vertices are never compared
+            yield (vertex.millis, file_idx, seq, vertex)
+
+    streams = [keyed(i, filename) for (i, filename) in enumerate(filenames)]
+    for (_, _, _, vertex) in heapq.merge(*streams):
+        yield vertex
+
+def parse_log_file_mapped(filename, log_format=None):
+    """
+    Like parse_log_file, but the log file is memory mapped and the returned
+    vertices are StoredLogLineVertex objects, which only keep the byte
+    offsets of their text. The text is read back from the map on demand.
+
+    Lines whose message is not the tail of the line (e.g. json lines) get a
+    plain LogLineVertex.
+
+    Compressed files can't be mapped, and are read with parse_log_file,
+    which keeps their text compressed in memory instead.
+
+    Args:
+        filename (str)
+        log_format see parse_log
+
+    Returns:
+        see parse_log
+    """
+    if is_compressed(filename):
+        return parse_log_file(filename, log_format)
+    store = MappedLineStore(filename)
+    if log_format is None:
+        log_format = _detect_format(line for (_, line) in store.iter_lines())
+    return _index_vertices(_iter_stored_log_line_vertices(store, log_format))
+
+def parse_log_file_parallel(filename, workers=None, log_format=None):
+    """
+    Parallel version of parse_log_file. The file is split into byte ranges
+    aligned to line boundaries, each range is parsed by parse_log in a
+    process pool, and the per-range results are merged back together with
+    line numbers relative to the whole file.
+
+    The return value is identical to that of parse_log_file. Compressed
+    files can't be split, so they are parsed serially by parse_log_file.
+
+    Args:
+        filename (str)
+        workers (int) number of processes. Defaults to the number of cpus.
+        log_format see parse_log
+
+    Returns:
+        see parse_log
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers < 1:
+        raise ValueError("workers must be positive, got %d" % workers)
+    if is_compressed(filename):
+        return parse_log_file(filename, log_format)
+    if log_format is None:
+        # Detect once up front rather than once per shard
+        with open(filename, 'r') as file:
+            log_format = _detect_format(file)
+    shards = [(filename, start, end, log_format)
+              for (start, end) in _shard_ranges(filename, workers)]
+    if workers == 1 or len(shards) <= 1:
+        results = map(_parse_shard, shards)
+    else:
+        pool = multiprocessing.Pool(min(workers, len(shards)))
+        try:
+            results = pool.map(_parse_shard, shards)
+        finally:
+            pool.close()
+            pool.join()
+
+    log_lines = []
+    line_offset = 0
+    for (num_lines, (shard_lines, shard_tag_map, _)) in results:
+        for vertex in shard_lines:
+            vertex.line_number += line_offset
+        line_offset += num_lines
+        log_lines.extend(shard_lines)
+    postings = Postings.concatenate([tag_map.postings
+                                     for (_, (_, tag_map, _)) in results])
+    return (log_lines,) + postings_maps(postings, log_lines)
+
+def _shard_ranges(filename, num_shards):
+    """
+    Splits the file into at most num_shards contiguous byte ranges. Every
+    range but the first starts at the beginning of a line.
+
+    Returns:
+        list of (int, int) (start, end) byte offsets, end exclusive
+    """
+    size = os.path.getsize(filename)
+    boundaries = [0]
+    with open(filename, 'rb') as file:
+        for i in xrange(1, num_shards):
+            guess = size * i // num_shards
+            if guess <= boundaries[-1]:
+                continue
+            # Move forward to the start of the next line
+            file.seek(guess - 1)
+            file.readline()
+            boundary = file.tell()
+            if boundary > boundaries[-1] and boundary < size:
+                boundaries.append(boundary)
+    boundaries.append(size)
+    return [(boundaries[i], boundaries[i + 1])
+            for i in xrange(len(boundaries) - 1)
+            if boundaries[i] < boundaries[i + 1]]
+
+def _parse_shard(shard):
+    """
+    Process pool worker. Parses one byte range of a log file.
+
+    Args:
+        shard (str, int, int, log_format) filename, start and end byte
+        offsets and the format of the log
+
+    Returns:
+        (int, parse_log return value) number of lines in the range (conforming
+        or not) and the parse of the range with line numbers relative to the
+        start of the range. Pickling keeps the vertices in the maps identical
+        to the vertices in the list.
+    """
+    (filename, start, end, log_format) = shard
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    num_lines = data.count('\n')
+    if data and not data.endswith('\n'):
+        num_lines += 1
+    return (num_lines, parse_log(BytesIO(data), log_format))
 
 def _parse_log_line(line):
     """
+    Parses a line of the default (java) log format.
+
     Args:
         line (str)
     Returns:
         (datetime, str, str) (time, thread id, log message)
         or None if the line doesn't match
     """
-    # TODO(trevor) need to make this configurable
-    # Example log line:
-    # 2012-09-01 00:00:20,305 INFO  [MyThread9] c.g.o.a.FooBarBaz : This is my log message ok
-    # group 1 - year
-    #       2 - month
-    #       3 - day
-    #       4 - hour
-    #       5 - minute
-    #       6 - second
-    #       7 - millisecond
-    # group 8 - log level
-    # group 9 - thread id
-    # group 10 - rest of the log line
-    # Python caches the regex internally.
-    regex = re.compile('^(\d\d\d\d)-(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d),(\d\d\d)\s+(\w+)\s+\[(\w+)\](.+)$')
-    m = regex.match(line)
-    if not m:
+    ret = get_format(DEFAULT_FORMAT_NAME).parse(line)
+    if ret is None:
         return None
-    # python datetime object has microseconds, not millis, which is why we
-    # are grabbing the constituent parts of the date instead of using strptime
-    microseconds = int(m.group(7))*1000
-    dt = datetime(year=int(m.group(1)),
-                  month=int(m.group(2)),
-                  day=int(m.group(3)),
-                  hour=int(m.group(4)),
-                  minute=int(m.group(5)),
-                  second=int(m.group(6)),
-                  microsecond=microseconds)
-    return (dt, m.group(9), m.group(10))
+    (millis, thread_id, msg) = ret
+    return (millis_to_datetime(millis), thread_id, msg)
 
-def _dict_map(dictionary, fn):
-    for (k,v) in dictionary.iteritems():
-        dictionary[k] = fn(v)
+def _detect_format(lines):
+    # Falls back to the default format when nothing matches
+    log_format = detect_format(lines)
+    if log_format is None:
+        log_format = get_format(DEFAULT_FORMAT_NAME)
+    return log_format
 
-def parse_log(lines):
+def _resolve_format(log_format, lines):
     """
     Args:
-      lines (iterable of str) Assumes the trailing newline is part of the line
+      log_format (log_format.LogFormat, str or None) a format, the name of a
+          registered format, or None to detect the format from the lines
+      lines (iterable of str)
 
     Returns:
-       (list of LogLineVertex,
-        dict(str -> list of LogLineVertex),
-        dict(str -> list of LogLineVertex))
-        List of the actual log line vertices,
-        dict from tags to the vertices that have it,
-        dict from ids to the vertices that have it
+      (log_format.LogFormat, iterable of str) The returned lines must be used
+      in place of the argument, as detection consumes the start of them.
     """
-    log_lines = []
-    tag_map = {}
-    id_map = {}
+    if isinstance(log_format, basestring):
+        return (get_format(log_format), lines)
+    elif log_format is not None:
+        return (log_format, lines)
+    lines = iter(lines)
+    sample = list(islice(lines, DETECT_SAMPLE_SIZE))
+    return (_detect_format(sample), chain(sample, lines))
+
+def _iter_log_line_vertices(lines, log_format):
+    """
+    Args:
+      lines (iterable of str)
+      log_format see _resolve_format
+
+    Returns:
+      generator of LogLineVertex, one for every conforming line
+    """
+    (log_format, lines) = _resolve_format(log_format, lines)
+    parse = log_format.parse
     for line_number, line in enumerate(lines):
         line = line.rstrip()
-        ret = _parse_log_line(line)
+        ret = parse(line)
         # TODO(trevor) for now skip non conforming lines
         if ret is None:
             continue
-        (dt, thread_id, msg) = ret
+        (millis, thread_id, msg) = ret
+        yield LogLineVertex(line, msg, line_number, thread_id, millis)
+
+def _iter_file_log_line_vertices(filename, log_format):
+    """
+    Returns:
+      generator of LogLineVertex, one for every conforming line of the file.
+      They are StoredLogLineVertex backed by a BlockCompressedLineStore if
+      the file is compressed.
+    """
+    with open_log_file(filename) as file:
+        if is_compressed(filename):
+            vertices = _iter_appended_log_line_vertices(
+                file, BlockCompressedLineStore(), log_format)
+        else:
+            vertices = _iter_log_line_vertices(file, log_format)
+        for vertex in vertices:
+            yield vertex
 
+def _iter_appended_log_line_vertices(lines, store, log_format):
+    """
+    Like _iter_log_line_vertices, but the conforming lines are appended to
+    store instead of being kept by the vertices.
+
+    Args:
+      lines (iterable of str)
+      store (line_store.BlockCompressedLineStore)
+      log_format see _resolve_format
+
+    Returns:
+      generator of LogLineVertex, one for every conforming line
+    """
+    (log_format, lines) = _resolve_format(log_format, lines)
+    parse = log_format.parse
+    for line_number, line in enumerate(lines):
+        line = line.rstrip()
+        ret = parse(line)
+        if ret is None:
+            continue
+        (millis, thread_id, msg) = ret
+        if not line.endswith(msg):
+            # Can only point into the store if the message is the tail
+            yield LogLineVertex(line, msg, line_number, thread_id, millis)
+            continue
+        offset = store.append(line)
+        yield StoredLogLineVertex(store, offset, len(line),
+                                  len(line) - len(msg), line_number,
+                                  thread_id, millis)
+    store.flush()
+
+def _iter_stored_log_line_vertices(store, log_format):
+    """
+    Args:
+      store (line_store.MappedLineStore)
+      log_format (log_format.LogFormat or str)
+
+    Returns:
+      generator of StoredLogLineVertex, one for every conforming line
+    """
+    (log_format, _) = _resolve_format(log_format, [])
+    parse = log_format.parse
+    for line_number, (offset, line) in enumerate(store.iter_lines()):
+        line = line.rstrip()
+        ret = parse(line)
+        if ret is None:
+            continue
+        (millis, thread_id, msg) = ret
+        if not line.endswith(msg):
+            # Can only point into the store if the message is the tail
+            yield LogLineVertex(line, msg, line_number, thread_id, millis)
+            continue
+        yield StoredLogLineVertex(store, offset, len(line),
+                                  len(line) - len(msg), line_number,
+                                  thread_id, millis)
+
+def parse_log(lines, log_format=None):
+    """
+    Args:
+      lines (iterable of str) Assumes the trailing newline is part of the line
+      log_format (log_format.LogFormat or str) format of the lines, or the
+          name of a registered format. If None the format is detected from
+          the first lines.
+
+    Returns:
+       (list of LogLineVertex,
+        postings.PostingsMap (str -> list of LogLineVertex),
+        postings.PostingsMap (str -> list of LogLineVertex))
+        List of the actual log line vertices,
+        dict-like map from tags to the vertices that have it,
+        dict-like map from ids to the vertices that have it
+        The vertex lists in both maps are in file order. Both maps share the
+        same postings.Postings, which holds the integer encoding of the
+        tokens of every line.
+    """
+    return _index_vertices(_iter_log_line_vertices(lines, log_format))
+
+def _index_vertices(vertices):
+    """
+    Builds the parse_log return value from the log line vertices.
+
+    Args:
+      vertices (iterable of LogLineVertex)
+    """
+    log_lines = []
+    builder = PostingsBuilder()
+    for vertex in vertices:
         # 1 Create log line vertex for each line
-        vertex = LogLineVertex(line, msg, line_number, thread_id, dt)
         log_lines.append(vertex)
 
-        # 2 Look for tokens, then create separate tag and id maps
-        # Each map is from token to list of associated vertices
-        tokens = tokenize(msg)
-        for (token, token_type) in tokens:
-            if token_type == TokenType.TAG:
-                this_map = tag_map
-            elif token_type == TokenType.ID:
-                this_map = id_map
-            else:
-                # Skip stop words and spaces
-                continue
-            # We use a set here so that a line which has a word more than once
-            # doesn't get counted twice
-            this_set = this_map.get(token, set())
-            this_set.add(vertex)
-            this_map[token] = this_set
-    # Turn the sets back to lists
-    _dict_map(tag_map, lambda s: list(s))
-    _dict_map(id_map, lambda s: list(s))
-
-    return (log_lines, tag_map, id_map)
+        # 2 Look for tokens, and record which tags and ids each line has
+        builder.add_line(vertex.message)
+
+    return (log_lines,) + postings_maps(builder.build(), log_lines)
+
+def parse_log_batches(lines, batch_size=DEFAULT_BATCH_SIZE, log_format=None):
+    """
+    Streaming version of parse_log. Rather than building the maps for the
+    whole log this yields them batch_size vertices at a time, so the caller
+    only ever needs one batch in memory (see graph.make_graph_from_batches).
+
+    Args:
+      lines (iterable of str) Assumes the trailing newline is part of the line
+      batch_size (int) number of log line vertices per batch
+      log_format see parse_log
+
+    Returns:
+      generator of LogBatch
+    """
+    vertices = _iter_log_line_vertices(lines, log_format)
+    for batch in _batch_vertices(vertices, batch_size):
+        yield batch
+
+def _batch_vertices(vertices, batch_size):
+    """
+    Args:
+      vertices (iterable of LogLineVertex)
+      batch_size (int)
+
+    Returns:
+      generator of LogBatch
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be positive, got %d" % batch_size)
+    batch = LogBatch()
+    for vertex in vertices:
+        batch._add(vertex)
+        if len(batch) == batch_size:
+            batch._finish()
+            yield batch
+            batch = LogBatch()
+    if len(batch) > 0:
+        batch._finish()
+        yield batch
@@ -0,0 +1,402 @@
+"""
+Integer encoding of the tags and ids of a log.
+
+Every distinct token is interned to an int by a TokenDictionary. The tokens
+of every log line are kept in CSR layout: the token ids of line i are
+line_tokens[line_offsets[i]:line_offsets[i + 1]]. Inverting that gives the
+postings of every token, the sorted int32 array of the indexes of the lines
+it occurs in, also in CSR layout.
+
+Line indexes are positions in the parser's list of log line vertices, not
+line numbers in the file.
+
+The tokenizer's output is also kept, as TokenSpans: where each tag and id
+occurrence is in its line's message. The formatter highlights them from
+that rather than tokenizing the message again.
+
+PostingsMap is a read only dict-like view of the tags (or ids) of a
+Postings, which is what parser.parse_log returns in place of the dicts of
+lists of vertices it used to build.
+"""
+
+from array import array
+from collections import Mapping
+
+import numpy as np
+
+from tokens import tokenize, TokenType
+
+TAG = 0
+ID = 1
+"""
+Token kinds.
+"""
+
+_KIND_OF_TYPE = {TokenType.TAG : TAG, TokenType.ID : ID}
+
+def message_spans(message):
+    """
+    Tokenizes a message the way PostingsBuilder does, for a message that
+    has no TokenSpans.
+
+    Returns:
+        list of (int, int, int) start, end and kind of every tag and id in
+        the message, in order
+    """
+    return _spans_of_tokens(tokenize(message))[1]
+
+def _spans_of_tokens(tokens):
+    # Returns (list of (token, kind), list of spans) of the tags and ids
+    kept = []
+    spans = []
+    start = 0
+    for (token, token_type) in tokens:
+        end = start + len(token)
+        kind = _KIND_OF_TYPE.get(token_type)
+        if kind is not None:
+            kept.append((token, kind))
+            spans.append((start, end, kind))
+        start = end
+    return (kept, spans)
+
+class TokenDictionary(object):
+    """
+    Interns token strings to consecutive ints, in the order they are first
+    seen.
+
+    Attributes:
+        tokens (list of str) indexed by token id
+        kinds (list of int) TAG or ID, indexed by token id
+    """
+    def __init__(self):
+        self.tokens = []
+        self.kinds = []
+        self._ids = {}
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def intern(self, token, kind):
+        """
+        Returns:
+            int id of the token, which is added if it is new
+        """
+        token_id = self._ids.get(token)
+        if token_id is None:
+            token_id = len(self.tokens)
+            self._ids[token] = token_id
+            self.tokens.append(token)
+            self.kinds.append(kind)
+        return token_id
+
+    def lookup(self, token):
+        """
+        Returns:
+            int id of the token, or None if it was never interned
+        """
+        return self._ids.get(token)
+
+class TokenSpans(object):
+    """
+    Positions of every tag and id occurrence in the messages of a log, in
+    CSR layout like Postings.line_tokens.
+
+    Attributes:
+        offsets (numpy.array of int64) num_lines + 1 offsets into the rest
+        starts (numpy.array of int32) start of each span in its message
+        lengths (numpy.array of int32)
+        kinds (numpy.array of int8) TAG or ID
+    """
+    def __init__(self, offsets, starts, lengths, kinds):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.int32)
+        self.lengths = np.asarray(lengths, dtype=np.int32)
+        self.kinds = np.asarray(kinds, dtype=np.int8)
+
+    def line_spans(self, line_index):
+        """
+        Returns:
+            see message_spans
+        """
+        (start, end) = (self.offsets[line_index],
+                        self.offsets[line_index + 1])
+        starts = self.starts[start:end].tolist()
+        ends = (self.starts[start:end] + self.lengths[start:end]).tolist()
+        return zip(starts, ends, self.kinds[start:end].tolist())
+
+    @staticmethod
+    def concatenate(spans_list):
+        """
+        Args:
+            spans_list (list of TokenSpans) in log order
+
+        Returns:
+            TokenSpans
+        """
+        offsets = [np.zeros(1, dtype=np.int64)]
+        base = 0
+        for spans in spans_list:
+            offsets.append(spans.offsets[1:] + base)
+            base += len(spans.starts)
+        return TokenSpans(np.concatenate(offsets),
+                          np.concatenate([t.starts for t in spans_list]),
+                          np.concatenate([t.lengths for t in spans_list]),
+                          np.concatenate([t.kinds for t in spans_list]))
+
+class Postings(object):
+    """
+    The tokens of every line of a log, and the lines of every token.
+
+    Attributes:
+        dictionary (TokenDictionary)
+        line_offsets (numpy.array of int64) num_lines + 1 offsets into
+            line_tokens
+        line_tokens (numpy.array of int32) token ids of every line. A token
+            appears at most once per line.
+        offsets (numpy.array of int64) len(dictionary) + 1 offsets into
+            indexes
+        indexes (numpy.array of int32) line indexes of every token, sorted
+        spans (TokenSpans) or None
+    """
+    def __init__(self, dictionary, line_offsets, line_tokens, spans=None):
+        """
+        Args:
+            dictionary (TokenDictionary)
+            line_offsets (array like of int)
+            line_tokens (array like of int)
+            spans (TokenSpans)
+        """
+        self.dictionary = dictionary
+        self.spans = spans
+        self.line_offsets = np.asarray(line_offsets, dtype=np.int64)
+        self.line_tokens = np.asarray(line_tokens, dtype=np.int32)
+        # Invert the line -> tokens CSR. A stable sort by token keeps each
+        # token's lines in order.
+        lines = np.repeat(np.arange(self.num_lines(), dtype=np.int32),
+                          np.diff(self.line_offsets))
+        order = np.argsort(self.line_tokens, kind='mergesort')
+        self.indexes = lines[order]
+        counts = np.bincount(self.line_tokens, minlength=len(dictionary))
+        self.offsets = np.zeros(len(dictionary) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+
+    def num_lines(self):
+        return len(self.line_offsets) - 1
+
+    def line_token_ids(self, line_index):
+        """
+        Returns:
+            numpy.array of int32 ids of the tokens of the line
+        """
+        return self.line_tokens[self.line_offsets[line_index]:
+                                self.line_offsets[line_index + 1]]
+
+    def postings(self, token_id):
+        """
+        Returns:
+            numpy.array of int32 sorted indexes of the lines the token is in
+        """
+        return self.indexes[self.offsets[token_id]:self.offsets[token_id + 1]]
+
+    def token_ids(self, kind):
+        """
+        Returns:
+            numpy.array of int ids of the tokens of the kind
+        """
+        kinds = np.asarray(self.dictionary.kinds, dtype=np.int8)
+        return np.flatnonzero(kinds == kind)
+
+    def document_frequencies(self):
+        """
+        Returns:
+            numpy.array of int64 number of lines each token is in, by id
+        """
+        return np.diff(self.offsets)
+
+    def select_tokens(self, keep):
+        """
+        Args:
+            keep (numpy.array of bool) by token id, whether to keep the token
+
+        Returns:
+            Postings with only the kept tokens, which are renumbered in order
+        """
+        dictionary = TokenDictionary()
+        for token_id in np.flatnonzero(keep).tolist():
+            dictionary.intern(self.dictionary.tokens[token_id],
+                              self.dictionary.kinds[token_id])
+        remap = np.cumsum(keep, dtype=np.int32) - 1
+        kept = keep[self.line_tokens]
+        lines = np.repeat(np.arange(self.num_lines()),
+                          np.diff(self.line_offsets))
+        line_offsets = np.zeros(self.num_lines() + 1, dtype=np.int64)
+        np.cumsum(np.bincount(lines[kept], minlength=self.num_lines()),
+                  out=line_offsets[1:])
+        return Postings(dictionary, line_offsets,
+                        remap[self.line_tokens[kept]], self.spans)
+
+    @staticmethod
+    def concatenate(postings_list):
+        """
+        Joins the postings of consecutive chunks of a log, each with its own
+        dictionary, into the postings of the whole.
+
+        Args:
+            postings_list (list of Postings) in log order
+
+        Returns:
+            Postings
+        """
+        dictionary = TokenDictionary()
+        spans = None
+        if all(postings.spans is not None for postings in postings_list):
+            spans = TokenSpans.concatenate([postings.spans
+                                            for postings in postings_list])
+        line_offsets = [np.zeros(1, dtype=np.int64)]
+        line_tokens = []
+        base = 0
+        for postings in postings_list:
+            remap = np.array([dictionary.intern(token, kind) for (token, kind)
+                              in zip(postings.dictionary.tokens,
+                                     postings.dictionary.kinds)],
+                             dtype=np.int32)
+            line_tokens.append(remap[postings.line_tokens])
+            line_offsets.append(postings.line_offsets[1:] + base)
+            base += len(postings.line_tokens)
+        return Postings(dictionary, np.concatenate(line_offsets),
+                        np.concatenate(line_tokens), spans)
+
+class PostingsBuilder(object):
+    """
+    Tokenizes log lines one at a time into a Postings.
+    """
+    def __init__(self):
+        self.dictionary = TokenDictionary()
+        self._line_offsets = array('l', [0])
+        self._line_tokens = array('i')
+        self._span_offsets = array('l', [0])
+        self._span_starts = array('i')
+        self._span_lengths = array('i')
+        self._span_kinds = array('b')
+
+    def add_line(self, message):
+        """
+        Tokenizes the message of the next line.
+
+        Args:
+            message (str)
+        """
+        intern = self.dictionary.intern
+        line_tokens = self._line_tokens
+        # Stop words and spaces are skipped
+        (tokens, spans) = _spans_of_tokens(tokenize(message))
+        # A line which has a word more than once shouldn't get counted twice
+        seen = set()
+        for (token, kind) in tokens:
+            if token in seen:
+                continue
+            seen.add(token)
+            line_tokens.append(intern(token, kind))
+        self._line_offsets.append(len(line_tokens))
+        for (start, end, kind) in spans:
+            self._span_starts.append(start)
+            self._span_lengths.append(end - start)
+            self._span_kinds.append(kind)
+        self._span_offsets.append(len(self._span_starts))
+
+    def build(self):
+        """
+        Returns:
+            Postings
+        """
+        spans = TokenSpans(_to_numpy(self._span_offsets),
+                           _to_numpy(self._span_starts),
+                           _to_numpy(self._span_lengths),
+                           _to_numpy(self._span_kinds))
+        return Postings(self.dictionary, _to_numpy(self._line_offsets),
+                        _to_numpy(self._line_tokens), spans)
+
+_NUMPY_TYPES = {'b' : np.int8, 'i' : np.intc, 'l' : np.int_}
+
+def _to_numpy(arr):
+    # Copy, as the numpy array would break if the array were appended to
+    return np.frombuffer(arr, dtype=_NUMPY_TYPES[arr.typecode]).copy()
+
+class PostingsMap(Mapping):
+    """
+    Read only view of the tags or the ids of a Postings as a dict of token to
+    the list of the vertices of the lines it occurs in, in log order. The
+    lists are made on demand; line_indexes() gives the line indexes without
+    making any vertex lists.
+
+    Attributes:
+        postings (Postings)
+        kind (int) TAG or ID
+        vertices (list of vertex.LogLineVertex) indexed by line index
+    """
+    def __init__(self, postings, kind, vertices):
+        self.postings = postings
+        self.kind = kind
+        self.vertices = vertices
+        self._token_ids = postings.token_ids(kind)
+
+    def _token_id(self, token):
+        token_id = self.postings.dictionary.lookup(token)
+        if token_id is None or \
+                self.postings.dictionary.kinds[token_id] != self.kind:
+            raise KeyError(token)
+        return token_id
+
+    def token_ids(self):
+        """
+        Returns:
+            numpy.array of int ids (in postings.dictionary) of the map's
+            tokens
+        """
+        return self._token_ids
+
+    def line_indexes(self, token):
+        """
+        Returns:
+            numpy.array of int32 sorted indexes into vertices of the lines
+            the token occurs in
+
+        Raises:
+            KeyError if the token isn't one of the map's
+        """
+        return self.postings.postings(self._token_id(token))
+
+    def __getitem__(self, token):
+        vertices = self.vertices
+        return [vertices[i] for i in self.line_indexes(token).tolist()]
+
+    def __iter__(self):
+        tokens = self.postings.dictionary.tokens
+        for token_id in self._token_ids.tolist():
+            yield tokens[token_id]
+
+    def __len__(self):
+        return len(self._token_ids)
+
+    def __contains__(self, token):
+        token_id = self.postings.dictionary.lookup(token)
+        return token_id is not None and \
+            self.postings.dictionary.kinds[token_id] == self.kind
+
+def postings_maps(postings, vertices):
+    """
+    Also points every vertex at its line of the postings, see
+    vertex.BaseLogLineVertex.token_spans.
+
+    Args:
+        postings (Postings)
+        vertices (list of vertex.LogLineVertex) indexed by line index
+
+    Returns:
+        (PostingsMap, PostingsMap) the tag and id views of the postings
+    """
+    for (i, vertex) in enumerate(vertices):
+        vertex.postings = postings
+        vertex.line_index = i
+    return (PostingsMap(postings, TAG, vertices),
+            PostingsMap(postings, ID, vertices))
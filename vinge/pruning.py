@@ -0,0 +1,110 @@
+"""
+Drops tags and ids by how many log lines they are in.
+
+Tokens in most lines (INFO, a busy class name...) make enormous tag chains
+and hub rows in the transition matrix without telling lines apart, and
+tokens in only a line or two make dead end vertices. STOP_WORDS only knows
+about English; this looks at the log itself. The parse already counts the
+lines of every token (see postings.Postings), so pruning is a second pass
+over the postings arrays rather than over the log.
+"""
+
+import numpy as np
+
+from postings import ID, PostingsMap, TAG
+
+DEFAULT_REPORT_LIMIT = 20
+"""
+Number of tokens of each kind PruneReport.format lists.
+"""
+
+class PruneReport(object):
+    """
+    What prune_tokens dropped.
+
+    Attributes:
+        num_lines (int) lines in the log
+        frequent (list of (str, int)) tokens dropped for being in too many
+            lines, and their line counts, most frequent first
+        rare (list of (str, int)) tokens dropped for being in too few lines,
+            and their line counts
+        num_tokens (int) tokens before pruning
+    """
+    def __init__(self, num_lines, num_tokens):
+        self.num_lines = num_lines
+        self.num_tokens = num_tokens
+        self.frequent = []
+        self.rare = []
+
+    def num_dropped(self):
+        return len(self.frequent) + len(self.rare)
+
+    def format(self, limit=DEFAULT_REPORT_LIMIT):
+        """
+        Args:
+            limit (int) most tokens to list of each kind
+
+        Returns:
+            list of str lines of the report
+        """
+        ret = ['dropped %d of %d tokens' % (self.num_dropped(),
+                                            self.num_tokens)]
+        for (what, tokens) in [('frequent', self.frequent),
+                               ('rare', self.rare)]:
+            if not tokens:
+                continue
+            ret.append('%d %s:' % (len(tokens), what))
+            for (token, count) in tokens[:limit]:
+                ret.append('  %s (%d lines, %.1f%%)' %
+                           (token, count, 100.0 * count / self.num_lines))
+            if len(tokens) > limit:
+                ret.append('  ... and %d more' % (len(tokens) - limit))
+        return ret
+
+def prune_tokens(parse, max_df=None, min_count=None, kinds=(TAG, ID)):
+    """
+    Args:
+        parse see parser.parse_log return value
+        max_df (float) drop tokens in more than this fraction of the lines.
+            None for no limit.
+        min_count (int) drop tokens in fewer than this many lines. None for
+            no limit.
+        kinds (tuple of int) which kinds of token (postings.TAG and
+            postings.ID) to prune
+
+    Returns:
+        (parse, PruneReport) the parse with the tokens dropped, which shares
+        the log line vertices of the argument. Only the tag and id maps are
+        pruned: the vertices keep pointing at the full postings, which is
+        what find (see search.SearchIndex) searches.
+    """
+    (log_lines, tag_map, id_map) = parse
+    postings = tag_map.postings
+    counts = postings.document_frequencies()
+    num_lines = postings.num_lines()
+    report = PruneReport(num_lines, len(counts))
+
+    prunable = np.in1d(np.asarray(postings.dictionary.kinds, dtype=np.int8),
+                       kinds)
+    frequent = np.zeros(len(counts), dtype=bool)
+    rare = np.zeros(len(counts), dtype=bool)
+    if max_df is not None:
+        frequent = prunable & (counts > max_df * num_lines)
+    if min_count is not None:
+        rare = prunable & (counts < min_count) & ~frequent
+    keep = ~(frequent | rare)
+    if keep.all():
+        return (parse, report)
+
+    tokens = postings.dictionary.tokens
+    line_counts = counts.tolist()
+    report.frequent = sorted(((tokens[i], line_counts[i])
+                              for i in np.flatnonzero(frequent).tolist()),
+                             key=lambda (token, count): (-count, token))
+    report.rare = [(tokens[i], line_counts[i])
+                   for i in np.flatnonzero(rare).tolist()]
+    pruned = postings.select_tokens(keep)
+    # Not postings_maps, which would point the vertices at the pruned
+    # postings too
+    return ((log_lines, PostingsMap(pruned, TAG, log_lines),
+             PostingsMap(pruned, ID, log_lines)), report)
@@ -4,6 +4,7 @@ import sys
 
 import vinge.cmd as cmd
 import vinge.help
+from vinge.graph import EDGE_TYPE_NAMES
 
 class _CommandParsingError(Exception):
     def __init__(self, message):
@@ -24,8 +25,38 @@ def _setup_command_parser():
 
     # go command
     go_parser = subparsers.add_parser('go', aliases=['g'])
-    go_parser.add_argument('idx', type=int)
-    go_parser.set_defaults(func=cmd.go_by_neighbor_index)
+    go_parser.add_argument('target')
+    go_parser.set_defaults(func=cmd.go)
+
+    # find
+    find_parser = subparsers.add_parser('find', aliases=['f'])
+    find_parser.add_argument('query', nargs='*')
+    find_parser.set_defaults(func=cmd.find)
+
+    # goto commands
+    goto_parser = subparsers.add_parser('goto')
+    goto_sparser = goto_parser.add_subparsers()
+
+    # goto line
+    goto_line_parser = goto_sparser.add_parser('line')
+    goto_line_parser.add_argument('line-number', type=int)
+    goto_line_parser.add_argument('file', nargs='?')
+    goto_line_parser.set_defaults(func=cmd.goto_line)
+
+    # goto time
+    goto_time_parser = goto_sparser.add_parser('time')
+    goto_time_parser.add_argument('time', nargs='+')
+    goto_time_parser.set_defaults(func=cmd.goto_time)
+
+    # goto tag
+    goto_tag_parser = goto_sparser.add_parser('tag')
+    goto_tag_parser.add_argument('word')
+    goto_tag_parser.set_defaults(func=cmd.goto_tag)
+
+    # goto id
+    goto_id_parser = goto_sparser.add_parser('id')
+    goto_id_parser.add_argument('id')
+    goto_id_parser.set_defaults(func=cmd.goto_id)
 
     help_parser = subparsers.add_parser('help')
     help_parser.add_argument('topic', nargs='*')
@@ -51,6 +82,10 @@ def _setup_command_parser():
     # path-set add
     path_set_add_parser = path_set_sparser.add_parser('add', aliases=['a'])
     path_set_add_parser.add_argument('name')
+    path_set_add_parser.add_argument('--edges', default=None,
+                                     help='only walk these comma separated '
+                                     'edge types: %s' %
+                                     ', '.join(sorted(EDGE_TYPE_NAMES)))
     path_set_add_parser.add_argument('semex-str', nargs='+')
     path_set_add_parser.set_defaults(func=cmd.semex_add)
 
@@ -67,11 +102,19 @@ def _setup_command_parser():
 
     return command_parser
 
-def repl(ctx):
+def repl(ctx, before_command=None):
+    """
+    Args:
+        ctx (context.Context)
+        before_command (fun () -> None) if not None, called after every
+            command is read and before it is run
+    """
     parser = _setup_command_parser()
     while True:
         output.pp("> ", newline=False)
         str_args = sys.stdin.readline().rstrip()
+        if before_command is not None:
+            before_command()
         parser_args = str_args.split()
         try:
             args = parser.parse_args(parser_args)
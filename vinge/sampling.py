@@ -0,0 +1,122 @@
+"""
+Sampling of log lines, for building a quick approximate graph of a log
+that is too big to ingest whole. See parser.parse_log_file_sampled.
+
+Every line within a window around the line the user starts on is kept.
+The rest of the log is sampled: lines are grouped into strata by time
+bucket and thread, and every stride-th line of each stratum is kept, so
+quiet threads and quiet periods are represented as well as busy ones.
+
+Each kept line outside the window stands for all the lines of its stratum
+that were dropped. That number is its sample_weight, which graph.make_graph
+uses to scale the edges leading to the line.
+"""
+
+DEFAULT_SAMPLE_RATE = 0.01
+"""
+Fraction of the lines outside the window that are kept.
+"""
+
+DEFAULT_WINDOW_LINES = 1000
+"""
+Number of lines either side of the start line that are all kept.
+"""
+
+DEFAULT_BUCKET_MINUTES = 5
+"""
+Width of the time buckets lines are stratified by.
+"""
+
+class LogSampler(object):
+    """
+    Decides which log lines to keep from their line number, time and
+    thread, so a line only has to be parsed once it is kept. Offer it every
+    conforming line in file order, then call finish() with the vertices of
+    the kept lines to set their sample weights.
+
+    Attributes:
+        center_line (int) line number the window is centered on
+        center_millis (int) time the window is centered on, only needed if
+            there is a window_minutes. None until it is known, in which case
+            no line is in the time window.
+        window_millis (int) width of the time window either side of
+            center_millis, None for no time window
+    """
+    def __init__(self, center_line, rate=DEFAULT_SAMPLE_RATE,
+                 window_lines=DEFAULT_WINDOW_LINES, window_minutes=None,
+                 bucket_minutes=DEFAULT_BUCKET_MINUTES):
+        """
+        Args:
+            center_line (int)
+            rate (float) in (0, 1]
+            window_lines (int) lines this many lines from center_line or
+                closer are kept. None for no line window.
+            window_minutes (float) lines this many minutes from
+                center_millis or closer are kept. None for no time window.
+            bucket_minutes (float)
+        """
+        if not 0.0 < rate <= 1.0:
+            raise ValueError("rate must be in (0, 1], got %r" % rate)
+        self.center_line = center_line
+        self.center_millis = None
+        self.window_millis = None
+        if window_minutes is not None:
+            self.window_millis = int(window_minutes * 60000)
+        self._stride = max(1, int(round(1.0 / rate)))
+        self._window_lines = window_lines
+        self._bucket_millis = max(1, int(bucket_minutes * 60000))
+        # stratum -> number of lines offered
+        self._counts = {}
+        # stratum -> number of lines kept
+        self._kept_counts = {}
+        # line number -> stratum, for the kept lines outside the window
+        self._strata = {}
+
+    def in_line_window(self, line_number):
+        return self._window_lines is not None and \
+            abs(line_number - self.center_line) <= self._window_lines
+
+    def in_window(self, line_number, millis):
+        if self.in_line_window(line_number):
+            return True
+        if self.window_millis is not None and \
+                self.center_millis is not None and \
+                abs(millis - self.center_millis) <= self.window_millis:
+            return True
+        return False
+
+    def offer(self, line_number, millis, thread_id):
+        """
+        Args:
+            line_number (int)
+            millis (int) time of the line
+            thread_id (str)
+
+        Returns:
+            bool whether to keep the line
+        """
+        if self.in_window(line_number, millis):
+            return True
+        stratum = (millis // self._bucket_millis, thread_id)
+        count = self._counts.get(stratum, 0)
+        self._counts[stratum] = count + 1
+        if count % self._stride != 0:
+            return False
+        self._kept_counts[stratum] = self._kept_counts.get(stratum, 0) + 1
+        self._strata[line_number] = stratum
+        return True
+
+    def finish(self, vertices):
+        """
+        Sets the sample_weight of every kept vertex outside the window to
+        the number of lines of its stratum it stands for.
+
+        Args:
+            vertices (iterable of vertex.LogLineVertex) those of the kept
+                lines
+        """
+        for vertex in vertices:
+            stratum = self._strata.get(vertex.line_number)
+            if stratum is not None:
+                vertex.sample_weight = float(self._counts[stratum]) / \
+                    self._kept_counts[stratum]
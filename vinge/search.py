@@ -0,0 +1,350 @@
+"""
+Boolean search over the log lines, for the find command of the repl.
+
+A query is made of terms:
+    word            lines with the tag or id
+    thread:NAME     lines logged by the thread
+    after:TIME      lines at or after the time (see timestamps.parse_time)
+    before:TIME     lines before the time
+    template:ID     lines of the template (see vinge.templates)
+combined with 'and' (or just putting terms next to each other), 'or', 'not'
+and parentheses. 'not' binds tightest, then 'and', then 'or'. E.g.
+
+    (foo or bar) urn:x not thread:main after:12:03
+
+Every term evaluates to a sorted array of positions of log lines (the
+lines' order in the log), so tags and ids are answered straight from their
+postings (see postings.Postings), and the operators are sorted array
+intersection, union and difference.
+"""
+
+import re
+
+import numpy as np
+
+from node_index import extend_parts
+from postings import Postings, PostingsBuilder
+from timestamps import parse_time
+from vertex import NodeKind
+
+GALLOP_RATIO = 8
+"""
+intersect probes the shorter of two arrays into the longer one when it is
+at least this many times shorter, and merges them otherwise.
+"""
+
+# The set operations take the size of the universe when it is known (the
+# number of log lines). Merging is then done through a bitmap of that many
+# bools, which is linear, rather than numpy's sort based set functions.
+
+def intersect(a, b, size=None):
+    """
+    Args:
+        a, b (numpy.array of int) sorted, without duplicates
+        size (int) if not None, all the values are less than this
+
+    Returns:
+        numpy.array of int the sorted values in both
+    """
+    if len(a) > len(b):
+        (a, b) = (b, a)
+    if len(a) == 0:
+        return a
+    if len(a) * GALLOP_RATIO >= len(b):
+        if size is None:
+            return np.intersect1d(a, b, assume_unique=True)
+        return a[_bitmap(b, size)[a]]
+    # Galloping: look every value of the short array up in the long one.
+    # The lookups are binary searches done by numpy, so this costs
+    # len(a) * log(len(b)) instead of len(a) + len(b).
+    found = np.searchsorted(b, a)
+    found[found == len(b)] = 0
+    return a[b[found] == a]
+
+def union(a, b, size=None):
+    """
+    Args:
+        a, b (numpy.array of int) sorted, without duplicates
+        size (int) if not None, all the values are less than this
+
+    Returns:
+        numpy.array of int the sorted values in either
+    """
+    if len(a) == 0:
+        return b
+    if len(b) == 0:
+        return a
+    if size is None:
+        return np.union1d(a, b)
+    bitmap = _bitmap(a, size)
+    bitmap[b] = True
+    return np.flatnonzero(bitmap)
+
+def difference(a, b, size=None):
+    """
+    Args:
+        a, b (numpy.array of int) sorted, without duplicates
+        size (int) if not None, all the values are less than this
+
+    Returns:
+        numpy.array of int the sorted values of a that aren't in b
+    """
+    if len(a) == 0 or len(b) == 0:
+        return a
+    if size is None:
+        return np.setdiff1d(a, b, assume_unique=True)
+    return a[~_bitmap(b, size)[a]]
+
+def _bitmap(a, size):
+    ret = np.zeros(size, dtype=bool)
+    ret[a] = True
+    return ret
+
+class QueryError(ValueError):
+    """
+    Raised for a query that doesn't parse.
+    """
+    pass
+
+_QUERY_TOKEN_REGEX = re.compile(r'\(|\)|[^\s()]+')
+
+_KEYWORDS = frozenset(['and', 'or', 'not'])
+
+_TERM_PREFIXES = frozenset(['thread', 'after', 'before', 'template'])
+
+def parse_query(string, reference_millis=0):
+    """
+    Args:
+        string (str) the query, see the module comments
+        reference_millis (int) times without a date are on this day
+
+    Returns:
+        the query as nested tuples, each one of
+        ('word', str), ('thread', str), ('after', int), ('before', int),
+        ('template', int), ('not', query), ('and', list of query), ('or', list of query)
+
+    Raises:
+        QueryError if the query is not valid
+    """
+    tokens = _QUERY_TOKEN_REGEX.findall(string)
+    if not tokens:
+        raise QueryError("Empty query")
+    parser = _QueryParser(tokens, reference_millis)
+    ret = parser.parse_or()
+    if parser.pos < len(tokens):
+        raise QueryError("Unexpected '%s'" % tokens[parser.pos])
+    return ret
+
+class _QueryParser(object):
+    # Recursive descent, one method per precedence level
+
+    def __init__(self, tokens, reference_millis):
+        self.tokens = tokens
+        self.pos = 0
+        self.reference_millis = reference_millis
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+
+    def next(self):
+        ret = self.peek()
+        if ret is None:
+            raise QueryError("Query ends too early")
+        self.pos += 1
+        return ret
+
+    def parse_or(self):
+        ret = [self.parse_and()]
+        while self.peek() == 'or':
+            self.next()
+            ret.append(self.parse_and())
+        if len(ret) == 1:
+            return ret[0]
+        return ('or', ret)
+
+    def parse_and(self):
+        ret = [self.parse_not()]
+        while self.peek() not in (None, 'or', ')'):
+            if self.peek() == 'and':
+                self.next()
+            ret.append(self.parse_not())
+        if len(ret) == 1:
+            return ret[0]
+        return ('and', ret)
+
+    def parse_not(self):
+        if self.peek() == 'not':
+            self.next()
+            return ('not', self.parse_not())
+        return self.parse_term()
+
+    def parse_term(self):
+        token = self.next()
+        if token == '(':
+            ret = self.parse_or()
+            if self.next() != ')':
+                raise QueryError("Missing ')'")
+            return ret
+        if token == ')' or token in _KEYWORDS:
+            raise QueryError("Unexpected '%s'" % token)
+        (prefix, sep, value) = token.partition(':')
+        if sep and prefix in _TERM_PREFIXES:
+            if not value:
+                raise QueryError("Nothing after '%s:'" % prefix)
+            if prefix == 'thread':
+                return ('thread', value)
+            if prefix == 'template':
+                if not value.isdigit():
+                    raise QueryError("Bad template id '%s'" % value)
+                return ('template', int(value))
+            try:
+                return (prefix, parse_time(value, self.reference_millis))
+            except ValueError, e:
+                raise QueryError(str(e))
+        return ('word', token)
+
+class SearchIndex(object):
+    """
+    Answers queries over the log lines of a node_table.NodeTable.
+
+    The postings of the log lines are put back together from the
+    postings.Postings the lines were parsed with (there is one per batch
+    when the log was read in batches). Lines without postings are
+    tokenized again.
+
+    Like node_index.NodeIndex, the index keeps up with a table that grows
+    (see extend) by indexing the new lines apart. Every part answers the
+    query for its own lines.
+    """
+    def __init__(self, table):
+        """
+        Args:
+            table (node_table.NodeTable)
+        """
+        self.table = table
+        self._parts = []
+        self.extend()
+
+    def extend(self):
+        """
+        Indexes the log lines added to the table since the index was made or
+        last extended.
+        """
+        extend_parts(self._parts, _SearchIndexPart, self.table)
+
+    def find(self, query):
+        """
+        Args:
+            query see parse_query's return value
+
+        Returns:
+            numpy.array of int the idx of the matching log lines, in log
+            order
+        """
+        return np.concatenate([part.find(query) for part in self._parts])
+
+class _SearchIndexPart(object):
+    """
+    SearchIndex of the log lines among the rows start to stop of the table.
+    """
+    def __init__(self, table, start, stop):
+        self.table = table
+        self.start = start
+        self.stop = stop
+        # idx of every log line, by position
+        self.rows = start + np.flatnonzero(table.kinds[start:stop] ==
+                                           NodeKind.NodeKindLogLineVertex)
+        self.postings = _log_postings(table, self.rows)
+        self._all = np.arange(len(self.rows))
+
+    def find(self, query):
+        return self.rows[self._positions(query)]
+
+    def _positions(self, query):
+        op = query[0]
+        if op == 'word':
+            token_id = self.postings.dictionary.lookup(query[1])
+            if token_id is None:
+                return self._all[:0]
+            return self.postings.postings(token_id)
+        elif op == 'thread':
+            code = self.table.threads.lookup(query[1])
+            if code is None:
+                return self._all[:0]
+            return np.flatnonzero(self.table.thread_codes[self.rows] == code)
+        elif op == 'template':
+            return np.flatnonzero(self.table.template_ids[self.rows] ==
+                                  query[1])
+        elif op == 'after':
+            return np.flatnonzero(self.table.millis[self.rows] >= query[1])
+        elif op == 'before':
+            return np.flatnonzero(self.table.millis[self.rows] < query[1])
+        elif op == 'not':
+            return difference(self._all, self._positions(query[1]),
+                              len(self.rows))
+        elif op == 'or':
+            ret = self._all[:0]
+            for part in query[1]:
+                ret = union(ret, self._positions(part), len(self.rows))
+            return ret
+        elif op == 'and':
+            return self._and(query[1])
+        raise ValueError("Programmer error: unknown query %r" % (query,))
+
+    def _and(self, parts):
+        # 'x and not y' is x minus y, which saves making 'not y'. The rest
+        # are intersected smallest first, so every intersection is as cheap
+        # as it can be.
+        positive = [self._positions(part) for part in parts
+                    if part[0] != 'not']
+        negative = [self._positions(part[1]) for part in parts
+                    if part[0] == 'not']
+        if not positive:
+            positive = [self._all]
+        positive.sort(key=len)
+        ret = positive[0]
+        for positions in positive[1:]:
+            if len(ret) == 0:
+                break
+            ret = intersect(ret, positions, len(self.rows))
+        for positions in negative:
+            ret = difference(ret, positions, len(self.rows))
+        return ret
+
+def _log_postings(table, rows):
+    """
+    Args:
+        table (node_table.NodeTable)
+        rows (numpy.array of int) idx of the table's log lines
+
+    Returns:
+        postings.Postings of the log lines, whose line indexes are positions
+        in rows
+    """
+    codes = table.postings_codes[rows]
+    starts = np.concatenate([[0], np.flatnonzero(codes[1:] != codes[:-1]) + 1,
+                             [len(rows)]]).tolist()
+    chunks = []
+    for (start, end) in zip(starts[:-1], starts[1:]):
+        if start == end:
+            continue
+        postings = table.postings.value(codes[start])
+        chunk_rows = rows[start:end]
+        # Use the parse's postings when the run of lines is exactly its
+        # lines, otherwise tokenize the lines again
+        if postings is not None and postings.num_lines() == end - start and \
+                np.array_equal(table.line_indexes[chunk_rows],
+                               np.arange(end - start)):
+            chunks.append(postings)
+        else:
+            builder = PostingsBuilder()
+            for row in chunk_rows.tolist():
+                builder.add_line(table.vertex(row).message)
+            chunks.append(builder.build())
+    if len(chunks) == 1:
+        return chunks[0]
+    if not chunks:
+        return PostingsBuilder().build()
+    return Postings.concatenate(chunks)
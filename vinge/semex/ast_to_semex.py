@@ -1,4 +1,4 @@
-from vinge.filters import id, logline, tag
+from vinge.filters import id, logline, tag, template
 from parser import *
 from semex import SensorSemex, ConcatSemex, DisjunctSemex, StarSemex, TrivialSemex
 
@@ -13,6 +13,8 @@ def _base_absyn(graph, node):
             f = tag
         elif bt == BaseType.ID:
             f = id
+        elif bt == BaseType.TEMPLATE:
+            f = template
         return SensorSemex(graph.number_of_nodes(),
                            f, graph)
 
@@ -39,8 +41,9 @@ def ast_to_semex(graph, transition, transition_op, ast):
     be used with the given graph.
 
     Args:
-        graph (networkx.graph)
-        transition (scipy.sparse.base.spmatrix) Adjacency matrix of graph
+        graph (networkx.graph or node_table.NodeTable)
+        transition (scipy.sparse.base.spmatrix) Adjacency matrix of graph,
+            or a function returning it (see semex._WalkSemex)
         transition_op (scipy.sparse.linalg.LinearOperator) LinOp of transition
         ast (regex_parser.RegExAbsSyn)
     Returns:
@@ -32,6 +32,7 @@ were it would be part of the factor' rule.
 <base>    ::= 'logline'
             | 'id'
             | 'tag'
+            | 'template'
             | '(' <regex> ')'
 """
 
@@ -58,6 +59,12 @@ class _Stream(object):
             _error("expected '%s', got '%s'" % (expected, c))
         self._idx += 1
 
+    def peek_next(self):
+        # Returns the item after the next one, or None
+        if self._idx + 1 < self._len:
+            return self._string[self._idx + 1]
+        return None
+
     def eat_word(self, word):
         for letter in word:
             self.eat(letter)
@@ -77,7 +84,8 @@ class BaseType:
     LOGLINE = 0,
     TAG = 1,
     ID = 2,
-    ANYTHING = 3
+    ANYTHING = 3,
+    TEMPLATE = 4
 
 class BaseAbsyn(RegExAbsSyn):
     """
@@ -97,6 +105,8 @@ class BaseAbsyn(RegExAbsSyn):
             return 'BaseAbsyn<Id>'
         elif bt == BaseType.ANYTHING:
             return 'BaseAbsyn<Any>'
+        elif bt == BaseType.TEMPLATE:
+            return 'BaseAbsyn<Template>'
 
     def __cmp__(self, other):
         if not isinstance(other, BaseAbsyn):
@@ -222,6 +232,10 @@ def _base(stream):
         stream.eat_word("id")
         return BaseAbsyn(BaseType.ID)
     elif c == 't':
+        # 'tag' and 'template' both start with 't'
+        if stream.peek_next() == 'e':
+            stream.eat_word('template')
+            return BaseAbsyn(BaseType.TEMPLATE)
         stream.eat_word('tag')
         return BaseAbsyn(BaseType.TAG)
     elif c == '.':
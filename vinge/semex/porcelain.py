@@ -18,9 +18,10 @@ def make_semex_starting_here(transition,
     That is, start with the node passed in, followed by the semex.
 
     Args:
-        transition (scipy.sparse.base.spmatrix) Adjacency matrix of graph
+        transition (scipy.sparse.base.spmatrix) Adjacency matrix of graph,
+            or a function returning it (see semex._WalkSemex)
         transition_op (scipy.sparse.linalg.LinearOperator) LinOp of transition
-        graph (networkx.DiGraph)
+        graph (networkx.DiGraph or node_table.NodeTable)
         num_nodes (int)
         semex (semex.semex.Semex)
         node (vertex.Vertex)
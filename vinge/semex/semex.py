@@ -86,6 +86,9 @@ import numpy as np
 import scipy as sp
 from scipy.sparse.linalg import LinearOperator, aslinearoperator
 
+from vinge.node_table import NodeTable
+from vinge.vertex import Vertex
+
 # multiply linear operators
 def mul(a,b):
     def matvec(v):
@@ -184,10 +187,17 @@ class SensorSemex(Semex):
     def _create_sensor_vector(self):
         """
         Applies self.thesensor to self.graph to make a vector of the results.
+        self.graph can also be a node_table.NodeTable.
         Returns: numpy.array
         """
+        if isinstance(self.graph, NodeTable):
+            return self.graph.sensor_vector(self.thesensor)
         vector = np.zeros(self.graph.number_of_nodes())
         for i, node in enumerate(self.graph.nodes_iter()):
+            # Vertices in a graph know their index, which need not be the
+            # iteration order
+            if isinstance(node, Vertex) and node.idx() is not None:
+                i = node.idx()
             vector[i] = self.thesensor(node)
         return vector
 
@@ -290,7 +300,27 @@ class DisjunctSemex(Semex):
     def __str__(self):
         return "(%s|%s)" % (self.poss1, self.poss2)
 
-class StarSemex(Semex):
+class _WalkSemex(Semex):
+    """
+    A semex that walks the edges of the graph, with its transition matrix.
+
+    The matrix can be given as a function returning it, which is called the
+    first time the matrix is needed. Only compile_into_matrix and apply use
+    it, and the matrix of a graph that is growing costs a copy of all its
+    edges to make (see graph.TransitionLayers), while its linear operator
+    doesn't.
+    """
+    @property
+    def transition(self):
+        if callable(self._transition):
+            self._transition = self._transition()
+        return self._transition
+
+    @transition.setter
+    def transition(self, transition):
+        self._transition = transition
+
+class StarSemex(_WalkSemex):
     def __init__(self, transition, transition_op, nnodes, inside, length):
         self.transition = transition
         self.transition_op = transition_op
@@ -393,7 +423,7 @@ class StarSemex(Semex):
     def __str__(self):
         return "(%s)*" % self.inside
 
-class ConcatSemex(Semex):
+class ConcatSemex(_WalkSemex):
     def __init__(self, transition, transition_op, part1, part2):
         self.transition = transition
         self.transition_op = transition_op
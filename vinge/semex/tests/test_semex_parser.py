@@ -23,6 +23,11 @@ class TestRegexParser:
         r = compile_regex("tag")
         assert r == BaseAbsyn(BaseType.TAG)
 
+    def test_template(self):
+        r = compile_regex("template tag")
+        assert r == ConcatAbsyn(BaseAbsyn(BaseType.TEMPLATE),
+                                BaseAbsyn(BaseType.TAG))
+
     def test_period(self):
         r = compile_regex(".")
         assert r == BaseAbsyn(BaseType.ANYTHING)
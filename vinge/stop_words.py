@@ -2,9 +2,7 @@
 List of stop words.
 """
 
-from sets import Set
-
-STOP_WORDS = Set([
+STOP_WORDS = frozenset([
     'a', 'able', 'about', 'above', 'according', 'accordingly', 'across',
     'actually', 'after', 'afterwards', 'again', 'against', "ain't", 'all',
     'allow', 'allows', 'almost', 'alone', 'along', 'already', 'also',
@@ -0,0 +1,212 @@
+"""
+Log template mining: grouping log lines by the print statement that made
+them.
+
+Most log lines come from a few thousand print statements, so most lines
+are one of a few thousand templates with the ids, numbers and such filled
+in. TemplateMiner finds the templates as lines stream by, in the style of
+Drain (He et al., "Drain: An Online Log Parsing Approach with Fixed Depth
+Tree", ICWS 2017). Lines are routed down a tree by their number of tokens,
+then by their first few tokens, to a short list of templates, and join the
+most similar one if it is similar enough. Joining a template turns the
+positions where it and the line differ into wildcards.
+
+The tokens of a line are its tags and ids (see tokens.tokenize), with ids
+already wildcards. Splitters and stop words are left out, so template text
+is only an approximation of the line.
+
+graph.make_graph links the lines of a template with a chain of
+vertex.TemplateVertex, which can stand in for the tag chains.
+"""
+
+from postings import ID, message_spans
+
+WILDCARD = '<*>'
+
+DEFAULT_DEPTH = 4
+"""
+Depth of the routing tree: the token count level, then DEPTH - 2 levels of
+leading tokens.
+"""
+
+DEFAULT_SIMILARITY = 0.4
+"""
+Fraction of its tokens a line must share with a template to join it.
+"""
+
+DEFAULT_MAX_CHILDREN = 100
+"""
+Most children a node of the routing tree gets. Lines that would make more
+go down the wildcard child.
+"""
+
+# Key of a routing tree node's list of templates, which can't clash with a
+# token
+_TEMPLATES = None
+
+class Template(object):
+    """
+    Attributes:
+        template_id (int) index in TemplateMiner.templates
+        tokens (list of str) WILDCARD where lines differ
+        count (int) number of lines of the template
+    """
+    def __init__(self, template_id, tokens):
+        self.template_id = template_id
+        self.tokens = list(tokens)
+        self.count = 1
+
+    def text(self):
+        return ' '.join(self.tokens)
+
+    def __repr__(self):
+        return '<Template %d: %s>' % (self.template_id, self.text())
+
+class TemplateMiner(object):
+    """
+    Usage:
+        miner = TemplateMiner()
+        for vertex in log_lines:
+            miner.add_vertex(vertex)
+        miner.templates
+
+    Template ids never change once handed out, but template text gets more
+    general (more wildcards) as lines are added.
+
+    Attributes:
+        templates (list of Template) by template id
+    """
+    def __init__(self, depth=DEFAULT_DEPTH, similarity=DEFAULT_SIMILARITY,
+                 max_children=DEFAULT_MAX_CHILDREN):
+        """
+        Args:
+            depth (int) see DEFAULT_DEPTH, at least 3
+            similarity (float) see DEFAULT_SIMILARITY
+            max_children (int) see DEFAULT_MAX_CHILDREN
+
+        Raises:
+            ValueError if depth is less than 3
+        """
+        if depth < 3:
+            raise ValueError("depth must be at least 3, got %d" % depth)
+        self.depth = depth
+        self.similarity = similarity
+        self.max_children = max_children
+        self.templates = []
+        # token count -> nested dicts of token -> node, see _leaf
+        self._root = {}
+
+    def add_vertex(self, vertex):
+        """
+        Assigns the log line to a template, and sets its template_id.
+
+        Args:
+            vertex (vertex.LogLineVertex)
+
+        Returns:
+            Template
+        """
+        template = self.add_tokens(line_tokens(vertex))
+        vertex.template_id = template.template_id
+        return template
+
+    def add_tokens(self, tokens):
+        """
+        Args:
+            tokens (list of str) see line_tokens
+
+        Returns:
+            Template that the tokens were assigned to
+        """
+        templates = self._leaf(tokens)
+        best = None
+        best_key = None
+        for template in templates:
+            key = _similarity(template.tokens, tokens)
+            if best_key is None or key > best_key:
+                (best, best_key) = (template, key)
+        if best is not None and best_key[0] >= self.similarity:
+            _merge(best, tokens)
+            return best
+        template = Template(len(self.templates), tokens)
+        self.templates.append(template)
+        templates.append(template)
+        return template
+
+    def _leaf(self, tokens):
+        # The list of templates tokens is routed to
+        node = self._root.setdefault(len(tokens), {})
+        for token in tokens[:self.depth - 2]:
+            # Tokens with digits are likely variables
+            if _has_digit(token):
+                token = WILDCARD
+            child = node.get(token)
+            if child is None:
+                if len(node) >= self.max_children:
+                    token = WILDCARD
+                    child = node.get(token)
+                if child is None:
+                    child = {}
+                    node[token] = child
+            node = child
+        return node.setdefault(_TEMPLATES, [])
+
+def line_tokens(vertex):
+    """
+    Args:
+        vertex (vertex.LogLineVertex)
+
+    Returns:
+        list of str the tags of the line, and WILDCARD for its ids, in order
+    """
+    message = vertex.message
+    spans = vertex.token_spans()
+    if spans is None:
+        spans = message_spans(message)
+    return [WILDCARD if kind == ID else message[start:end]
+            for (start, end, kind) in spans]
+
+def mine_templates(vertices, miner=None):
+    """
+    Assigns every log line to a template, setting their template_id.
+
+    Args:
+        vertices (iterable of vertex.LogLineVertex)
+        miner (TemplateMiner) to add to. A new one if None.
+
+    Returns:
+        TemplateMiner
+    """
+    if miner is None:
+        miner = TemplateMiner()
+    for vertex in vertices:
+        miner.add_vertex(vertex)
+    return miner
+
+def _has_digit(token):
+    for c in token:
+        if c.isdigit():
+            return True
+    return False
+
+def _similarity(template_tokens, tokens):
+    """
+    Returns:
+        (float, int) the fraction of the positions whose tokens are the
+        same, then the number of non wildcards, which breaks ties
+    """
+    if not tokens:
+        return (1.0, 0)
+    same = 0
+    for (a, b) in zip(template_tokens, tokens):
+        if a == b:
+            same += 1
+    params = len(tokens) - template_tokens.count(WILDCARD)
+    return (float(same) / len(tokens), params)
+
+def _merge(template, tokens):
+    template.count += 1
+    template_tokens = template.tokens
+    for (i, token) in enumerate(tokens):
+        if template_tokens[i] != token:
+            template_tokens[i] = WILDCARD
@@ -1,7 +1,31 @@
+from contextlib import contextmanager
+import os
+import tempfile
+
 def dict_array_equal(d1, d2):
-    # Compares two dicts that have v
-    for k, v in d1.iteritems():
-        d1[k] = sorted(v)
-    for k, v in d2.iteritems():
-        d2[k] = sorted(v)
-    assert d1 == d2
+    # Compares two dicts (or dict-like maps) that have lists as values,
+    # ignoring the order of the lists
+    sorted_d1 = dict((k, sorted(v)) for k, v in d1.iteritems())
+    sorted_d2 = dict((k, sorted(v)) for k, v in d2.iteritems())
+    assert sorted_d1 == sorted_d2
+
+def time_weighting(t1, t2):
+    # Every tag chain edge gets the same weight
+    return 1.0
+
+def log_line(second, message, thread='MyThread9'):
+    # A log line in the default (java) log format, at the given second of
+    # 2012-09-01 03:21
+    return "2012-09-01 03:21:%02d,305 INFO  [%s] %s\n" % (second, thread,
+                                                         message)
+
+@contextmanager
+def temp_log(lines):
+    # The name of a temporary file holding lines, removed afterwards
+    (fd, filename) = tempfile.mkstemp()
+    try:
+        os.write(fd, ''.join(lines))
+        os.close(fd)
+        yield filename
+    finally:
+        os.remove(filename)
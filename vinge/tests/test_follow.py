@@ -0,0 +1,211 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from scipy.sparse.linalg import aslinearoperator
+
+import vinge.graph
+from vinge.context import Context
+from vinge.follow import LogFollower, poll_command
+from vinge.graph import make_graph_from_batches
+from vinge.node_index import NodeIndex
+from vinge.parser import parse_log_file_batches
+from vinge.search import parse_query
+from vinge.semex.ast_to_semex import ast_to_semex
+from vinge.semex.parser import compile_regex
+from vinge.semex.porcelain import make_semex_starting_here
+from helpers import log_line
+
+def distance_weighting(t1, t2):
+    # Unlike helpers.time_weighting, gives the chain edges different
+    # weights, so renormalization after a poll is checked
+    return 1.0 + abs((t2 - t1).total_seconds())
+
+def _edge_set(graph):
+    return sorted((repr(u), repr(v), round(d['weight'], 10), d['edge_type'])
+                  for (u, v, d) in graph.to_networkx().edges_iter(data=True))
+
+class TestFollow:
+    def setup_method(self, method):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'test.log')
+        self._append(log_line(0, "foo urn:x"), log_line(1, "bar foo"))
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.dir)
+
+    def _append(self, *lines):
+        with open(self.filename, 'a') as file:
+            file.write(''.join(lines))
+
+    def _expected_graph(self):
+        batches = parse_log_file_batches(self.filename)
+        return make_graph_from_batches(batches, distance_weighting)
+
+    def test_poll_matches_full_parse(self):
+        follower = LogFollower(self.filename, distance_weighting)
+        graph = follower.start()
+        assert _edge_set(graph) == _edge_set(self._expected_graph())
+
+        self._append(log_line(2, "foo urn:x baz"),
+                     "    at some.stack.Trace(Trace.java:10)\n",
+                     log_line(3, "urn:y bar"))
+        assert follower.poll() == 3
+        assert _edge_set(graph) == _edge_set(self._expected_graph())
+        line_numbers = sorted(v.line_number
+                              for v in follower.builder.nodes.vertices()
+                              if hasattr(v, 'line_number'))
+        assert line_numbers == [0, 1, 2, 4]
+
+    def test_poll_nothing_new(self):
+        follower = LogFollower(self.filename, distance_weighting)
+        follower.start()
+        assert follower.poll() == 0
+
+    def test_poll_waits_for_completelog_line(self):
+        follower = LogFollower(self.filename, distance_weighting)
+        follower.start()
+        line = log_line(2, "foo")
+        self._append(line[:20])
+        assert follower.poll() == 0
+        self._append(line[20:])
+        assert follower.poll() == 1
+        assert len(follower.builder.nodes) == len(self._expected_graph())
+
+    def test_poll_updates_context(self):
+        follower = LogFollower(self.filename, distance_weighting)
+        ctx = Context(follower.start())
+        follower.attach(ctx)
+        semex = ast_to_semex(ctx.nodes, ctx.transition, ctx.transition_op,
+                             compile_regex('(.)* logline'))
+        ctx.add_semex('ll', semex)
+        self._append(log_line(2, "foo urn:x baz"), log_line(3, "qux bar"))
+        follower.poll()
+
+        nodes = follower.builder.nodes
+        assert ctx.graph_number_of_nodes() == len(nodes)
+        last = ctx.node(len(nodes) - 1)
+        assert last.idx() == len(nodes) - 1
+        assert ctx.node(ctx.index().line(3)).message.endswith('qux bar')
+        expected = follower.builder.graph.transition
+        np.testing.assert_allclose(ctx.transition.todense(),
+                                   expected.todense())
+        semex = ctx.semexes()['ll'].semex
+        assert semex.nnodes == len(nodes)
+        assert semex.linop_calculate_values(len(nodes)).shape == (len(nodes),)
+        # Rows are still normalized
+        np.testing.assert_allclose(ctx.transition.sum(axis=1),
+                                   np.ones((len(nodes), 1)))
+
+    def test_poll_adds_to_block(self, monkeypatch):
+        monkeypatch.setattr(vinge.graph, 'BLOCK_MERGE_FRACTION', 10.0)
+        follower = LogFollower(self.filename, distance_weighting)
+        graph = follower.start()
+        ctx = Context(graph)
+        follower.attach(ctx)
+        (index, search_index) = (ctx.index(), ctx.search_index())
+        ctx.add_semex('ll', ctx.compile_semex('(.)* logline'))
+        matrix = graph.matrix
+        self._append(log_line(2, "foo urn:x baz"), log_line(3, "qux foo"))
+        follower.poll()
+        self._append(log_line(4, "bar urn:x"))
+        follower.poll()
+
+        # The matrix isn't copied, and the indexes are extended
+        assert graph.matrix is matrix
+        assert len(graph.block) > 0
+        assert ctx.index() is index
+        assert ctx.search_index() is search_index
+        nodes = follower.builder.nodes
+        assert nodes.vertex(index.line(4)).message.endswith('bar urn:x')
+        fresh = NodeIndex(nodes)
+        assert index.id('urn:x') == fresh.id('urn:x')
+        assert index.count_tag('foo') == fresh.count_tag('foo') == 4
+        hits = search_index.find(parse_query('foo'))
+        assert [nodes.vertex(idx).line_number for idx in hits] == [0, 1, 2, 3]
+
+        # Neighbors come from the matrix and the block
+        (before, after) = ctx.adjacent_lines(ctx.node(index.line(4)))
+        assert (before.line_number, after) == (3, None)
+        (before, after) = ctx.adjacent_lines(ctx.node(index.line(1)))
+        assert (before.line_number, after.line_number) == (0, 2)
+
+        # The stale semex is compiled again, and walked, without merging
+        # the block
+        n = len(nodes)
+        start = ctx.node(index.line(1))
+        semex = ctx.semexes()['ll'].semex
+        assert semex.nnodes == n
+        (transition, transition_op) = ctx.walk()
+        values = make_semex_starting_here(transition, transition_op, nodes, n,
+                                          semex, start) \
+            .linop_calculate_values(n)
+        assert ctx.layers._walks == {}
+
+        # The operator walks the block without merging it
+        transition_op = ctx.transition_op
+        x = np.arange(n, dtype=float)
+        expected = graph.transition
+        assert graph.block is None
+        np.testing.assert_allclose(transition_op.matvec(x), expected.dot(x))
+        np.testing.assert_allclose(transition_op.rmatvec(x),
+                                   expected.T.dot(x))
+        np.testing.assert_allclose(ctx.transition.todense(),
+                                   expected.todense())
+        merged = ast_to_semex(nodes, expected, aslinearoperator(expected),
+                              compile_regex('(.)* logline'))
+        np.testing.assert_allclose(
+            values, make_semex_starting_here(expected,
+                                             aslinearoperator(expected),
+                                             nodes, n, merged, start)
+            .linop_calculate_values(n))
+
+    def test_truncated_log(self):
+        follower = LogFollower(self.filename, distance_weighting)
+        follower.start()
+        with open(self.filename, 'w') as file:
+            file.write(log_line(0, "foo"))
+        try:
+            follower.poll()
+            assert False
+        except IOError:
+            pass
+
+    def _poll_command(self, follower):
+        messages = {'info' : [], 'error' : []}
+        command = poll_command(follower, messages['info'].append,
+                               messages['error'].append)
+        return (command, messages)
+
+    def test_poll_command(self):
+        follower = LogFollower(self.filename, distance_weighting)
+        follower.start()
+        (command, messages) = self._poll_command(follower)
+        command()
+        self._append(log_line(2, "foo"))
+        command()
+        assert messages == {'info' : ['1 new log lines'], 'error' : []}
+
+    def test_poll_command_stops_on_truncated_log(self):
+        follower = LogFollower(self.filename, distance_weighting)
+        follower.start()
+        (command, messages) = self._poll_command(follower)
+        with open(self.filename, 'w') as file:
+            file.write(log_line(0, "foo"))
+        command()
+        assert len(messages['error']) == 1
+        assert 'truncated' in messages['error'][0]
+        # Lines appended afterwards are no longer picked up
+        self._append(log_line(1, "bar"), log_line(2, "baz"), log_line(3, "qux"))
+        command()
+        assert len(messages['error']) == 1
+        assert messages['info'] == []
+
+    def test_poll_command_stops_on_deleted_log(self):
+        follower = LogFollower(self.filename, distance_weighting)
+        follower.start()
+        (command, messages) = self._poll_command(follower)
+        os.remove(self.filename)
+        command()
+        assert len(messages['error']) == 1
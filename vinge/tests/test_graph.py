@@ -1,10 +1,15 @@
 from datetime import datetime
 
-from vinge.graph import EdgeType, make_graph
-from vinge.vertex import LogLineVertex, TagVertex, UniqueIDVertex
+import numpy as np
+from scipy import sparse
 
-def time_weighting(t1, t2):
-    return 1.0
+from vinge.graph import EdgeType, make_graph, make_graph_from_batches
+from vinge.graph import TransitionLayers, normalize_rows, parse_edge_types
+from vinge.parser import parse_log, parse_log_batches
+from vinge.vertex import BaseLogLineVertex, LogLineVertex, TagVertex
+from vinge.vertex import UniqueIDVertex
+from vinge.weighting import exponential_decay
+from helpers import time_weighting
 
 def assert_lists_equal(list1, list2):
     assert sorted(list1) == sorted(list2)
@@ -14,12 +19,12 @@ def edge(v1, v2, weight=1.0, edge_type=None):
     # if edge_type is set to None
     if edge_type is None:
         # Data to Meta
-        if isinstance(v1, LogLineVertex):
+        if isinstance(v1, BaseLogLineVertex):
             if isinstance(v2, TagVertex) or isinstance(v2, UniqueIDVertex):
                 edge_type = EdgeType.DATA_TO_META
         # Meta to Data
         elif ((isinstance(v1, TagVertex) or isinstance(v1, UniqueIDVertex))
-              and isinstance(v2, LogLineVertex)):
+              and isinstance(v2, BaseLogLineVertex)):
             edge_type = EdgeType.META_TO_DATA
         # Tag to tag (meta to meta)
         elif isinstance(v1, TagVertex) and isinstance(v2, TagVertex):
@@ -41,7 +46,8 @@ class TestGraph:
         id_map = {}
 
         # Make graph and check its structure
-        graph = make_graph([vertex], tag_map, id_map, time_weighting)
+        graph = make_graph([vertex], tag_map, id_map,
+                           time_weighting).to_networkx()
         tag_vertex = TagVertex('foo',  dt1)
         assert len(graph.nodes()) == 2
         assert_lists_equal(graph.nodes(), [vertex, tag_vertex])
@@ -60,7 +66,8 @@ class TestGraph:
         id_map = {}
 
         # Make graph and check its structure
-        graph = make_graph([vertex1, vertex2], tag_map, id_map, time_weighting)
+        graph = make_graph([vertex1, vertex2], tag_map, id_map,
+                           time_weighting).to_networkx()
         tag_vertex1 = TagVertex('foo', dt1)
         tag_vertex2 = TagVertex('foo', dt2)
         assert len(graph.nodes()) == 4
@@ -89,7 +96,8 @@ class TestGraph:
         id_map = {'urn:9' : [vertex1, vertex2]}
 
         # Make graph and check its structure
-        graph = make_graph([vertex1, vertex2], tag_map, id_map, time_weighting)
+        graph = make_graph([vertex1, vertex2], tag_map, id_map,
+                           time_weighting).to_networkx()
         id_vertex = UniqueIDVertex('urn:9')
         assert len(graph.nodes()) == 3
         assert_lists_equal(graph.nodes(), [vertex1, vertex2, id_vertex])
@@ -105,3 +113,111 @@ class TestGraph:
                             edge(vertex1, vertex2, 0.5, EdgeType.ADJACENT_NEXT),
                             edge(vertex2, vertex1, 0.5, EdgeType.ADJACENT_PREV)
                             ])
+
+    def test_graph_from_batches_matches_graph(self):
+        lines = ["2012-09-01 03:21:20,305 INFO  [MyThread9] foo urn:9\n",
+                 "2012-09-01 03:22:20,305 INFO  [MyThread10] foo bar\n",
+                 "2012-09-01 03:23:20,305 INFO  [MyThread9] bar urn:9\n",
+                 "2012-09-01 03:24:20,305 INFO  [MyThread9] foo\n"]
+        graph = make_graph(*parse_log(lines),
+                           time_weighting=time_weighting).to_networkx()
+        for batch_size in [1, 2, 3, 10]:
+            batches = parse_log_batches(lines, batch_size)
+            streamed = make_graph_from_batches(batches,
+                                               time_weighting).to_networkx()
+            assert_lists_equal(streamed.nodes(), graph.nodes())
+            assert_lists_equal(streamed.edges(data=True),
+                               graph.edges(data=True))
+
+    def test_tag_buckets(self):
+        lines = ["2012-09-01 03:21:00,000 INFO  [MyThread9] foo\n",
+                 "2012-09-01 03:21:10,000 INFO  [MyThread9] foo bar\n",
+                 "2012-09-01 03:22:10,000 INFO  [MyThread9] foo\n",
+                 "2012-09-01 03:22:20,000 INFO  [MyThread9] foo\n"]
+        graph = make_graph(*parse_log(lines), time_weighting=time_weighting,
+                           tag_bucket_millis=60000)
+        exported = graph.to_networkx()
+        tags = sorted(v for v in exported if isinstance(v, TagVertex))
+        # One vertex per minute for foo, one for bar
+        assert [(v.word, v.millis % 60000) for v in tags] == \
+            [('bar', 0), ('foo', 0), ('foo', 0)]
+        foo1 = [v for v in tags if v.word == 'foo'][0]
+        lines_of_foo1 = [v.line_number for v in exported.successors(foo1)
+                         if isinstance(v, BaseLogLineVertex)]
+        assert sorted(lines_of_foo1) == [0, 1]
+        full = make_graph(*parse_log(lines), time_weighting=time_weighting)
+        assert graph.number_of_nodes() == full.number_of_nodes() - 2
+        assert graph.number_of_edges() < full.number_of_edges()
+        # Batches that split a bucket join its vertex
+        for batch_size in [1, 3]:
+            streamed = make_graph_from_batches(
+                parse_log_batches(lines, batch_size), time_weighting,
+                tag_bucket_millis=60000).to_networkx()
+            assert_lists_equal(streamed.nodes(), exported.nodes())
+            assert_lists_equal(streamed.edges(data=True),
+                               exported.edges(data=True))
+
+    def test_vectorized_time_weighting(self):
+        lines = ["2012-09-01 03:21:20,305 INFO  [MyThread9] foo urn:9\n",
+                 "2012-09-01 03:22:20,305 INFO  [MyThread10] foo bar\n",
+                 "2012-09-01 03:24:20,305 INFO  [MyThread9] foo\n"]
+        def scalar_weighting(t1, t2):
+            return np.exp(0.01 * -abs(t2 - t1).total_seconds())
+        graph = make_graph(*parse_log(lines), time_weighting=scalar_weighting)
+        vectorized = make_graph(*parse_log(lines),
+                                time_weighting=exponential_decay(0.01))
+        np.testing.assert_allclose(vectorized.transition.todense(),
+                                   graph.transition.todense())
+
+    def test_normalize_rows(self):
+        dense = np.array([[1.0, 3.0, 0.0],
+                          [0.0, 0.0, 0.0],
+                          [2.0, 2.0, 4.0]])
+        matrix = sparse.csr_matrix(dense)
+        totals = normalize_rows(matrix, np.array([0, 1]))
+        np.testing.assert_allclose(totals, [4.0, 0.0])
+        # Row 2 wasn't asked for, so it is left alone
+        np.testing.assert_allclose(matrix.todense(),
+                                   [[0.25, 0.75, 0.0],
+                                    [0.0, 0.0, 0.0],
+                                    [2.0, 2.0, 4.0]])
+        np.testing.assert_allclose(normalize_rows(matrix), [1.0, 0.0, 8.0])
+        np.testing.assert_allclose(matrix.todense()[2], [[0.25, 0.25, 0.5]])
+
+    def test_transition_layers(self):
+        lines = ["2012-09-01 03:21:20,305 INFO  [MyThread9] foo urn:9\n",
+                 "2012-09-01 03:22:20,305 INFO  [MyThread10] foo bar\n",
+                 "2012-09-01 03:23:20,305 INFO  [MyThread9] bar urn:9\n"]
+        (log_lines, tag_map, id_map) = parse_log(lines)
+        graph = make_graph(log_lines, tag_map, id_map, time_weighting)
+        layers = TransitionLayers(graph.transition, graph.edge_types)
+        all_types = [EdgeType.ADJACENT_PREV, EdgeType.ADJACENT_NEXT,
+                     EdgeType.DATA_TO_META, EdgeType.META_TO_DATA,
+                     EdgeType.META_TO_META]
+        total = sum(layers.layer(t) for t in all_types)
+        np.testing.assert_allclose(total.todense(),
+                                   graph.transition.todense())
+        np.testing.assert_allclose(layers.transition(all_types).todense(),
+                                   graph.transition.todense())
+        middle = log_lines[1].idx()
+        assert layers.neighbors(EdgeType.ADJACENT_PREV, middle).tolist() == \
+            [log_lines[0].idx()]
+        assert layers.neighbors(EdgeType.ADJACENT_NEXT, middle).tolist() == \
+            [log_lines[2].idx()]
+        # Without the adjacent edges there are no line to line steps
+        walk = layers.transition(parse_edge_types(
+                'data_to_meta,meta_to_data,meta_to_meta')).todense()
+        rows = [ll.idx() for ll in log_lines]
+        assert not walk[rows][:, rows].any()
+        assert (walk.sum(axis=1) <= 1.0 + 1e-9).all()
+
+    def test_parse_edge_types(self):
+        assert parse_edge_types('adjacent') == \
+            (EdgeType.ADJACENT_PREV, EdgeType.ADJACENT_NEXT)
+        assert parse_edge_types('meta-to-data,data_to_meta') == \
+            (EdgeType.DATA_TO_META, EdgeType.META_TO_DATA)
+        try:
+            parse_edge_types('sideways')
+            assert False
+        except ValueError:
+            pass
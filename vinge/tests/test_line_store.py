@@ -0,0 +1,34 @@
+from vinge.line_store import *
+from helpers import temp_log
+
+class TestMappedLineStore:
+    def test_iter_lines(self):
+        with temp_log(["foo\n", "bar baz\n", "last"]) as filename:
+            store = MappedLineStore(filename)
+            assert list(store.iter_lines()) == [(0, "foo\n"), (4, "bar baz\n"),
+                                                (12, "last")]
+            assert store.text(4, 3) == "bar"
+
+class TestBlockCompressedLineStore:
+    def test_text_round_trip(self):
+        store = BlockCompressedLineStore(block_size=64, cached_blocks=2)
+        lines = ["line %d says foo bar baz" % i for i in range(100)]
+        offsets = [store.append(line) for line in lines]
+        # Some lines are still pending, the rest are in blocks
+        assert 0 < len(store._pending) < 64
+        for (offset, line) in zip(offsets, lines):
+            assert store.text(offset, len(line)) == line
+        store.flush()
+        assert len(store._pending) == 0
+        # Read backwards so the LRU keeps missing
+        for (offset, line) in reversed(zip(offsets, lines)):
+            assert store.text(offset, len(line)) == line
+        assert len(store._cache) == 2
+        assert len(store) == sum(map(len, lines))
+        assert store.compressed_size() < len(store)
+
+    def test_text_across_blocks(self):
+        store = BlockCompressedLineStore(block_size=4)
+        for chunk in ["abcd", "efgh", "ij"]:
+            store.append(chunk)
+        assert store.text(2, 8) == "cdefghij"
@@ -0,0 +1,106 @@
+from datetime import datetime
+
+from vinge.log_format import *
+from vinge.timestamps import datetime_to_millis
+
+def _millis(*args):
+    return datetime_to_millis(datetime(*args))
+
+class TestLogFormat:
+    def test_java(self):
+        line = "2012-09-01 03:21:20,305 INFO  [MyThread9] c.g.o.a.Foo : ok"
+        assert get_format('java').parse(line) == \
+            (_millis(2012, 9, 1, 3, 21, 20, 305000), 'MyThread9',
+             ' c.g.o.a.Foo : ok')
+
+    def test_java_rejects_stack_trace(self):
+        java = get_format('java')
+        line = "    at c.g.o.a.Foo.bar(Foo.java:12)"
+        assert not java.accepts(line)
+        assert java.parse(line) is None
+
+    def test_java_rejects_bad_date(self):
+        java = get_format('java')
+        line = "2013-02-30 10:00:00,123 DEBUG [main] x"
+        assert java.parse(line) is None
+        assert java.peek(line) is None
+        assert detect_format([line]) is None
+
+    def test_java_peek(self):
+        java = get_format('java')
+        line = "2012-09-01 03:21:20,305 INFO  [MyThread9] c.g.o.a.Foo : ok"
+        assert java.peek(line) == java.parse(line)[:2]
+        assert java.peek("    at c.g.o.a.Foo.bar(Foo.java:12)") is None
+
+    def test_default_peek(self):
+        syslog = SyslogFormat(year=2012)
+        line = "Sep  1 03:21:20 myhost myprogram[4242]: my message ok"
+        assert syslog.peek(line) == syslog.parse(line)[:2]
+        assert syslog.peek("hello") is None
+
+    def test_syslog(self):
+        syslog = SyslogFormat(year=2012)
+        line = "Sep  1 03:21:20 myhost myprogram[4242]: my message ok"
+        assert syslog.parse(line) == \
+            (_millis(2012, 9, 1, 3, 21, 20), 'myprogram[4242]',
+             ' my message ok')
+        line = "Sep 12 03:21:21 myhost kernel: oops"
+        assert syslog.parse(line) == \
+            (_millis(2012, 9, 12, 3, 21, 21), 'kernel', ' oops')
+
+    def test_syslog_rejects_bad_date(self):
+        line = "Feb 30 03:21:20 myhost kernel: oops"
+        assert SyslogFormat(year=2013).parse(line) is None
+
+    def test_syslog_rejects_java(self):
+        line = "2012-09-01 03:21:20,305 INFO  [MyThread9] c.g.o.a.Foo : ok"
+        assert get_format('syslog').parse(line) is None
+
+    def test_json(self):
+        json_format = get_format('json')
+        line = '{"time": "2012-09-01T03:21:20.305Z", "thread": "T9", ' \
+            '"message": "hello there"}'
+        assert json_format.parse(line) == \
+            (_millis(2012, 9, 1, 3, 21, 20, 305000), 'T9', 'hello there')
+        line = '{"ts": 1346469680.305, "msg": "hi"}'
+        assert json_format.parse(line) == \
+            (_millis(2012, 9, 1, 3, 21, 20, 305000), '', 'hi')
+
+    def test_json_utc_offset(self):
+        line = '{"time": "2012-09-01T05:21:20+02:00", "message": "hi"}'
+        assert get_format('json').parse(line)[0] == \
+            _millis(2012, 9, 1, 3, 21, 20)
+
+    def test_json_rejects_missing_message(self):
+        json_format = get_format('json')
+        assert json_format.parse('{"time": "2012-09-01T05:21:20"}') is None
+        assert json_format.parse('{not json}') is None
+
+    def test_json_rejects_bad_time(self):
+        json_format = get_format('json')
+        for time in ['{"a": 1}', '[1]', 'true', 'NaN', 'Infinity',
+                     '"2013-02-30T10:00:00"']:
+            line = '{"time": %s, "message": "hi"}' % time
+            assert json_format.parse(line) is None
+
+    def test_detect_format(self):
+        java = ["2012-09-01 03:21:20,305 INFO  [MyThread9] foo\n",
+                "    at c.g.o.a.Foo.bar(Foo.java:12)\n"]
+        syslog = ["Sep  1 03:21:20 myhost myprogram[4242]: foo\n"]
+        json_lines = ['{"time": "2012-09-01T03:21:20Z", "message": "foo"}\n']
+        assert detect_format(java).name == 'java'
+        assert detect_format(syslog * 2 + java).name == 'syslog'
+        assert detect_format(json_lines).name == 'json'
+        assert detect_format(["hello\n"]) is None
+
+    def test_detect_format_only_samples(self):
+        lines = ["hello\n"] * 3 + \
+            ["2012-09-01 03:21:20,305 INFO  [MyThread9] foo\n"]
+        assert detect_format(lines, sample_size=3) is None
+
+    def test_get_unknown_format(self):
+        try:
+            get_format('nope')
+            assert False
+        except ValueError:
+            pass
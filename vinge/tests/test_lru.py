@@ -0,0 +1,36 @@
+from vinge.lru import LRUCache
+
+class TestLRUCache:
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        # Reading a makes b the least recently used
+        assert cache.get('a') == 1
+        cache.put('c', 3)
+        assert 'b' not in cache
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        assert len(cache) == 2
+
+    def test_keys_and_discard(self):
+        cache = LRUCache(3)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        assert cache.keys() == ['b', 'a']
+        cache.discard('b')
+        cache.discard('c')
+        assert cache.keys() == ['a']
+
+    def test_get_default(self):
+        cache = LRUCache(1)
+        assert cache.get('a') is None
+        assert cache.get('a', 7) == 7
+
+    def test_bad_capacity(self):
+        try:
+            LRUCache(0)
+            assert False
+        except ValueError:
+            pass
@@ -0,0 +1,108 @@
+from vinge.context import Context
+from vinge.graph import GraphBuilder, make_graph
+from vinge.node_index import *
+from vinge.node_table import NodeTable
+from vinge.parser import parse_log
+from vinge.timestamps import parse_time
+from vinge.vertex import NodeKind
+from helpers import log_line, time_weighting
+
+# Lines 2 and 3 are out of time order
+_LINES = [log_line(second, "foo%d urn:%d" % (i % 2, i % 3))
+          for (i, second) in enumerate([20, 21, 25, 23, 30])]
+
+def _index():
+    (log_lines, tag_map, id_map) = parse_log(_LINES)
+    ctx = Context(make_graph(log_lines, tag_map, id_map, time_weighting))
+    return (ctx, log_lines)
+
+class TestNodeIndex:
+    def test_line(self):
+        (ctx, log_lines) = _index()
+        index = ctx.index()
+        for v in log_lines:
+            assert index.line(v.line_number) == v.idx()
+        assert index.line(5) is None
+        assert index.line(-1) is None
+
+    def test_line_of_source(self):
+        (log_lines, tag_map, id_map) = parse_log(_LINES + _LINES)
+        for (i, v) in enumerate(log_lines):
+            v.line_number = i % 5
+            v.source = 'a.log' if i < 5 else 'b.log'
+        ctx = Context(make_graph(log_lines, tag_map, id_map, time_weighting))
+        index = ctx.index()
+        assert index.line(2) == log_lines[2].idx()
+        assert index.line(2, 'a.log') == log_lines[2].idx()
+        assert index.line(2, 'b.log') == log_lines[7].idx()
+        assert index.line(2, 'c.log') is None
+
+    def test_time(self):
+        (ctx, log_lines) = _index()
+        index = ctx.index()
+        at = lambda string: index.time(parse_time(string, log_lines[0].millis))
+        assert at('03:21:20.305') == log_lines[0].idx()
+        assert at('03:21:21') == log_lines[1].idx()
+        assert at('03:21:22') == log_lines[3].idx()
+        assert at('03:21:24') == log_lines[2].idx()
+        assert at('00:00') == log_lines[0].idx()
+        # After the end is the last line
+        assert at('23:00') == log_lines[4].idx()
+        assert index.first_millis() == log_lines[0].millis
+
+    def test_tag(self):
+        (ctx, log_lines) = _index()
+        index = ctx.index()
+        assert index.count_tag('foo0') == 3
+        first = ctx.node(index.tag('foo0'))
+        assert first.kind == NodeKind.NodeKindTagVertex
+        assert (first.word, first.millis) == ('foo0', log_lines[0].millis)
+        # Lines 0, 2 and 4 have foo0, the next one at or after line 3 is 2
+        nxt = ctx.node(index.tag('foo0', log_lines[3].millis))
+        assert nxt.millis == log_lines[2].millis
+        # Wraps around
+        assert index.tag('foo0', log_lines[4].millis + 1) == index.tag('foo0')
+        assert index.tag('nope') is None
+        assert index.tag('urn:1') is None
+        assert index.count_tag('nope') == 0
+
+    def test_id(self):
+        (ctx, log_lines) = _index()
+        index = ctx.index()
+        v = ctx.node(index.id('urn:1'))
+        assert v.kind == NodeKind.NodeKindUniqueIDVertex
+        assert v.id == 'urn:1'
+        assert index.id('urn:9') is None
+        assert index.id('foo0') is None
+
+    def test_extend(self):
+        builder = GraphBuilder(time_weighting)
+        (log_lines, tag_map, id_map) = parse_log(_LINES[:4])
+        builder.add_lines(log_lines, tag_map, id_map)
+        index = NodeIndex(builder.nodes)
+        (more, tag_map, id_map) = parse_log(_LINES[4:])
+        for v in more:
+            v.line_number += 4
+        builder.add_lines(more, tag_map, id_map)
+        index.extend()
+        fresh = NodeIndex(builder.nodes)
+        for line_number in range(6):
+            assert index.line(line_number) == fresh.line(line_number)
+        for second in range(18, 33):
+            millis = log_lines[0].millis + (second - 20) * 1000
+            assert index.time(millis) == fresh.time(millis)
+            assert index.tag('foo0', millis) == fresh.tag('foo0', millis)
+        assert index.count_tag('foo0') == fresh.count_tag('foo0') == 3
+        assert index.id('urn:1') == fresh.id('urn:1')
+        assert index.first_millis() == fresh.first_millis()
+        # A part is as big as its rows, not as the whole dictionary
+        for part in index._parts:
+            size = part.stop - part.start
+            assert len(part._tag_tokens) + len(part._id_tokens) <= size
+
+    def test_empty(self):
+        index = NodeIndex(NodeTable())
+        assert index.line(0) is None
+        assert index.time(0) is None
+        assert index.first_millis() is None
+        assert index.tag('foo0') is None
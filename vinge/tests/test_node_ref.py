@@ -22,6 +22,14 @@ class TestNodeRef:
         node_ref = parse_node_ref("cur.nbrs[9]")
         assert node_ref == NodeRef(NodeRefType.NEIGHBOR, neighbor_index=9)
 
+    def test_hits(self):
+        node_ref = parse_node_ref("hits[12]")
+        assert node_ref == NodeRef(NodeRefType.HIT, hit_index=12)
+
+    def test_fail_hits_with_no_integer(self):
+        node_ref = parse_node_ref("hits[]")
+        assert node_ref == None
+
     def test_fail_cur_neighbors_no_period(self):
         node_ref = parse_node_ref("curneighbors[0]")
         assert node_ref == None
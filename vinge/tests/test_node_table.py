@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from vinge.context import Context
+from vinge.filters import id, logline, number_of_es, tag
+from vinge.graph import make_graph
+from vinge.node_table import *
+from vinge.parser import parse_log, parse_log_file_mapped
+from vinge.vertex import LogLineVertex, NodeKind, StoredLogLineVertex
+from vinge.vertex import TemplateVertex
+from helpers import log_line, time_weighting
+
+_LINES = [log_line(20 + i, "foo%d urn:%d" % (i % 2, i % 3),
+                   "MyThread%d" % (i % 2))
+          for i in xrange(5)]
+
+def _nodes(graph):
+    return graph.nodes.vertices()
+
+def assert_same_vertex(view, v):
+    assert view.kind == v.kind
+    assert view.idx() == v.idx()
+    assert repr(view) == repr(v)
+    if v.kind == NodeKind.NodeKindLogLineVertex:
+        assert view.message == v.message
+        assert view.source == v.source
+        assert view.sample_weight == v.sample_weight
+        assert view.token_spans() == v.token_spans()
+
+class TestNodeTable:
+    def test_views_match_vertices(self):
+        (log_lines, tag_map, id_map) = parse_log(_LINES)
+        log_lines[2].source = 'b.log'
+        log_lines[3].sample_weight = 2.5
+        nodes = _nodes(make_graph(log_lines, tag_map, id_map,
+                                  time_weighting))
+        table = NodeTable.from_vertices(nodes)
+        assert len(table) == table.number_of_nodes() == len(nodes)
+        for v in nodes:
+            assert_same_vertex(table.vertex(v.idx()), v)
+        assert table.kinds.dtype == np.int8
+        assert table.line_numbers[:5].tolist() == range(5)
+        assert (table.line_numbers[5:] == -1).all()
+        # Tag words and ids are shared with all their vertices
+        assert len(table.dictionary) == 5
+
+    def test_views_are_cached(self):
+        (log_lines, tag_map, id_map) = parse_log(_LINES)
+        nodes = _nodes(make_graph(log_lines, tag_map, id_map,
+                                  time_weighting))
+        table = NodeTable.from_vertices(nodes)
+        assert table.vertex(0) is table.vertex(np.int64(0))
+        assert table.vertex(0) is not nodes[0]
+
+    def test_template_text_change_drops_views(self):
+        v = TemplateVertex(3, 'connected to host7', 1000)
+        v._set_idx(0)
+        table = NodeTable.from_vertices([v])
+        view = table.vertex(0)
+        table.renders.put(0, 'rendered')
+        table.set_template_text(3, 'connected to host7')
+        assert table.vertex(0) is view
+        assert table.renders.get(0) == 'rendered'
+        table.set_template_text(3, 'connected to <*>')
+        assert table.vertex(0).text == 'connected to <*>'
+        assert 0 not in table.renders
+
+    def test_message_not_tail_of_line(self):
+        v = LogLineVertex('{"msg": "hi there"}', 'hi there', 7, 't', 1000)
+        v._set_idx(0)
+        table = NodeTable.from_vertices([v])
+        view = table.vertex(0)
+        assert (view.line, view.message) == (v.line, v.message)
+        assert view.millis == 1000
+
+    def test_stored_lines_stay_in_their_store(self):
+        dir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(dir, 'log')
+            with open(filename, 'w') as file:
+                file.writelines(_LINES)
+            (log_lines, tag_map, id_map) = parse_log_file_mapped(filename)
+            nodes = _nodes(make_graph(log_lines, tag_map, id_map,
+                                      time_weighting))
+            table = NodeTable.from_vertices(nodes)
+            assert table.stores.values == [log_lines[0].store]
+            view = table.vertex(1)
+            assert isinstance(view, StoredLogLineVertex)
+            assert view.line == log_lines[1].line
+            assert view.message == log_lines[1].message
+        finally:
+            shutil.rmtree(dir)
+
+    def test_extend(self):
+        (log_lines, tag_map, id_map) = parse_log(_LINES)
+        nodes = _nodes(make_graph(log_lines, tag_map, id_map,
+                                  time_weighting))
+        table = NodeTable.from_vertices(nodes[:3])
+        table.extend(nodes[3:4])
+        table.extend(nodes[4:])
+        assert len(table) == len(nodes)
+        assert len(table.kinds) == len(nodes)
+        for v in nodes:
+            assert_same_vertex(table.vertex(v.idx()), v)
+
+    def test_extend_out_of_order(self):
+        (log_lines, _, _) = parse_log(_LINES)
+        for (i, v) in enumerate(log_lines):
+            v._set_idx(i)
+        try:
+            NodeTable.from_vertices(log_lines[1:])
+            assert False
+        except ValueError:
+            pass
+
+    def test_vertex_out_of_range(self):
+        table = NodeTable()
+        try:
+            table.vertex(0)
+            assert False
+        except IndexError:
+            pass
+
+    def test_sensor_vector(self):
+        (log_lines, tag_map, id_map) = parse_log(_LINES)
+        nodes = _nodes(make_graph(log_lines, tag_map, id_map,
+                                  time_weighting))
+        table = NodeTable.from_vertices(nodes)
+        for sensor in [id, logline, tag, number_of_es]:
+            expected = [sensor(v) for v in nodes]
+            assert table.sensor_vector(sensor).tolist() == expected
+
+class TestContext:
+    def test_neighbors(self):
+        (log_lines, tag_map, id_map) = parse_log(_LINES)
+        graph = make_graph(log_lines, tag_map, id_map, time_weighting)
+        ctx = Context(graph)
+        assert ctx.graph_number_of_nodes() == graph.number_of_nodes()
+        line = log_lines[2]
+        exported = graph.to_networkx()
+        by_idx = dict((v.idx(), v) for v in exported)
+        assert ctx.sorted_neighbors(ctx.node(line.idx())) == \
+            sorted(exported[by_idx[line.idx()]])
+        assert ctx.adjacent_lines(ctx.node(line.idx())) == \
+            (log_lines[1], log_lines[3])
+        assert ctx.adjacent_lines(ctx.node(log_lines[0].idx())) == \
+            (None, log_lines[1])
+        tag_vertex = ctx.node(len(graph) - 1)
+        assert tag_vertex.kind == NodeKind.NodeKindTagVertex
+        assert ctx.adjacent_lines(tag_vertex) == (None, None)
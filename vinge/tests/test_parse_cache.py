@@ -0,0 +1,143 @@
+import os
+import shutil
+import tempfile
+import warnings
+import zipfile
+
+import vinge.parse_cache
+from vinge.parse_cache import *
+from vinge.parser import parse_log_file
+
+from test_parser import _assert_parses_equal
+
+_LINES = ["2012-09-01 03:21:20,305 INFO  [MyThread9] foo urn:x\n",
+          "    at some.stack.Trace(Trace.java:10)\n",
+          "2012-09-01 03:21:21,305 INFO  [MyThread8] bar foo\n",
+          "2012-09-01 03:21:22,305 INFO  [MyThread9] bar urn:x\n"]
+
+class TestParseCache:
+    def setup_method(self, method):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'test.log')
+        with open(self.filename, 'w') as file:
+            file.write(''.join(_LINES))
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.dir)
+
+    def _parse_must_not_run(self, monkeypatch):
+        def fail(*args):
+            assert False, 'parsed instead of using the cache'
+        monkeypatch.setattr(vinge.parse_cache, 'parse_log_file_mapped', fail)
+
+    def test_cache_next_to_log(self):
+        assert cache_path(self.filename) == self.filename + CACHE_SUFFIX
+        other = cache_path(self.filename, self.dir)
+        assert os.path.dirname(other) == self.dir
+        assert other != cache_path(self.filename)
+
+    def test_cache_round_trip(self, monkeypatch):
+        expected = parse_log_file(self.filename)
+        first = parse_log_file_cached(self.filename)
+        assert os.path.exists(cache_path(self.filename))
+        _assert_parses_equal(first, expected)
+
+        self._parse_must_not_run(monkeypatch)
+        second = parse_log_file_cached(self.filename)
+        _assert_parses_equal(second, expected)
+        for (v, expected_v) in zip(second[0], expected[0]):
+            assert v.message == expected_v.message
+            assert v.thread_id == expected_v.thread_id
+            assert v.millis == expected_v.millis
+
+    def test_cache_round_trip_json(self):
+        lines = ['{"time": "2012-09-01T03:21:20Z", "message": "foo urn:x"}\n',
+                 '{"time": "2012-09-01T03:21:21Z", "message": "foo bar"}\n']
+        with open(self.filename, 'w') as file:
+            file.write(''.join(lines))
+        expected = parse_log_file(self.filename)
+        parse_log_file_cached(self.filename)
+        cached = parse_log_file_cached(self.filename)
+        _assert_parses_equal(cached, expected)
+        assert [v.message for v in cached[0]] == ['foo urn:x', 'foo bar']
+
+    def test_cache_in_cache_dir(self, monkeypatch):
+        cache_dir = os.path.join(self.dir, 'cache')
+        os.mkdir(cache_dir)
+        parse_log_file_cached(self.filename, cache_dir)
+        assert os.listdir(cache_dir) == \
+            [os.path.basename(cache_path(self.filename, cache_dir))]
+        self._parse_must_not_run(monkeypatch)
+        parse_log_file_cached(self.filename, cache_dir)
+
+    def test_cache_dir_is_made(self):
+        cache_dir = os.path.join(self.dir, 'not', 'yet')
+        parse_log_file_cached(self.filename, cache_dir)
+        assert os.path.exists(cache_path(self.filename, cache_dir))
+
+    def test_cache_write_failure_is_not_fatal(self, monkeypatch):
+        def fail(*args):
+            raise OSError(13, 'Permission denied')
+        monkeypatch.setattr(vinge.parse_cache, 'save_cache', fail)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            parse = parse_log_file_cached(self.filename)
+        assert len(caught) == 1
+        _assert_parses_equal(parse, parse_log_file(self.filename))
+
+    def test_cache_invalidated_by_append(self):
+        parse_log_file_cached(self.filename)
+        with open(self.filename, 'a') as file:
+            file.write("2012-09-01 03:21:23,305 INFO  [MyThread9] baz\n")
+        (vertices, tag_map, id_map) = parse_log_file_cached(self.filename)
+        assert len(vertices) == 4
+        assert 'baz' in tag_map
+
+    def test_cache_invalidated_by_rewrite(self):
+        parse_log_file_cached(self.filename)
+        stat = os.stat(self.filename)
+        # Same size and mtime, different contents
+        with open(self.filename, 'w') as file:
+            file.write(''.join(_LINES).replace('foo', 'qux'))
+        os.utime(self.filename, (stat.st_atime, stat.st_mtime))
+        (vertices, tag_map, id_map) = parse_log_file_cached(self.filename)
+        assert 'qux' in tag_map
+        assert 'foo' not in tag_map
+
+    def test_cache_invalidated_by_format(self):
+        parse_log_file_cached(self.filename, log_format='java')
+        (vertices, _, _) = parse_log_file_cached(self.filename,
+                                                 log_format='syslog')
+        assert vertices == []
+
+    def test_corrupt_cache_is_ignored(self):
+        with open(cache_path(self.filename), 'w') as file:
+            file.write('garbage')
+        (vertices, _, _) = parse_log_file_cached(self.filename)
+        assert len(vertices) == 3
+
+    def _rewrite_cache(self, change):
+        # Writes the cache again with change(name, bytes) -> bytes (or None
+        # to leave the member out) applied to every member
+        path = cache_path(self.filename)
+        with zipfile.ZipFile(path) as old:
+            members = [(name, old.read(name)) for name in old.namelist()]
+        with zipfile.ZipFile(path, 'w') as new:
+            for (name, member) in members:
+                member = change(name, member)
+                if member is not None:
+                    new.writestr(name, member)
+
+    def test_cache_missing_array_is_ignored(self):
+        parse_log_file_cached(self.filename)
+        self._rewrite_cache(lambda name, member:
+                            None if name == 'token_blob.npy' else member)
+        (vertices, _, _) = parse_log_file_cached(self.filename)
+        assert len(vertices) == 3
+
+    def test_cache_corrupt_array_is_ignored(self):
+        parse_log_file_cached(self.filename)
+        self._rewrite_cache(lambda name, member:
+                            member[:-8] if name == 'offsets.npy' else member)
+        (vertices, _, _) = parse_log_file_cached(self.filename)
+        assert len(vertices) == 3
@@ -1,10 +1,13 @@
 import vinge
-from vinge.vertex import LogLineVertex
+from vinge.vertex import LogLineVertex, StoredLogLineVertex
 from vinge.parser import *
 
 from helpers import *
 
 from datetime import datetime
+import gzip
+import os
+import tempfile
 
 class TestParser:
 
@@ -100,3 +103,178 @@ class TestParser:
 
         # id map should be empty
         assert id_map == {}
+
+    def test_parse_log_postings_in_file_order(self):
+        lines = ["2012-09-01 03:21:20,305 INFO  [MyThread9] foo bar\n",
+                 "2012-09-01 03:21:21,305 INFO  [MyThread9] bar\n",
+                 "2012-09-01 03:21:22,305 INFO  [MyThread9] foo\n"]
+        (vertices, tag_map, id_map) = parse_log(lines)
+        assert tag_map['foo'] == [vertices[0], vertices[2]]
+        assert tag_map['bar'] == [vertices[0], vertices[1]]
+
+    def test_parse_log_batches_sizes(self):
+        lines = ["2012-09-01 03:21:2%d,305 INFO  [MyThread9] foo\n" % i
+                 for i in range(5)]
+        batches = list(parse_log_batches(lines, batch_size=2))
+        assert [len(b) for b in batches] == [2, 2, 1]
+        assert [v.line_number for v in batches[2].vertices] == [4]
+        assert list(batches[0].times) == [v.millis for v in batches[0].vertices]
+
+    def test_parse_log_batches_have_batch_local_postings(self):
+        lines = ["2012-09-01 03:21:20,305 INFO  [MyThread9] foo urn:x\n",
+                 "hello this line does not parse\n",
+                 "2012-09-01 03:21:21,305 INFO  [MyThread9] bar urn:x\n",
+                 "2012-09-01 03:21:22,305 INFO  [MyThread9] foo\n"]
+        (vertices, tag_map, id_map) = parse_log(lines)
+        batches = list(parse_log_batches(lines, batch_size=2))
+        assert len(batches) == 2
+        assert batches[0].vertices == vertices[:2]
+        assert batches[1].vertices == vertices[2:]
+        assert batches[0].tag_map == {'foo' : [vertices[0]],
+                                      'bar' : [vertices[1]]}
+        assert batches[0].id_map == {'urn:x' : [vertices[0], vertices[1]]}
+        assert batches[1].tag_map == {'foo' : [vertices[2]]}
+        assert batches[1].id_map == {}
+
+    def test_parse_log_batches_bad_batch_size(self):
+        try:
+            list(parse_log_batches([], batch_size=0))
+            assert False
+        except ValueError:
+            pass
+
+    def test_parse_log_file_parallel_matches_serial(self):
+        lines = []
+        for i in range(60):
+            lines.append("2012-09-01 03:21:%02d,305 INFO  [MyThread%d] foo%d "
+                         "bar urn:%d\n" % (i, i % 4, i % 7, i % 5))
+            if i % 9 == 0:
+                lines.append("    at some.stack.Trace(Trace.java:%d)\n" % i)
+        # No trailing newline on the last line
+        lines.append("2012-09-01 03:22:00,000 INFO  [MyThread1] last foo1")
+        with temp_log(lines) as filename:
+            expected = parse_log_file(filename)
+            for workers in [1, 2, 3, 8]:
+                actual = parse_log_file_parallel(filename, workers)
+                _assert_parses_equal(actual, expected)
+
+    def test_parse_log_file_mapped_matches_serial(self):
+        lines = ["2012-09-01 03:21:20,305 INFO  [MyThread9] foo urn:x   \n",
+                 "    at some.stack.Trace(Trace.java:10)\n",
+                 "2012-09-01 03:21:21,305 INFO  [MyThread9] bar foo\n",
+                 "2012-09-01 03:21:22,305 INFO  [MyThread9] bar"]
+        with temp_log(lines) as filename:
+            expected = parse_log_file(filename)
+            actual = parse_log_file_mapped(filename)
+            _assert_parses_equal(actual, expected)
+            for (v, expected_v) in zip(actual[0], expected[0]):
+                assert isinstance(v, StoredLogLineVertex)
+                assert v.line == expected_v.line
+                assert v.message == expected_v.message
+                assert v.time == expected_v.time
+                assert repr(v) == repr(expected_v)
+
+    def test_parse_log_file_mapped_empty_file(self):
+        with temp_log([]) as filename:
+            assert parse_log_file_mapped(filename) == ([], {}, {})
+
+    def test_parse_log_detects_format(self):
+        lines = ["Sep  1 03:21:20 myhost myprogram[4242]: foo urn:x\n",
+                 "Sep  1 03:21:21 myhost myprogram[4242]: bar\n"]
+        (vertices, tag_map, id_map) = parse_log(lines)
+        assert [v.thread_id for v in vertices] == ['myprogram[4242]'] * 2
+        assert tag_map == {'foo' : [vertices[0]], 'bar' : [vertices[1]]}
+        assert id_map == {'urn:x' : [vertices[0]]}
+
+    def test_parse_log_named_format(self):
+        lines = ["Sep  1 03:21:20 myhost myprogram[4242]: foo urn:x\n"]
+        assert parse_log(lines, 'java') == ([], {}, {})
+
+    def test_parse_log_file_mapped_json(self):
+        lines = ['{"time": "2012-09-01T03:21:20Z", "message": "foo"}\n',
+                 '{"time": "2012-09-01T03:21:21Z", "message": "bar"}\n']
+        with temp_log(lines) as filename:
+            (vertices, tag_map, id_map) = parse_log_file_mapped(filename)
+            assert [v.message for v in vertices] == ['foo', 'bar']
+            assert [v.line for v in vertices] == [l.rstrip() for l in lines]
+
+    def test_parse_log_files_merges_by_time(self):
+        first = ["2012-09-01 03:21:20,000 INFO  [MyThread1] foo\n",
+                 "2012-09-01 03:21:22,000 INFO  [MyThread1] bar\n",
+                 "2012-09-01 03:21:24,000 INFO  [MyThread1] baz\n"]
+        second = ["2012-09-01 03:21:21,000 INFO  [MyThread2] foo\n",
+                  "2012-09-01 03:21:22,000 INFO  [MyThread2] bar\n",
+                  "2012-09-01 03:21:23,000 INFO  [MyThread2] baz\n"]
+        directory = tempfile.mkdtemp()
+        plain = os.path.join(directory, 'first.log')
+        compressed = os.path.join(directory, 'second.log.gz')
+        try:
+            with open(plain, 'w') as file:
+                file.write(''.join(first))
+            file = gzip.open(compressed, 'wb')
+            file.write(''.join(second))
+            file.close()
+
+            (vertices, tag_map, id_map) = parse_log_files([plain, compressed])
+            assert [(v.source, v.line_number) for v in vertices] == \
+                [(plain, 0), (compressed, 0), (plain, 1), (compressed, 1),
+                 (compressed, 2), (plain, 2)]
+            assert [v.millis for v in vertices] == \
+                sorted(v.millis for v in vertices)
+            assert tag_map['bar'] == [vertices[2], vertices[3]]
+
+            batches = list(parse_log_files_batches([plain, compressed], 4))
+            assert map(len, batches) == [4, 2]
+            streamed = [v for b in batches for v in b.vertices]
+            assert [(v.source, v.line) for v in streamed] == \
+                [(v.source, v.line) for v in vertices]
+        finally:
+            for filename in [plain, compressed]:
+                if os.path.exists(filename):
+                    os.remove(filename)
+            os.rmdir(directory)
+
+    def test_parse_log_file_compressed(self):
+        lines = ["2012-09-01 03:21:20,305 INFO  [MyThread9] foo urn:x\n",
+                 "    at some.stack.Trace(Trace.java:10)\n",
+                 '2012-09-01 03:21:21,305 INFO  [MyThread9] bar foo\n']
+        directory = tempfile.mkdtemp()
+        plain = os.path.join(directory, 'test.log')
+        compressed = plain + '.gz'
+        try:
+            with open(plain, 'w') as file:
+                file.write(''.join(lines))
+            file = gzip.open(compressed, 'wb')
+            file.write(''.join(lines))
+            file.close()
+            expected = parse_log_file(plain)
+            actual = parse_log_file(compressed)
+            _assert_parses_equal(actual, expected)
+            assert all(isinstance(v, StoredLogLineVertex) for v in actual[0])
+            assert [v.message for v in actual[0]] == \
+                [v.message for v in expected[0]]
+            streamed = [v for batch in parse_log_file_batches(compressed, 1)
+                        for v in batch.vertices]
+            assert [v.line for v in streamed] == [v.line for v in expected[0]]
+            _assert_parses_equal(parse_log_file_mapped(compressed), expected)
+            _assert_parses_equal(parse_log_file_parallel(compressed, 2),
+                                 expected)
+        finally:
+            for filename in [plain, compressed]:
+                if os.path.exists(filename):
+                    os.remove(filename)
+            os.rmdir(directory)
+
+def _assert_parses_equal(actual, expected):
+    (vertices, tag_map, id_map) = actual
+    (expected_vertices, expected_tag_map, expected_id_map) = expected
+    key = lambda v: (v.line_number, v.line)
+    assert map(key, vertices) == map(key, expected_vertices)
+    # The maps must point at the very same vertex objects as the list
+    vertex_ids = set(map(id, vertices))
+    for (m, expected_m) in [(tag_map, expected_tag_map),
+                            (id_map, expected_id_map)]:
+        assert sorted(m.keys()) == sorted(expected_m.keys())
+        for token in m:
+            assert map(key, m[token]) == map(key, expected_m[token])
+            assert all(id(v) in vertex_ids for v in m[token])
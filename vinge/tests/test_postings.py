@@ -0,0 +1,84 @@
+import numpy as np
+
+from vinge.postings import *
+from vinge.vertex import LogLineVertex
+
+def _build(messages):
+    builder = PostingsBuilder()
+    for message in messages:
+        builder.add_line(message)
+    return builder.build()
+
+class TestPostings:
+    def test_token_dictionary(self):
+        dictionary = TokenDictionary()
+        assert dictionary.intern('foo', TAG) == 0
+        assert dictionary.intern('urn:x', ID) == 1
+        assert dictionary.intern('foo', TAG) == 0
+        assert dictionary.lookup('urn:x') == 1
+        assert dictionary.lookup('bar') is None
+        assert len(dictionary) == 2
+
+    def test_build(self):
+        postings = _build(['foo bar foo', 'the urn:x', 'bar urn:x'])
+        assert postings.dictionary.tokens == ['foo', 'bar', 'urn:x']
+        assert postings.dictionary.kinds == [TAG, TAG, ID]
+        # Stop words are dropped, and repeats on a line only count once
+        assert postings.line_offsets.tolist() == [0, 2, 3, 5]
+        assert postings.line_tokens.tolist() == [0, 1, 2, 1, 2]
+        assert postings.line_token_ids(1).tolist() == [2]
+        assert postings.postings(0).tolist() == [0]
+        assert postings.postings(1).tolist() == [0, 2]
+        assert postings.postings(2).tolist() == [1, 2]
+        assert postings.postings(1).dtype == np.int32
+        assert postings.token_ids(ID).tolist() == [2]
+
+    def test_empty(self):
+        postings = _build([])
+        assert postings.num_lines() == 0
+        assert len(postings.indexes) == 0
+
+    def test_concatenate(self):
+        messages = ['foo bar', 'urn:x', 'bar baz', 'urn:x foo']
+        whole = _build(messages)
+        joined = Postings.concatenate([_build(messages[:1]),
+                                       _build(messages[1:3]),
+                                       _build(messages[3:])])
+        assert joined.dictionary.tokens == whole.dictionary.tokens
+        assert joined.line_offsets.tolist() == whole.line_offsets.tolist()
+        assert joined.line_tokens.tolist() == whole.line_tokens.tolist()
+        assert joined.indexes.tolist() == whole.indexes.tolist()
+
+    def test_postings_maps(self):
+        vertices = [LogLineVertex('', m, i, 'MyThread1', i)
+                    for (i, m) in enumerate(['foo urn:x', 'foo'])]
+        postings = _build([v.message for v in vertices])
+        (tag_map, id_map) = postings_maps(postings, vertices)
+        assert tag_map == {'foo' : vertices}
+        assert id_map == {'urn:x' : vertices[:1]}
+        assert 'urn:x' not in tag_map
+        assert tag_map.line_indexes('foo').tolist() == [0, 1]
+        try:
+            id_map['foo']
+            assert False
+        except KeyError:
+            pass
+
+    def test_token_spans(self):
+        messages = [' foo the urn:x foo', '', 'a=b,bar']
+        vertices = [LogLineVertex('', m, i, 'MyThread1', i)
+                    for (i, m) in enumerate(messages)]
+        postings = _build(messages)
+        postings_maps(postings, vertices)
+        for (vertex, message) in zip(vertices, messages):
+            assert vertex.token_spans() == message_spans(message)
+        assert vertices[0].token_spans() == [(1, 4, TAG), (9, 14, ID),
+                                             (15, 18, TAG)]
+        assert vertices[2].token_spans() == [(2, 3, TAG), (4, 7, TAG)]
+        joined = Postings.concatenate([_build(messages[:1]),
+                                       _build(messages[1:])])
+        assert joined.spans.line_spans(2) == vertices[2].token_spans()
+
+    def test_no_token_spans(self):
+        vertex = LogLineVertex('', 'foo', 0, 'MyThread1', 0)
+        assert vertex.token_spans() is None
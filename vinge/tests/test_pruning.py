@@ -0,0 +1,50 @@
+from vinge.graph import make_graph
+from vinge.parser import parse_log
+from vinge.postings import ID
+from vinge.pruning import *
+from vinge.vertex import TagVertex
+from helpers import log_line, time_weighting
+
+_LINES = [log_line(20 + i, "common %s urn:%d" % (word, i % 2))
+          for (i, word) in enumerate(['foo', 'foo', 'bar', 'foo', 'baz'])]
+
+class TestPruning:
+    def test_prune_frequent_and_rare(self):
+        parse = parse_log(_LINES)
+        ((vertices, tag_map, id_map), report) = \
+            prune_tokens(parse, max_df=0.7, min_count=2)
+        assert vertices is parse[0]
+        assert sorted(tag_map.keys()) == ['foo']
+        assert tag_map['foo'] == [vertices[0], vertices[1], vertices[3]]
+        assert sorted(id_map.keys()) == ['urn:0', 'urn:1']
+        assert report.frequent == [('common', 5)]
+        assert sorted(report.rare) == [('bar', 1), ('baz', 1)]
+        assert report.num_dropped() == 3
+        assert report.format()[0] == 'dropped 3 of 6 tokens'
+        # Display still highlights the dropped tokens
+        assert len(vertices[2].token_spans()) == 3
+
+    def test_prune_kinds(self):
+        parse = parse_log(_LINES)
+        ((_, tag_map, id_map), report) = \
+            prune_tokens(parse, max_df=0.5, kinds=(ID,))
+        assert sorted(tag_map.keys()) == ['bar', 'baz', 'common', 'foo']
+        assert sorted(id_map.keys()) == ['urn:1']
+        assert report.frequent == [('urn:0', 3)]
+
+    def test_nothing_to_prune(self):
+        parse = parse_log(_LINES)
+        (pruned, report) = prune_tokens(parse)
+        assert pruned is parse
+        assert report.num_dropped() == 0
+
+    def test_pruning_shrinks_graph(self):
+        parse = parse_log(_LINES)
+        graph = make_graph(*parse, time_weighting=time_weighting)
+        (pruned, _) = prune_tokens(parse, max_df=0.7, min_count=2)
+        pruned_graph = make_graph(*pruned, time_weighting=time_weighting)
+        tags = [v for v in pruned_graph.nodes.vertices()
+                if isinstance(v, TagVertex)]
+        assert sorted(set(v.word for v in tags)) == ['foo']
+        assert pruned_graph.number_of_nodes() < graph.number_of_nodes()
+        assert pruned_graph.number_of_edges() < graph.number_of_edges()
@@ -0,0 +1,104 @@
+from vinge.graph import EdgeType, make_graph
+from vinge.log_format import JavaLogFormat
+from vinge.parser import parse_log_file, parse_log_file_sampled
+from vinge.sampling import *
+from vinge.vertex import LogLineVertex, UniqueIDVertex
+from helpers import temp_log
+
+def _lines(num_lines):
+    # One line a second, alternating between two threads
+    return ["2012-09-01 %02d:%02d:%02d,000 INFO  [MyThread%d] foo urn:%d\n" %
+            (i // 3600, i // 60 % 60, i % 60, i % 2, i % 3)
+            for i in range(num_lines)]
+
+class TestLogSampler:
+    def test_window_is_kept(self):
+        sampler = LogSampler(50, rate=0.1, window_lines=5)
+        vertices = [LogLineVertex('', '', i, 'MyThread1', i * 1000)
+                    for i in range(100)]
+        kept = [v.line_number for v in vertices
+                if sampler.offer(v.line_number, v.millis, v.thread_id)]
+        assert all(i in kept for i in range(45, 56))
+        # Outside the window every 10th line of the one stratum is kept
+        assert len(kept) == 11 + 9
+
+    def test_stratified_weights(self):
+        sampler = LogSampler(0, rate=0.25, window_lines=None,
+                             bucket_minutes=1)
+        vertices = [LogLineVertex('', '', i, 'MyThread%d' % (i % 2),
+                                  i * 10000) for i in range(12)]
+        kept = [v for v in vertices
+                if sampler.offer(v.line_number, v.millis, v.thread_id)]
+        sampler.finish(kept)
+        # Two threads in each of the minute buckets 0 and 1
+        assert [v.line_number for v in kept] == [0, 1, 6, 7]
+        assert [v.sample_weight for v in kept] == [3.0, 3.0, 3.0, 3.0]
+
+    def test_bad_rate(self):
+        try:
+            LogSampler(0, rate=0.0)
+            assert False
+        except ValueError:
+            pass
+
+    def test_parse_log_file_sampled(self):
+        with temp_log(_lines(2000)) as filename:
+            (vertices, tag_map, id_map) = \
+                parse_log_file_sampled(filename, 1000, rate=0.1,
+                                       window_lines=10)
+            line_numbers = [v.line_number for v in vertices]
+            assert line_numbers == sorted(line_numbers)
+            assert all(i in line_numbers for i in range(990, 1011))
+            assert 200 < len(vertices) < 230
+            assert tag_map['foo'] == vertices
+            # Weights account for every line of the log
+            assert round(sum(v.sample_weight for v in vertices)) == 2000
+
+            full = parse_log_file(filename)
+            full_by_line = dict((v.line_number, v) for v in full[0])
+            for v in vertices:
+                assert v.line == full_by_line[v.line_number].line
+
+    def test_parse_log_file_sampled_time_window(self):
+        with temp_log(_lines(2000)) as filename:
+            (vertices, _, _) = \
+                parse_log_file_sampled(filename, 1000, rate=0.1,
+                                       window_lines=None, window_minutes=1)
+            line_numbers = [v.line_number for v in vertices]
+            assert all(i in line_numbers for i in range(940, 1061))
+
+    def test_parse_log_file_sampled_time_window_past_end(self):
+        # The window is centered on the last line
+        with temp_log(_lines(200)) as filename:
+            (vertices, _, _) = \
+                parse_log_file_sampled(filename, 500, rate=0.1,
+                                       window_lines=None, window_minutes=1)
+            line_numbers = [v.line_number for v in vertices]
+            assert line_numbers == sorted(line_numbers)
+            assert all(i in line_numbers for i in range(139, 200))
+            assert round(sum(v.sample_weight for v in vertices)) == 200
+
+    def test_parse_log_file_sampled_only_parses_kept_lines(self):
+        java = JavaLogFormat()
+        parsed = []
+        def parse(line):
+            parsed.append(line)
+            return JavaLogFormat.parse(java, line)
+        java.parse = parse
+        with temp_log(_lines(2000)) as filename:
+            (vertices, _, _) = \
+                parse_log_file_sampled(filename, 1000, rate=0.1,
+                                       window_lines=10, log_format=java)
+            assert len(parsed) == len(vertices)
+
+    def test_make_graph_scales_sampled_edges(self):
+        v1 = LogLineVertex('', 'urn:1', 0, 'MyThread1', 0)
+        v2 = LogLineVertex('', 'urn:1', 1, 'MyThread1', 1000)
+        v2.sample_weight = 3.0
+        g = make_graph([v1, v2], {}, {'urn:1' : [v1, v2]},
+                       lambda t1, t2: 1.0).to_networkx()
+        [id_vertex] = [v for v in g.nodes() if isinstance(v, UniqueIDVertex)]
+        edges = dict((v.line_number, d) for (v, d) in g[id_vertex].iteritems())
+        assert edges[0] == {'weight' : 0.25,
+                            'edge_type' : EdgeType.META_TO_DATA}
+        assert edges[1]['weight'] == 0.75
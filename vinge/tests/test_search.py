@@ -0,0 +1,144 @@
+import numpy as np
+
+from vinge.context import Context
+from vinge.graph import make_graph, make_graph_from_batches
+from vinge.node_ref import NodeRef, NodeRefType
+from vinge.node_table import NodeTable
+from vinge.parser import parse_log, parse_log_batches
+from vinge.pruning import prune_tokens
+from vinge.search import *
+from vinge.timestamps import parse_time
+from vinge.vertex import LogLineVertex
+from helpers import log_line, time_weighting
+
+_LINES = [log_line(i, "foo%d urn:%d%s" % (i % 2, i % 3,
+                                         ' bar' if i % 4 == 0 else ''),
+                   "Thread%d" % (i % 2))
+          for i in xrange(10)]
+
+def _lines_with(predicate):
+    return [i for i in xrange(10) if predicate(i)]
+
+def _ctx(lines=_LINES):
+    (log_lines, tag_map, id_map) = parse_log(lines)
+    return (Context(make_graph(log_lines, tag_map, id_map, time_weighting)),
+            log_lines)
+
+class TestSortedArrays:
+    def test_intersect(self):
+        rand = np.random.RandomState(0)
+        for (n, m) in [(0, 5), (5, 5), (10, 1000), (1000, 3), (50, 60)]:
+            a = np.unique(rand.randint(0, 2000, n))
+            b = np.unique(rand.randint(0, 2000, m))
+            expected = sorted(set(a.tolist()) & set(b.tolist()))
+            for size in [None, 2000]:
+                assert intersect(a, b, size).tolist() == expected
+                assert intersect(b, a, size).tolist() == expected
+
+    def test_intersect_past_the_end(self):
+        a = np.array([1, 5000])
+        b = np.arange(100)
+        assert intersect(a, b).tolist() == [1]
+
+    def test_union_and_difference(self):
+        a = np.array([1, 3, 5])
+        b = np.array([2, 3, 6])
+        for size in [None, 7]:
+            assert union(a, b, size).tolist() == [1, 2, 3, 5, 6]
+            assert union(a, b[:0], size).tolist() == [1, 3, 5]
+            assert difference(a, b, size).tolist() == [1, 5]
+            assert difference(a, b[:0], size).tolist() == [1, 3, 5]
+
+class TestParseQuery:
+    def test_precedence(self):
+        assert parse_query('a b or not c') == \
+            ('or', [('and', [('word', 'a'), ('word', 'b')]),
+                    ('not', ('word', 'c'))])
+        assert parse_query('a and (b or c)') == \
+            ('and', [('word', 'a'),
+                     ('or', [('word', 'b'), ('word', 'c')])])
+        assert parse_query('(a)') == ('word', 'a')
+
+    def test_terms(self):
+        day = parse_time('2012-09-01 00:00')
+        assert parse_query('thread:main urn:x after:01:00 before:02:00',
+                           day) == \
+            ('and', [('thread', 'main'), ('word', 'urn:x'),
+                     ('after', day + 3600000), ('before', day + 7200000)])
+        assert parse_query('template:3') == ('template', 3)
+
+    def test_errors(self):
+        for query in ['', '(a', 'a)', 'a or', 'not', 'after:noon',
+                      'thread:', 'and a', 'template:x']:
+            try:
+                parse_query(query)
+                assert False, query
+            except QueryError:
+                pass
+
+class TestSearchIndex:
+    def _find(self, ctx, query):
+        return ctx.search_index().find(
+            parse_query(query, ctx.index().first_millis()))
+
+    def _expect(self, log_lines, indexes):
+        return [log_lines[i].idx() for i in indexes]
+
+    def test_find(self):
+        (ctx, log_lines) = _ctx()
+        find = lambda query: self._find(ctx, query).tolist()
+        expect = lambda pred: self._expect(log_lines, _lines_with(pred))
+        assert find('foo0') == expect(lambda i: i % 2 == 0)
+        assert find('foo0 bar') == expect(lambda i: i % 4 == 0)
+        assert find('foo1 or urn:2') == \
+            expect(lambda i: i % 2 == 1 or i % 3 == 2)
+        assert find('not foo0') == expect(lambda i: i % 2 == 1)
+        assert find('foo0 not (bar or urn:0)') == \
+            expect(lambda i: i % 2 == 0 and i % 4 != 0 and i % 3 != 0)
+        assert find('thread:Thread1 urn:0') == expect(lambda i: i in (3, 9))
+        assert find('after:03:21:04 before:03:21:07') == \
+            expect(lambda i: 4 <= i < 7)
+        assert find('nope') == []
+        assert find('thread:nope') == []
+        assert find('nope or foo1') == expect(lambda i: i % 2 == 1)
+
+    def test_find_batches(self):
+        # One postings per batch
+        graph = make_graph_from_batches(parse_log_batches(_LINES, 3),
+                                        time_weighting)
+        ctx = Context(graph)
+        hits = self._find(ctx, 'urn:1 or bar')
+        lines = [ctx.node(idx).line_number for idx in hits]
+        assert lines == _lines_with(lambda i: i % 3 == 1 or i % 4 == 0)
+
+    def test_find_after_pruning(self):
+        # Pruning only changes the graph, pruned words can still be found
+        ((log_lines, tag_map, id_map), report) = \
+            prune_tokens(parse_log(_LINES), max_df=0.4, min_count=4)
+        assert ('bar', 3) in report.rare
+        assert 'bar' not in tag_map
+        ctx = Context(make_graph(log_lines, tag_map, id_map, time_weighting))
+        assert self._find(ctx, 'bar').tolist() == \
+            self._expect(log_lines, _lines_with(lambda i: i % 4 == 0))
+        assert self._find(ctx, 'foo1').tolist() == \
+            self._expect(log_lines, _lines_with(lambda i: i % 2 == 1))
+
+    def test_find_without_postings(self):
+        vertices = [LogLineVertex('line %d' % i, 'foo%d urn:%d' % (i % 2, i),
+                                  i, 't', 1000 * i) for i in xrange(4)]
+        for (i, v) in enumerate(vertices):
+            v._set_idx(i)
+        index = SearchIndex(NodeTable.from_vertices(vertices))
+        assert index.find(parse_query('foo1')).tolist() == [1, 3]
+        assert index.find(parse_query('urn:2 or urn:3')).tolist() == [2, 3]
+
+    def test_hits_are_node_refs(self):
+        (ctx, log_lines) = _ctx()
+        ctx.hits = self._find(ctx, 'bar')
+        node = ctx.node_by_node_ref(NodeRef(NodeRefType.HIT, hit_index=2))
+        assert node == log_lines[8]
+        try:
+            ctx.node_by_node_ref(NodeRef(NodeRefType.HIT, hit_index=3))
+            assert False
+        except ValueError:
+            pass
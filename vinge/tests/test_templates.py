@@ -0,0 +1,137 @@
+import vinge.filters
+from vinge.context import Context
+from vinge.graph import EdgeType, make_graph, make_graph_from_batches
+from vinge.parser import parse_log, parse_log_batches
+from vinge.templates import *
+from vinge.vertex import LogLineVertex, NodeKind, TemplateVertex
+from helpers import log_line, time_weighting
+
+_LINES = [log_line(i, message)
+          for (i, message) in enumerate([
+              "connected to host7 in 15 ms",
+              "connected to host2 in 3 ms",
+              "cache miss for key urn:5",
+              "connected to host9 in 40 ms",
+              "cache miss for key urn:7",
+              "shutting down now"])]
+
+def _vertex(message):
+    return LogLineVertex(message, message, 0, 't', 0)
+
+class TestTemplateMiner:
+    def test_merges_similar_lines(self):
+        miner = TemplateMiner()
+        t1 = miner.add_tokens(['connected', 'to', 'host7', 'in', 'ms'])
+        t2 = miner.add_tokens(['connected', 'to', 'host2', 'in', 'ms'])
+        assert t1 is t2
+        assert t1.count == 2
+        assert t1.text() == 'connected to <*> in ms'
+
+    def test_keeps_different_lines_apart(self):
+        miner = TemplateMiner()
+        t1 = miner.add_tokens(['connected', 'to', 'host'])
+        # Different length
+        t2 = miner.add_tokens(['connected', 'to'])
+        # Different leading tokens
+        t3 = miner.add_tokens(['disconnected', 'from', 'host'])
+        # Same leading tokens, but not similar enough
+        t4 = TemplateMiner(similarity=0.8)
+        a = t4.add_tokens(['connected', 'to', 'host', 'a', 'b'])
+        b = t4.add_tokens(['connected', 'to', 'x', 'y', 'z'])
+        assert len(set([t1.template_id, t2.template_id, t3.template_id])) == 3
+        assert [t.template_id for t in miner.templates] == [0, 1, 2]
+        assert a is not b
+
+    def test_digits_route_to_wildcard(self):
+        # host7 and host2 are the second token, which is part of the route
+        miner = TemplateMiner(depth=4)
+        t1 = miner.add_tokens(['host7', 'up'])
+        t2 = miner.add_tokens(['host2', 'up'])
+        assert t1 is t2
+        assert t1.tokens == [WILDCARD, 'up']
+
+    def test_max_children(self):
+        miner = TemplateMiner(max_children=2)
+        for word in ['a', 'b', 'c', 'd']:
+            miner.add_tokens([word, 'x', 'y'])
+        # c and d share the wildcard child and merge
+        assert [t.text() for t in miner.templates] == \
+            ['a x y', 'b x y', '<*> x y']
+        assert miner.templates[2].count == 2
+
+    def test_bad_depth(self):
+        try:
+            TemplateMiner(depth=2)
+            assert False
+        except ValueError:
+            pass
+
+    def test_line_tokens_ids_are_wildcards(self):
+        assert line_tokens(_vertex('cache miss for urn:5')) == \
+            ['cache', 'miss', WILDCARD]
+
+    def test_mine_templates(self):
+        (log_lines, tag_map, id_map) = parse_log(_LINES)
+        miner = mine_templates(log_lines)
+        assert [ll.template_id for ll in log_lines] == [0, 0, 1, 0, 1, 2]
+        assert [t.count for t in miner.templates] == [3, 2, 1]
+        assert miner.templates[1].text() == 'cache miss key <*>'
+
+class TestTemplateGraph:
+    def test_template_chains(self):
+        (log_lines, tag_map, id_map) = parse_log(_LINES)
+        miner = TemplateMiner()
+        graph = make_graph(log_lines, tag_map, id_map, time_weighting,
+                           template_miner=miner).to_networkx()
+        by_idx = dict((v.idx(), v) for v in graph)
+        templates = [v for v in graph.nodes()
+                     if v.kind == NodeKind.NodeKindTemplateVertex]
+        assert len(templates) == len(log_lines)
+        for ll in log_lines:
+            line = by_idx[ll.idx()]
+            nbrs = [v for v in graph.successors(line)
+                    if v.kind == NodeKind.NodeKindTemplateVertex]
+            assert nbrs == [TemplateVertex(ll.template_id, '', ll.millis)]
+            assert graph[line][nbrs[0]]['edge_type'] == EdgeType.DATA_TO_META
+        # The first template's chain: lines 0, 1 and 3
+        chain = sorted(v for v in templates if v.template_id == 0)
+        assert graph[chain[0]][chain[1]]['edge_type'] == EdgeType.META_TO_META
+        assert graph.has_edge(chain[1], chain[2])
+        assert not graph.has_edge(chain[0], chain[2])
+        assert chain[0].text == 'connected <*> <*> ms'
+
+    def test_replace_tags(self):
+        (log_lines, tag_map, id_map) = parse_log(_LINES)
+        full = make_graph(log_lines, tag_map, id_map, time_weighting)
+        (log_lines, tag_map, id_map) = parse_log(_LINES)
+        graph = make_graph(log_lines, tag_map, id_map, time_weighting,
+                           template_miner=TemplateMiner(), replace_tags=True)
+        kinds = set(graph.nodes.kinds.tolist())
+        assert NodeKind.NodeKindTagVertex not in kinds
+        assert NodeKind.NodeKindUniqueIDVertex in kinds
+        assert graph.number_of_nodes() < full.number_of_nodes()
+
+    def test_from_batches_matches_graph(self):
+        (log_lines, tag_map, id_map) = parse_log(_LINES)
+        graph = make_graph(log_lines, tag_map, id_map, time_weighting,
+                           template_miner=TemplateMiner()).to_networkx()
+        for batch_size in [1, 4]:
+            streamed = make_graph_from_batches(
+                parse_log_batches(_LINES, batch_size), time_weighting,
+                template_miner=TemplateMiner()).to_networkx()
+            assert sorted(streamed.nodes()) == sorted(graph.nodes())
+            assert sorted(streamed.edges(data=True)) == \
+                sorted(graph.edges(data=True))
+
+    def test_node_table_and_sensor(self):
+        (log_lines, tag_map, id_map) = parse_log(_LINES)
+        graph = make_graph(log_lines, tag_map, id_map, time_weighting,
+                           template_miner=TemplateMiner(), replace_tags=True)
+        ctx = Context(graph)
+        mask = ctx.nodes.sensor_vector(vinge.filters.template)
+        templates = [ctx.node(idx) for idx in mask.nonzero()[0]]
+        assert len(templates) == len(log_lines)
+        assert templates[0].text == 'connected <*> <*> ms'
+        assert ctx.node(log_lines[4].idx()).template_id == 1
+        hits = ctx.search_index().find(('template', 1))
+        assert hits.tolist() == [log_lines[2].idx(), log_lines[4].idx()]
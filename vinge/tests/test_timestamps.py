@@ -0,0 +1,60 @@
+from datetime import datetime
+
+import numpy as np
+
+from vinge.timestamps import *
+
+class TestTimestamps:
+    def test_millis_round_trip(self):
+        dt = datetime(year=2012, month=9, day=1, hour=3, minute=21, second=20,
+                      microsecond=305000)
+        millis = datetime_to_millis(dt)
+        assert millis == 1346469680305
+        assert millis_to_datetime(millis) == dt
+
+    def test_as_millis(self):
+        dt = datetime(year=2012, month=9, day=1)
+        assert as_millis(dt) == datetime_to_millis(dt)
+        assert as_millis(12) == 12
+
+    def test_decoder(self):
+        decoder = TimestampDecoder()
+        stamps = ["2012-09-01 03:21:20,305",
+                  "2012-09-01 03:21:59,999",
+                  "2012-09-01 03:22:00,000",
+                  "2012-12-31 23:59:59,999",
+                  "2013-01-01 00:00:00,001"]
+        for stamp in stamps:
+            dt = datetime.strptime(stamp + '000', '%Y-%m-%d %H:%M:%S,%f')
+            assert decoder.decode(stamp) == datetime_to_millis(dt)
+
+    def test_decoder_bad_date(self):
+        try:
+            TimestampDecoder().decode("2012-13-01 03:21:20,305")
+            assert False
+        except ValueError:
+            pass
+
+    def test_millis_array(self):
+        class V(object):
+            def __init__(self, millis):
+                self.millis = millis
+        times = millis_array([V(3), V(1)])
+        assert times.dtype == np.int64
+        assert list(times) == [3, 1]
+
+    def test_parse_time(self):
+        reference = datetime_to_millis(datetime(2012, 9, 1, 17, 5))
+        day = datetime_to_millis(datetime(2012, 9, 1))
+        assert parse_time('12:03:05', reference) == day + 43385000
+        assert parse_time('12:03', reference) == day + 43380000
+        assert parse_time('12:03:05.25', reference) == day + 43385250
+        assert parse_time('2012-09-02 00:00:01,005', reference) == \
+            day + 86401005
+        assert parse_time('2012-09-02T1:00') == day + 90000000
+        for string in ['noon', '12', '12:3', '2012-09-02']:
+            try:
+                parse_time(string, reference)
+                assert False
+            except ValueError:
+                pass
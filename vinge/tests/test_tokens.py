@@ -1,3 +1,5 @@
+import re
+
 from vinge.tokens import *
 
 class TestTokens:
@@ -52,3 +54,75 @@ class TestTokens:
                           ("is", TokenType.STOP_WORD),
                           (" ", TokenType.SPLITTER),
                           ("foo", TokenType.TAG)]
+
+    def test_tokenize_matches_split_and_probe(self):
+        strings = ["", "   ", " leading and trailing, ",
+                   "key=value,other=urn:a=b urn: urn:x,y",
+                   "368c6f60-f544-11e1-a21f-0800200c9a66abc "
+                   "x368c6f60-f544-11e1-a21f-0800200c9a66 "
+                   "368c6f60-f544-11e1-a21f-0800200c9a66=urn:foo/bar",
+                   "tabs\tand\nnewlines\r\x0bvertical\x0cfeeds",
+                   "The it IS is ain't foo.bar(Baz.java:10)"]
+        for string in strings:
+            assert tokenize(string) == _split_and_probe_tokenize(string)
+
+def _split_and_probe_tokenize(string):
+    # The original tokenizer: split, then try every classification in turn
+    ret = []
+    for token in re.split('([\s=,]+)', string):
+        if token == '':
+            continue
+        if is_token_id(token):
+            token_type = TokenType.ID
+        elif is_stop_word(token):
+            token_type = TokenType.STOP_WORD
+        elif re.match('[\s=,]+', token):
+            token_type = TokenType.SPLITTER
+        else:
+            token_type = TokenType.TAG
+        ret.append((token, token_type))
+    return ret
+
+class TestIdPatterns:
+    def teardown_method(self, method):
+        set_id_patterns()
+
+    def test_builtin_ids(self):
+        ids = ["fe80::1ff:fe23:4567:890a", "10.0.12.7:8080",
+               "4bf92f3577b34da6a3ce929d0e0e4736", "req-7f3a9c2e1b",
+               "frontend-7d9f8b6c5d-x2x7q", "0x0000000000001234",
+               "1234567890123456789a"]
+        not_ids = ["12:30:45", "std::map", "deadbeef", "read-through-cache",
+                   "10.0.12", "1234567890123456789"]
+        for token in ids:
+            assert is_token_id(token), token
+        for token in not_ids:
+            assert not is_token_id(token), token
+
+    def test_tokenize_long_number_is_not_id(self):
+        tokens = tokenize("took 1234567890123456789 ns")
+        assert ("1234567890123456789", TokenType.TAG) in tokens
+        assert not [token for token in tokens if token[1] == TokenType.ID]
+
+    def test_set_id_patterns(self):
+        set_id_patterns(['uuid'], ['ticket-\d+'])
+        assert not is_token_id("urn:foo")
+        assert is_token_id("ticket-42")
+        assert tokenize("ticket-42 urn:foo") == [("ticket-42", TokenType.ID),
+                                                (" ", TokenType.SPLITTER),
+                                                ("urn:foo", TokenType.TAG)]
+        set_id_patterns([])
+        assert tokenize("urn:foo") == [("urn:foo", TokenType.TAG)]
+
+    def test_id_patterns_key(self):
+        key = id_patterns_key()
+        set_id_patterns(['uuid'])
+        assert id_patterns_key() != key
+
+    def test_bad_id_patterns(self):
+        for (names, extra) in [(['nope'], []), ([], ['(unclosed'])]:
+            try:
+                set_id_patterns(names, extra)
+                assert False
+            except ValueError:
+                pass
@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import numpy as np
+
+from vinge.timestamps import datetime_to_millis
+from vinge.weighting import *
+
+class TestWeighting:
+    def test_scalar_weighting(self):
+        calls = []
+        def time_weighting(t1, t2):
+            calls.append((t1, t2))
+            return 0.5
+        t1 = datetime(year=2012, month=9, day=1, second=1)
+        t2 = datetime(year=2012, month=9, day=1, second=3)
+        weights = time_weights(time_weighting, [datetime_to_millis(t1)],
+                               [datetime_to_millis(t2)])
+        np.testing.assert_allclose(weights, [0.5])
+        assert calls == [(t1, t2)]
+
+    def test_vectorized_weighting(self):
+        deltas = []
+        @vectorized
+        def time_weighting(d):
+            deltas.append(d)
+            return np.ones(len(d))
+        weights = time_weights(time_weighting, [1000, 5000], [3000, 5000])
+        np.testing.assert_allclose(weights, [1.0, 1.0])
+        assert len(deltas) == 1
+        assert deltas[0].tolist() == [2000, 0]
+
+    def test_exponential_decay(self):
+        # Same as the scalar weighting bin/vinge used to have
+        t1 = datetime(year=2012, month=9, day=1, second=1)
+        t2 = datetime(year=2012, month=9, day=1, minute=3, second=20)
+        expected = np.exp(0.0001 * -abs(t2 - t1).total_seconds())
+        weights = time_weights(exponential_decay(0.0001),
+                               [datetime_to_millis(t1)],
+                               [datetime_to_millis(t2)])
+        np.testing.assert_allclose(weights, [expected])
+
+    def test_linear_and_step_decay(self):
+        deltas = np.array([0, 5000, 10000, 20000], dtype=np.int64)
+        np.testing.assert_allclose(linear_decay(10)(deltas),
+                                   [1.0, 0.5, 0.0, 0.0])
+        np.testing.assert_allclose(step_decay(5)(deltas),
+                                   [1.0, 1.0, 0.0, 0.0])
+        np.testing.assert_allclose(step_decay(5, far=0.25)(deltas),
+                                   [1.0, 1.0, 0.25, 0.25])
@@ -0,0 +1,131 @@
+"""
+Log times are kept as integer milliseconds since the unix epoch. Log
+timestamps carry no timezone, so they are treated as UTC on the way in and
+out; datetime objects are only created for display.
+"""
+
+import re
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+
+def datetime_to_millis(dt):
+    """
+    Args:
+        dt (datetime.datetime)
+
+    Returns:
+        int milliseconds since the epoch. Sub-millisecond precision is dropped.
+    """
+    delta = dt - EPOCH
+    return ((delta.days * 86400 + delta.seconds) * 1000 +
+            delta.microseconds // 1000)
+
+def millis_to_datetime(millis):
+    """
+    Inverse of datetime_to_millis.
+
+    Args:
+        millis (int)
+
+    Returns:
+        datetime.datetime
+    """
+    return EPOCH + timedelta(milliseconds=int(millis))
+
+def as_millis(time):
+    """
+    Args:
+        time (int or datetime.datetime)
+
+    Returns:
+        int milliseconds since the epoch
+    """
+    if isinstance(time, datetime):
+        return datetime_to_millis(time)
+    return time
+
+# group 1 - optional date
+# group 2-4 - hour, minute, optional second
+# group 5 - optional fraction of a second
+_TIME_REGEX = re.compile(
+    r'^(?:(\d\d\d\d-\d\d-\d\d)[T ])?(\d?\d):(\d\d)(?::(\d\d)(?:[.,](\d+))?)?$')
+
+def parse_time(string, reference_millis=0):
+    """
+    Parses a time typed in by the user, like '12:03:05', '12:03:05.250' or
+    '2012-09-01 12:03'.
+
+    Args:
+        string (str)
+        reference_millis (int) a time without a date is on the day of this
+            time
+
+    Returns:
+        int milliseconds since the epoch
+
+    Raises:
+        ValueError if string is not a time
+    """
+    m = _TIME_REGEX.match(string.strip())
+    if not m:
+        raise ValueError("Not a time: '%s'" % string)
+    if m.group(1):
+        day = datetime.strptime(m.group(1), '%Y-%m-%d')
+    else:
+        day = millis_to_datetime(reference_millis)
+        day = datetime(day.year, day.month, day.day)
+    ret = datetime_to_millis(day.replace(hour=int(m.group(2)),
+                                         minute=int(m.group(3)),
+                                         second=int(m.group(4) or 0)))
+    if m.group(5):
+        ret += int(m.group(5)[:3].ljust(3, '0'))
+    return ret
+
+def millis_array(vertices):
+    """
+    Args:
+        vertices (iterable of vertices with a millis attribute)
+
+    Returns:
+        numpy.array of int64
+    """
+    return np.fromiter((v.millis for v in vertices), dtype=np.int64)
+
+class TimestampDecoder(object):
+    """
+    Decodes 'YYYY-MM-DD HH:MM:SS,mmm' timestamps into epoch milliseconds.
+
+    Consecutive log lines almost always share the date, hour and minute, so
+    the decoded value of that prefix is cached. A timestamp with the same
+    prefix as the previous one only costs two int conversions.
+    """
+    def __init__(self):
+        self._prefix = None
+        self._prefix_millis = 0
+
+    def decode(self, stamp):
+        """
+        Args:
+            stamp (str) must be of the form 'YYYY-MM-DD HH:MM:SS,mmm'
+
+        Returns:
+            int milliseconds since the epoch
+
+        Raises:
+            ValueError if the date is not valid
+        """
+        prefix = stamp[:16]
+        if prefix != self._prefix:
+            dt = datetime(year=int(stamp[0:4]),
+                          month=int(stamp[5:7]),
+                          day=int(stamp[8:10]),
+                          hour=int(stamp[11:13]),
+                          minute=int(stamp[14:16]))
+            self._prefix_millis = datetime_to_millis(dt)
+            self._prefix = prefix
+        return (self._prefix_millis + int(stamp[17:19]) * 1000 +
+                int(stamp[20:23]))
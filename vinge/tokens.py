@@ -13,23 +13,106 @@ class TokenType:
     # Set of characters we use to tokenize. Space, comma, equals, etc.
     SPLITTER = 4
 
-ID_TOKEN_REGEXES = [
+# Characters tokens are split on. Space, comma, equals, etc.
+SPLITTER_CHARS = r'\s=,'
+
+# Alphabet k8s uses for the random parts of generated names (no vowels)
+_K8S_SAFE = '[bcdfghjklmnpqrstvwxz2456789]'
+
+ID_TOKEN_PATTERNS = [
     # UUIDs
     # Example: 2cdd3a76-78fb-412b-bcf2-f09c3b0d9670
-    re.compile('^[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}$'),
+    ('uuid', '[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}'),
     # urns
     # Example: urn:foo:bar/baz
-    re.compile('^urn:[^\s]+$')
+    ('urn', 'urn:[^%s]+' % SPLITTER_CHARS),
+    # Request, trace and the like ids with a prefix
+    # Example: req-7f3a9c2e1b, trace_0af7651916cd43dd
+    ('request_id', '(?:req|request|trace|span|txn|corr)[-_:][0-9A-Za-z_-]{6,}'),
+    # Long hex strings: trace ids, span ids, hashes. Without the 0x, at
+    # least one letter, so long decimal numbers (durations, counters) aren't
+    # ids
+    # Example: 4bf92f3577b34da6a3ce929d0e0e4736
+    ('hex', '0x[0-9a-fA-F]{16,}|(?=[0-9]*[a-fA-F])[0-9a-fA-F]{16,}'),
+    # IPv4 addresses, maybe with a port
+    # Example: 10.0.12.7:8080
+    ('ipv4', r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}(?::\d{1,5})?'),
+    # IPv6 addresses, without zone or port: all eight groups, or fewer
+    # with a ::
+    # Example: fe80::1ff:fe23:4567:890a
+    ('ipv6', '(?:%(h)s:){7}%(h)s|(?:%(h)s:){1,6}(?::%(h)s){1,6}|'
+             '(?:%(h)s:){1,7}:|:(?::%(h)s){1,7}' % {'h' : '[0-9a-fA-F]{1,4}'}),
+    # k8s pod names made by a deployment
+    # Example: frontend-7d9f8b6c5d-x2x7q
+    ('k8s_pod', '[a-z0-9][-a-z0-9]*-%s{5,10}-%s{5}' % (_K8S_SAFE, _K8S_SAFE)),
     ]
+"""
+Built in id patterns, by name. A token is an id if one of the enabled
+patterns (see set_id_patterns) matches all of it. Tokens never contain
+SPLITTER_CHARS, so a pattern must not match them either.
+"""
+
+DEFAULT_ID_PATTERN_NAMES = [name for (name, _) in ID_TOKEN_PATTERNS]
+
+_SPLITTER_REGEX = re.compile('[%s]+' % SPLITTER_CHARS)
+
+# Set by set_id_patterns
+_id_patterns = None
+_id_regex = None
+_scanner = None
+
+def set_id_patterns(names=None, extra_patterns=()):
+    """
+    Sets which tokens are ids. All the patterns are compiled into a single
+    alternation, so classifying a token takes one match however many
+    patterns there are.
+
+    Args:
+        names (list of str) names of the ID_TOKEN_PATTERNS to use. Defaults
+            to all of them.
+        extra_patterns (list of str) more patterns (regular expressions)
+
+    Raises:
+        ValueError if a name isn't one of ID_TOKEN_PATTERNS, or a pattern
+        doesn't compile
+    """
+    global _id_patterns, _id_regex, _scanner
+    if names is None:
+        names = DEFAULT_ID_PATTERN_NAMES
+    builtin = dict(ID_TOKEN_PATTERNS)
+    patterns = []
+    for name in names:
+        if name not in builtin:
+            raise ValueError("Unknown id pattern '%s', known patterns are: %s" %
+                             (name, ', '.join(DEFAULT_ID_PATTERN_NAMES)))
+        patterns.append(builtin[name])
+    patterns.extend(extra_patterns)
+    ids = '|'.join('(?:%s)' % pattern for pattern in patterns)
+    if not ids:
+        # Matches nothing
+        ids = '(?!)'
+    try:
+        id_regex = re.compile('(?:%s)\Z' % ids)
+        # Scans a string in one pass, splitting it into tokens and telling
+        # splitters and ids apart from words. The alternatives are tried in
+        # order at the start of every token, and an id must run up to the
+        # end of its token.
+        scanner = re.compile(
+            '(?P<splitter>[%(s)s]+)|(?P<id>(?:%(ids)s)(?![^%(s)s]))|'
+            '(?P<word>[^%(s)s]+)' % {'s' : SPLITTER_CHARS, 'ids' : ids})
+    except re.error, e:
+        raise ValueError("Bad id pattern: %s" % e)
+    (_id_patterns, _id_regex, _scanner) = (ids, id_regex, scanner)
+
+def id_patterns_key():
+    """
+    Returns:
+        str that changes whenever the set of id patterns does
+    """
+    return _id_patterns
 
 def is_token_id(string):
-    # TODO(trevor) - make this configurable
-    # IDs for now are UUIDs or anything that is a urn
-    # UUID string representation
-    for regex in ID_TOKEN_REGEXES:
-        if regex.match(string):
-            return True
-    return False
+    return _id_regex.match(string) is not None
 
 def is_token_tag(string):
     return (not is_token_id(string)) and (not is_stop_word(string))
@@ -38,32 +121,36 @@ def is_stop_word(string):
     return string in STOP_WORDS
 
 def is_splitter(string):
-    return re.match('[\s=,]+', string) is not None
+    return _SPLITTER_REGEX.match(string) is not None
 
 def tokenize(string):
     """
     Takes a string and returns a list of the tokens found in that string.
 
+    The string is split into alternating runs of SPLITTER_CHARS and of
+    everything else. Every run is a token, and is classified (in order of
+    precedence) as an id, a stop word, a splitter or a tag.
+
     Args:
         string (str)
     Returns:
         list of (str, TokenType)
     """
     ret = []
-    # TODO make sure you keep this in-sync with the is_splitter method above
-    tokens = re.split('([\s=,]+)', string)
-    # There can be empty strings at the beginning of the line from that
-    for token in tokens:
-        # Throw away first empty guy
-        if token == '':
-            continue
-        if is_token_id(token):
-            token_type = TokenType.ID
-        elif is_stop_word(token):
-            token_type = TokenType.STOP_WORD
-        elif is_splitter(token):
-            token_type = TokenType.SPLITTER
+    append = ret.append
+    stop_words = STOP_WORDS
+    for m in _scanner.finditer(string):
+        token = m.group()
+        group = m.lastgroup
+        if group == 'word':
+            if token in stop_words:
+                append((token, TokenType.STOP_WORD))
+            else:
+                append((token, TokenType.TAG))
+        elif group == 'id':
+            append((token, TokenType.ID))
         else:
-            token_type = TokenType.TAG
-        ret.append((token, token_type))
+            append((token, TokenType.SPLITTER))
     return ret
+
+set_id_patterns()
@@ -1,7 +1,13 @@
 """
 Data container classes for the graph.
+
+There can be millions of vertices, so they are kept small: every class has
+__slots__ rather than a __dict__, the kind is a class attribute, and thread
+ids and tag words are interned, so each distinct one is stored once.
 """
 
+from timestamps import as_millis, millis_to_datetime
+
 class NodeType:
     Left = 1
     Right = 2
@@ -17,6 +23,13 @@ class NodeKind:
     NodeKindLogLineVertex = 0
     NodeKindUniqueIDVertex = 1
     NodeKindTagVertex = 2
+    NodeKindTemplateVertex = 3
+
+def _intern(string):
+    # intern() only takes byte strings
+    if type(string) is str:
+        return intern(string)
+    return string
 
 class Vertex(object):
     """
@@ -24,7 +37,17 @@ class Vertex(object):
 
     A Vertex should be thought of as an immutable object that is part of a
     single networkx graph.
+
+    Subclasses must set kind (a NodeKind) and define __slots__, and their
+    __init__ must call Vertex.__init__.
     """
+    __slots__ = ('_idx',)
+
+    kind = None
+
+    def __init__(self):
+        # Set by the graph making code, see idx
+        self._idx = None
 
     def nodetype(self):
         """
@@ -45,8 +68,10 @@ class Vertex(object):
         E.g.
           g # A graph
           v # A vertex in g
-          m = networkx.to_scipy_sparse_matrix(g)
+          m = context.Context(g).transition
           m[v.idx()]
+
+        N.b. this is not necessarily v's position in g.nodes().
         """
         return self._idx
 
@@ -58,26 +83,64 @@ class Vertex(object):
         # No one should actually call this except graph making code.
         self._idx = idx
 
-class LogLineVertex(Vertex):
+class BaseLogLineVertex(Vertex):
     """
-    Vertex used to represent the log line itself.
+    Vertex used to represent the log line itself. What LogLineVertex and
+    StoredLogLineVertex share: everything but the text, as each keeps the
+    line and message its own way. Subclasses must provide line and message
+    and call _init_fields.
+
+    Attributes:
+        line (str) Untouched log line from the original file
+        message (str) message portion of the file
+        line_number (int) 0 based index in original file
+        thread_id (str) If relevant, thread identifier
+        millis (int) epoch milliseconds of the line
+        source (str) name of the log file the line is from, when vinge is
+            looking at more than one. See parser.parse_log_files.
+        sample_weight (float) number of log lines this line stands for when
+            the log is sampled. See sampling.LogSampler.
+        postings (postings.Postings) tokenization of the line from parsing.
+            See postings.postings_maps.
+        line_index (int) index of the line in postings
+        template_id (int) the line's template, if templates were mined. See
+            vinge.templates.
     """
-    def __init__(self, line, message, line_number, thread_id, time):
+    __slots__ = ('line_number', 'thread_id', 'millis', 'source',
+                 'sample_weight', 'postings', 'line_index', 'template_id')
+
+    kind = NodeKind.NodeKindLogLineVertex
+
+    def _init_fields(self, line_number, thread_id, time):
+        # Everything but the text
+        Vertex.__init__(self)
+        self.line_number = line_number
+        self.thread_id = _intern(thread_id)
+        self.millis = as_millis(time)
+        self.source = None
+        self.sample_weight = 1.0
+        self.postings = None
+        self.line_index = None
+        self.template_id = None
+
+    @property
+    def time(self):
         """
-        Args:
-            line (str) Untouched log line from the original file
-            message (str) message portion of the file
-            line_number (int) 0 based index in original file
-            thread_id (str) If relevant, thread identifier
-            time (datetime.datetime)
+        datetime.datetime of the line. Created on every call; use millis
+        for anything but display.
         """
-        # TODO(trevor) should these be optional?
-        self.line = line
-        self.message = message
-        self.line_number = line_number
-        self.thread_id = thread_id
-        self.time = time
-        self.kind = NodeKind.NodeKindLogLineVertex
+        return millis_to_datetime(self.millis)
+
+    def token_spans(self):
+        """
+        Returns:
+            list of (int, int, int) start, end and kind (postings.TAG or
+            postings.ID) of every tag and id in the message, or None if the
+            line's tokenization wasn't kept
+        """
+        if self.postings is None or self.postings.spans is None:
+            return None
+        return self.postings.spans.line_spans(self.line_index)
 
     def nodetype(self):
         return NodeType.Left
@@ -86,26 +149,85 @@ class LogLineVertex(Vertex):
         return "%d: %s '%s' '%s' %s" % (self.line_number, self.line, self.thread_id, self.message, self.time)
 
     def __eq__(self, other):
-        if not isinstance(other, LogLineVertex):
+        if not isinstance(other, BaseLogLineVertex):
             return NotImplemented
         return self.line == other.line
 
     def __lt__(self, other):
-        if not isinstance(other, LogLineVertex):
+        if not isinstance(other, BaseLogLineVertex):
             return NotImplemented
         return self.line < other.line
 
+class LogLineVertex(BaseLogLineVertex):
+    """
+    BaseLogLineVertex that keeps its line and message in memory.
+    """
+    __slots__ = ('line', 'message')
+
+    def __init__(self, line, message, line_number, thread_id, time):
+        """
+        Args:
+            line (str) Untouched log line from the original file
+            message (str) message portion of the file
+            line_number (int) 0 based index in original file
+            thread_id (str) If relevant, thread identifier
+            time (datetime.datetime or int) int is epoch milliseconds
+        """
+        # TODO(trevor) should these be optional?
+        self.line = line
+        self.message = message
+        self._init_fields(line_number, thread_id, time)
+
+class StoredLogLineVertex(BaseLogLineVertex):
+    """
+    BaseLogLineVertex whose line and message are not kept in memory. Only
+    the position of the line in a line store is kept (see vinge.line_store),
+    and the text is read back from the store every time it is needed.
+    """
+    __slots__ = ('store', 'offset', 'length', 'message_start')
+
+    def __init__(self, store, offset, length, message_start, line_number,
+                 thread_id, time):
+        """
+        Args:
+            store (line_store line store) holds the text of the line
+            offset (int) position of the line in the store
+            length (int) length of the line, without trailing whitespace
+            message_start (int) position of the message within the line
+            line_number (int) 0 based index in original file
+            thread_id (str) If relevant, thread identifier
+            time (datetime.datetime or int) int is epoch milliseconds
+        """
+        self.store = store
+        self.offset = offset
+        self.length = length
+        self.message_start = message_start
+        self._init_fields(line_number, thread_id, time)
+
+    @property
+    def line(self):
+        return self.store.text(self.offset, self.length)
+
+    @property
+    def message(self):
+        return self.store.text(self.offset + self.message_start,
+                               self.length - self.message_start)
+
 class UniqueIDVertex(Vertex):
     """
     Vertex used to represent an identifer. For example a search keyword.
     """
+    __slots__ = ('id',)
+
+    kind = NodeKind.NodeKindUniqueIDVertex
+
     def __init__(self, id):
         """
         Args:
             id (str)
         """
+        Vertex.__init__(self)
         self.id = id
-        self.kind = NodeKind.NodeKindUniqueIDVertex
 
     def nodetype(self):
         return NodeType.Right
@@ -127,15 +249,26 @@ class TagVertex(Vertex):
     """
     Vertex used to represent a word.
     """
+    __slots__ = ('word', 'millis')
+
+    kind = NodeKind.NodeKindTagVertex
+
     def __init__(self, word, time):
         """
         Args:
           word (str) the tag
-          time (datetime.datetime)
+          time (datetime.datetime or int) int is epoch milliseconds
         """
-        self.word = word
-        self.time = time
-        self.kind = NodeKind.NodeKindTagVertex
+        Vertex.__init__(self)
+        self.word = _intern(word)
+        self.millis = as_millis(time)
+
+    @property
+    def time(self):
+        """
+        See BaseLogLineVertex.time
+        """
+        return millis_to_datetime(self.millis)
 
     def nodetype(self):
         return NodeType.Right
@@ -146,9 +279,55 @@ class TagVertex(Vertex):
     def __eq__(self, other):
         if not isinstance(other, TagVertex):
             return NotImplemented
-        return (self.word, self.time) == (other.word, other.time)
+        return (self.word, self.millis) == (other.word, other.millis)
 
     def __lt__(self, other):
         if not isinstance(other, TagVertex):
             return NotImplemented
-        return  (self.word, self.time) < (other.word, other.time)
+        return  (self.word, self.millis) < (other.word, other.millis)
+
+class TemplateVertex(Vertex):
+    """
+    Vertex used to represent an occurrence of a log template, like TagVertex
+    does for a word. See vinge.templates.
+    """
+    __slots__ = ('template_id', 'text', 'millis')
+
+    kind = NodeKind.NodeKindTemplateVertex
+
+    def __init__(self, template_id, text, time):
+        """
+        Args:
+          template_id (int) see templates.Template
+          text (str) the template, for display
+          time (datetime.datetime or int) int is epoch milliseconds
+        """
+        Vertex.__init__(self)
+        self.template_id = template_id
+        self.text = text
+        self.millis = as_millis(time)
+
+    @property
+    def time(self):
+        """
+        See BaseLogLineVertex.time
+        """
+        return millis_to_datetime(self.millis)
+
+    def nodetype(self):
+        return NodeType.Right
+
+    def __repr__(self):
+        return '<#%d %s,%s>' % (self.template_id, self.text, self.time)
+
+    def __eq__(self, other):
+        if not isinstance(other, TemplateVertex):
+            return NotImplemented
+        return (self.template_id, self.millis) == \
+            (other.template_id, other.millis)
+
+    def __lt__(self, other):
+        if not isinstance(other, TemplateVertex):
+            return NotImplemented
+        return (self.template_id, self.millis) < \
+            (other.template_id, other.millis)
@@ -0,0 +1,99 @@
+"""
+Time weightings: the weight of the edge between two tag (or template)
+vertices of the same chain, from how far apart their times are.
+
+The original kind of time weighting is a function of two datetimes,
+called once per edge:
+
+  def time_weighting(t1, t2):
+      return 1.0
+
+A vectorized time weighting instead takes a numpy array of int64
+millisecond deltas (always >= 0) and returns an array of weights, so a
+whole batch of chain edges costs one call. Mark one with @vectorized.
+exponential_decay, linear_decay and step_decay make vectorized weightings.
+
+graph.make_graph takes either kind, see time_weights.
+"""
+
+import numpy as np
+
+from timestamps import millis_to_datetime
+
+def vectorized(fn):
+    """
+    Marks fn as a vectorized time weighting.
+
+    Args:
+        fn (fun numpy.array of int64 -> numpy.array of float)
+
+    Returns:
+        fn
+    """
+    fn.vectorized = True
+    return fn
+
+def is_vectorized(time_weighting):
+    return getattr(time_weighting, 'vectorized', False)
+
+def time_weights(time_weighting, millis1, millis2):
+    """
+    Args:
+        time_weighting either kind of time weighting
+        millis1, millis2 (numpy.array of int64) the times of the two
+            vertices of every edge
+
+    Returns:
+        numpy.array of float64 the weight of every edge
+    """
+    millis1 = np.asarray(millis1, dtype=np.int64)
+    millis2 = np.asarray(millis2, dtype=np.int64)
+    if is_vectorized(time_weighting):
+        weights = time_weighting(np.abs(millis2 - millis1))
+        return np.asarray(weights, dtype=np.float64)
+    return np.array([time_weighting(millis_to_datetime(t1),
+                                    millis_to_datetime(t2))
+                     for (t1, t2) in zip(millis1.tolist(), millis2.tolist())],
+                    dtype=np.float64)
+
+def exponential_decay(rate):
+    """
+    Args:
+        rate (float) per second
+
+    Returns:
+        vectorized time weighting exp(-rate * seconds apart)
+    """
+    @vectorized
+    def weighting(deltas):
+        return np.exp(-rate / 1000.0 * deltas)
+    return weighting
+
+def linear_decay(horizon):
+    """
+    Args:
+        horizon (float) seconds
+
+    Returns:
+        vectorized time weighting that goes down from 1.0 for vertices at
+        the same time to 0.0 for vertices horizon seconds or more apart
+    """
+    @vectorized
+    def weighting(deltas):
+        return np.maximum(0.0, 1.0 - deltas / (1000.0 * horizon))
+    return weighting
+
+def step_decay(width, near=1.0, far=0.0):
+    """
+    Args:
+        width (float) seconds
+        near (float) weight of vertices at most width seconds apart
+        far (float) weight of the others
+
+    Returns:
+        vectorized time weighting
+    """
+    @vectorized
+    def weighting(deltas):
+        return np.where(deltas <= 1000.0 * width, near, far)
+    return weighting